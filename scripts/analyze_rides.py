@@ -4,10 +4,12 @@ from src.data_manager import DataManager
 from src.ride_simulator import SimulationState, RideDetails, Scooter
 from src.planner import SimulationPlan
 from src.city_utils import CityZone
+from src.simulation_store import SimulationStore
 
 dm = DataManager()
-plan: SimulationPlan = dm.load_pickle('simulation_plan.pickle')
-state: SimulationState = dm.load_pickle('sim_state_3.pickle')
+store = SimulationStore(dm)
+plan: SimulationPlan = store.load_plan('simulation_plan')
+state: SimulationState = store.load_state('sim_state_3')
 scooters: list[Scooter] = []
 models: list[str] = []
 for p in plan.parking:
@@ -0,0 +1,17 @@
+import logging
+import numpy as np
+from src.data_manager import DataManager
+from src.city_utils import CityZone
+from src.distance_matrix import DistanceMatrix
+from src.simulation_store import SimulationStore
+
+logging.basicConfig(level=logging.INFO)
+
+dm = DataManager()
+city_zone: CityZone = SimulationStore(dm).load_city_zone('city_zone')
+
+distance_matrix = DistanceMatrix.from_city_zone(city_zone)
+distances: np.ndarray = distance_matrix.compute_all()
+print(f'Distances: {distances.shape}, {distances.nbytes / 1024 / 1024:.1f} MB')
+
+dm.dump_numpy(distances, 'city_zone_distances.npy')
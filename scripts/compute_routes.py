@@ -1,92 +1,41 @@
+import os
 import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import networkx as nx
-from pydantic import BaseModel
+import logging
 from src.data_manager import DataManager
-from src.ride_simulator import SimulationState, RideDetails, RideRoute
+from src.ride_simulator import SimulationState
 from src.city_utils import CityZone
+from src.route_calculator import RouteCalculator
+from src.route_cache import RouteCache
+from src.simulation_store import SimulationStore
+from src.instrumentation import enable_from_env
 
-TRIPS_MAX: int = 1000000
-BATCH_SIZE: int = 350
-num_processes = 1
-start_date = datetime.date(2023, 8, 7)
-end_date = datetime.date(2023, 8, 7)
+logging.basicConfig(level=logging.INFO)
+enable_from_env()
 
-
-def calculate_routes(batch: list[RideDetails], state: SimulationState, city_zone: CityZone) -> list:
-    results = []
-    for rd in batch:
-        print(f'Processing ride: {rd.id}')
-        start_node = state.parking[rd.start_parking_id].graph_node
-        end_node = state.parking[rd.end_parking_id].graph_node
-        route = nx.shortest_path(city_zone.graph, start_node, end_node, weight='length')
-        person = state.persons[rd.person_id]
-        results.append((route, person.speed_average, rd.id))
-    return results
+START_DATE: datetime.date | None = datetime.date(2023, 6, 1)
+END_DATE: datetime.date | None = datetime.date(2023, 8, 31)
+BATCH_SIZE: int = 10000
+PROCESSES: int = os.cpu_count() or 1
+ROUTE_CACHE_FILE: str = 'route_cache.pickle'
 
 
 def main():
     dm = DataManager()
-    state: SimulationState = dm.load_pickle('sim_state_3.pickle')
-    city_zone: CityZone = dm.load_pickle('city_zone.pickle')
-
-    routes_geojson: dict = {
-        "type": "FeatureCollection",
-        "features": []
-    }
-    futures = []
-    routes: list[RideRoute] = []
-
-    ride_details: list[RideDetails] = state.ride_details
-    ride_details = [
-        ride for ride in ride_details
-        if start_date <= ride.start_datetime.date() <= end_date
-    ]
-    print(len(ride_details))
-
-    # with ProcessPoolExecutor(max_workers=num_processes) as executor:
-    #     batches = [ride_details[i:i + BATCH_SIZE] for i in range(1, TRIPS_MAX, BATCH_SIZE)]
-    #
-    #     for batch in batches:
-    #         futures.append(executor.submit(calculate_routes, batch, state, city_zone))
-    #
-    #     # Process results as they complete
-    #     for future in as_completed(futures):
-    #         batch_results = future.result()
-    #         for route, speed_avg, ride_id in batch_results:
-    #             # Extract coordinates for the route
-    #             coordinates = [
-    #                 (city_zone.graph.nodes[node]['lon'], city_zone.graph.nodes[node]['lat']) for node in route
-    #             ]
-    #             # Add route to GeoJSON
-    #             feature = {
-    #                 "type": "Feature",
-    #                 "geometry": {
-    #                     "type": "LineString",
-    #                     "coordinates": coordinates
-    #                 },
-    #                 "properties": {
-    #                     "speed_avg": speed_avg
-    #                 }
-    #             }
-    #             routes_geojson["features"].append(feature)
-    #             routes.append(RideRoute(
-    #                 ride_id=ride_id,
-    #                 points=coordinates,
-    #                 speed_avg=speed_avg
-    #             ))
-    for route, speed_avg, ride_id in calculate_routes(ride_details, state, city_zone):
-        coordinates = [
-            (city_zone.graph.nodes[node]['lon'], city_zone.graph.nodes[node]['lat']) for node in route
-        ]
-        routes.append(RideRoute(
-            ride_id=ride_id,
-            points=coordinates,
-            speed_avg=speed_avg
-        ))
+    store = SimulationStore(dm)
+    # Only the ride log of the requested days is read
+    state: SimulationState = store.load_state('sim_state_3', start_date=START_DATE, end_date=END_DATE)
+    city_zone: CityZone = store.load_city_zone('city_zone')
+
+    if os.path.exists(dm.get_file_path(ROUTE_CACHE_FILE)):
+        route_cache: RouteCache = RouteCache.load(dm, ROUTE_CACHE_FILE)
+    else:
+        route_cache = RouteCache()
+
+    calculator = RouteCalculator(graph=city_zone.get_routing_graph(), processes=PROCESSES, route_cache=route_cache)
+    routes = calculator.calculate_routes(state, start_date=START_DATE, end_date=END_DATE, batch_size=BATCH_SIZE)
+    dm.dump_pickle_stream(routes, 'routes.pickle')
+    route_cache.dump(dm, ROUTE_CACHE_FILE)
     print('Routes calculated')
-    # dm.dump_json(routes_geojson, 'routes.geojson')
-    dm.dump_pickle(routes, 'routes.pickle')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,46 @@
+import glob
+import logging
+import os
+from typing import Any
+from src.data_manager import DataManager
+from src.city_utils import CityZone
+from src.planner import SimulationPlan
+from src.ride_simulator import SimulationState
+from src.simulation_store import SimulationStore, upgrade_state
+
+# One-off conversion of the former monolithic pickles to SimulationStore directories of the same name
+PICKLE_FILES: list[str] = ['city_zone.pickle', 'simulation_plan.pickle']
+STATE_PICKLE_PATTERN: str = 'sim_state_*.pickle'
+# run_increment.py now keeps the name of its latest state in this file
+LATEST_STATE_PICKLE: str = 'sim_state_latest.pickle'
+LATEST_STATE_NAME_FILE: str = 'sim_state_latest_name.pickle'
+
+logging.basicConfig(level=logging.INFO)
+
+dm = DataManager()
+store = SimulationStore(dm)
+state_files: list[str] = sorted(
+    os.path.basename(f) for f in glob.glob(dm.get_file_path(STATE_PICKLE_PATTERN))
+)
+for file_name in PICKLE_FILES + state_files:
+    name: str = file_name.removesuffix('.pickle')
+    if not dm.file_exists(file_name) or file_name == LATEST_STATE_NAME_FILE:
+        continue
+    if store.exists(name):
+        print(f'{name} is already converted')
+        continue
+    data: Any = dm.load_pickle(file_name)
+    if isinstance(data, CityZone):
+        store.dump_city_zone(data, name)
+    elif isinstance(data, SimulationPlan):
+        store.dump_plan(data, name)
+    elif isinstance(data, SimulationState):
+        store.dump_state(upgrade_state(data), name)
+    else:
+        print(f'{file_name} holds {type(data).__name__}, skipped')
+        continue
+    print(f'Converted {file_name} to {name}')
+
+if dm.file_exists(LATEST_STATE_PICKLE) and not dm.file_exists(LATEST_STATE_NAME_FILE):
+    dm.dump_pickle(LATEST_STATE_PICKLE.removesuffix('.pickle'), LATEST_STATE_NAME_FILE, atomic=True)
+    print(f'Latest state is {LATEST_STATE_PICKLE.removesuffix(".pickle")}')
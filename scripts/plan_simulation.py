@@ -10,15 +10,19 @@ from src.faker_providers.scooter import ScooterProvider
 from src.planner import Planner, SimulationPlan
 from src.data_manager import DataManager
 from src.city_utils import CityZone
+from src.simulation_store import SimulationStore
+from src.instrumentation import enable_from_env
 
+enable_from_env()
 dm = DataManager()
+store = SimulationStore(dm)
 models: pd.DataFrame = dm.load_csv('models.csv')
-city_zone: CityZone = dm.load_pickle('city_zone.pickle')
+city_zone: CityZone = store.load_city_zone('city_zone')
 
 fake = Faker('ru_RU')
 Faker.seed(0)
 
-location_provider = LocationProvider(generator=fake, city_graph=city_zone.graph)
+location_provider = LocationProvider(generator=fake, city_graph=city_zone.get_routing_graph())
 parking_provider = ParkingProvider(generator=fake, zone_parking=city_zone.parking)
 scooter_provider = ScooterProvider(generator=fake, hardware_ids=models['hardware_id'].tolist())
 fake.add_provider(location_provider)
@@ -43,4 +47,4 @@ print(f'Rides: {len(simulation_plan.rides)}')
 print(f'Parking: {len(simulation_plan.parking)}')
 print(f'Scooters: {sum([len(p.scooters) for p in simulation_plan.parking])}')
 
-dm.dump_pickle(simulation_plan, 'simulation_plan.pickle')
+store.dump_plan(simulation_plan, 'simulation_plan')
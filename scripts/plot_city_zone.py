@@ -1,10 +1,11 @@
 from src.data_manager import DataManager
 from src.city_utils import CityZone
+from src.simulation_store import SimulationStore
 from src.vis.plot_city import plot_city_zone, plot_city_graph
 
 
 dm = DataManager()
-cad_zone: CityZone = dm.load_pickle('city_zone.pickle')
+cad_zone: CityZone = SimulationStore(dm).load_city_zone('city_zone', networkx_graph=True)
 file_path: str = dm.get_file_path('moscow_cad.html')
 plot_city_zone(cad_zone, file_path)
 
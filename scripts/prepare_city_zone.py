@@ -4,8 +4,11 @@ from networkx import MultiDiGraph
 from src.transport_mos import BicycleParking, SlowZone
 from src.data_manager import DataManager
 from src.city_utils import CityZone, prepare_city_zone
+from src.simulation_store import SimulationStore
+from src.instrumentation import enable_from_env
 
 logging.basicConfig(level=logging.INFO)
+enable_from_env()
 
 dm = DataManager()
 city_polygon: Polygon = dm.load_pickle('cad_polygon.pickle')
@@ -20,4 +23,4 @@ city_zone: CityZone = prepare_city_zone(
     slow_zones=slow_zones
 )
 
-dm.dump_pickle(city_zone, 'city_zone.pickle')
+SimulationStore(dm).dump_city_zone(city_zone, 'city_zone')
@@ -0,0 +1,154 @@
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any, TypeVar
+from faker import Faker
+from pydantic import BaseModel
+from src.synthetic_city import SyntheticCity, build_grid_city, create_fake
+from src.city_utils import CityZone, prepare_city_zone
+from src.planner import Planner, SimulationPlan
+from src.ride_simulator import RideSimulator, SimulationState
+from src.route_calculator import RouteCalculator
+from src.database_loader import DatabaseLoader, Tariff
+from src.data_manager import DataManager
+from src.instrumentation import instrumentation
+from src.simulation_store import SimulationStore
+
+# Offline benchmarks of the pipeline stages on synthetic grid cities.
+# Results are written to data/benchmarks/<commit>.json, compare them between commits
+ResultT = TypeVar('ResultT')
+
+
+class BenchmarkSize(BaseModel):
+    name: str
+    grid_size: int
+    persons: int
+    days: int
+
+
+class StageResult(BaseModel):
+    size: str
+    stage: str
+    seconds: float
+    peak_memory_mb: float | None
+
+
+SIZES: dict[str, BenchmarkSize] = {
+    'small': BenchmarkSize(name='small', grid_size=20, persons=300, days=7),
+    'medium': BenchmarkSize(name='medium', grid_size=50, persons=2000, days=14),
+    'large': BenchmarkSize(name='large', grid_size=100, persons=10000, days=30),
+}
+START_DATE: datetime.date = datetime.date(2023, 6, 1)
+HARDWARE_IDS: list[str] = ['HW-001', 'HW-002', 'HW-003', 'HW-004']
+
+
+def measure(
+        results: list[StageResult],
+        size: BenchmarkSize,
+        stage: str,
+        trace_memory: bool,
+        func: Callable[[], ResultT]
+) -> ResultT:
+    if trace_memory:
+        tracemalloc.start()
+    started_at: float = time.perf_counter()
+    result: ResultT = func()
+    seconds: float = time.perf_counter() - started_at
+    peak_memory_mb: float | None = None
+    if trace_memory:
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    results.append(StageResult(size=size.name, stage=stage, seconds=seconds, peak_memory_mb=peak_memory_mb))
+    print(f'{size.name:>8} {stage:<20} {seconds:10.3f} s {peak_memory_mb or 0:10.1f} MB')
+    return result
+
+
+def run_size(size: BenchmarkSize, trace_memory: bool, data_dir: str) -> list[StageResult]:
+    results: list[StageResult] = []
+    city: SyntheticCity = build_grid_city(size.grid_size)
+    city_zone: CityZone = measure(
+        results, size, 'prepare_city_zone', trace_memory,
+        lambda: prepare_city_zone(city.polygon, city.graph, city.bicycle_parking, city.slow_zones)
+    )
+    fake: Faker = create_fake(city_zone, HARDWARE_IDS)
+    plan: SimulationPlan = measure(
+        results, size, 'plan_simulation', trace_memory,
+        lambda: Planner(fake=fake).plan_simulation(
+            start_date=START_DATE,
+            end_date=START_DATE + datetime.timedelta(days=size.days),
+            persons_count=size.persons,
+            vectorized=True
+        )
+    )
+    state: SimulationState = measure(
+        results, size, 'simulate_rides', trace_memory,
+        lambda: RideSimulator().simulate_rides(plan=plan, city_zone=city_zone)
+    )
+    dm = DataManager(data_dir)
+    SimulationStore(dm).dump_state(state, 'state')
+    calculator = RouteCalculator(graph=city_zone.get_routing_graph())
+    measure(
+        results, size, 'calculate_routes', trace_memory,
+        lambda: dm.dump_pickle_stream(calculator.calculate_routes(state), 'routes.pickle')
+    )
+    loader = DatabaseLoader(database=None, fake=fake, data_manager=dm)
+    measure(
+        results, size, 'prepare_data', trace_memory,
+        lambda: loader.prepare_data('state', routes_file='routes.pickle', tariff=Tariff(day=10, night=5))
+    )
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic cities')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'])
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc, it slows stages down')
+    parser.add_argument('--output', help='Result file name inside the data directory')
+    parser.add_argument('--spans', action='store_true', help='Add instrumented hot spots to the results')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    commit: str = get_commit()
+    results: list[StageResult] = []
+    spans: dict[str, list[dict[str, Any]]] = {}
+    if args.spans:
+        instrumentation.enable()
+    with tempfile.TemporaryDirectory() as data_dir:
+        for size_name in args.sizes:
+            instrumentation.reset()
+            results.extend(run_size(SIZES[size_name], not args.no_memory, data_dir))
+            if args.spans:
+                print(instrumentation.report_table())
+                spans[size_name] = [s.model_dump() for s in instrumentation.stats]
+    report: dict[str, Any] = {
+        'commit': commit,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'sizes': {name: SIZES[name].model_dump() for name in args.sizes},
+        'results': [r.model_dump() for r in results],
+        'spans': spans,
+    }
+    benchmarks_dm = DataManager(DataManager().get_file_path('benchmarks'))
+    file_path: str = benchmarks_dm.dump_text(json.dumps(report, indent=2), f'{args.output or commit}.json')
+    print(f'Results are written to {file_path}')
+
+
+if __name__ == '__main__':
+    main()
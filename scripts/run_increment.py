@@ -0,0 +1,89 @@
+import datetime
+import logging
+from faker import Faker
+import pandas as pd
+from src.faker_providers.person import PersonProvider
+from src.faker_providers.weather import WeatherProvider
+from src.faker_providers.datetime import DatetimeProvider
+from src.faker_providers.scooter import ScooterProvider
+from src.planner import Planner, SimulationPlan
+from src.data_manager import DataManager
+from src.city_utils import CityZone
+from src.distance_matrix import DistanceMatrix
+from src.ride_simulator import RideSimulator, SimulationState
+from src.sharded_simulator import ShardedRideSimulator
+from src.route_calculator import RouteCalculator
+from src.route_cache import RouteCache
+from src.database_loader import DatabaseLoader, Tariff
+from src.database import Database
+from src.simulation_store import SimulationStore
+from src.instrumentation import enable_from_env
+
+# Simulates the days after the latest state and prepares parquet partitions to append with update_database.py
+INITIAL_STATE_FILE: str = 'sim_state_3'
+# Holds the name of the latest state, it is switched atomically after a successful run
+LATEST_STATE_NAME_FILE: str = 'sim_state_latest_name.pickle'
+DAYS: int = 1
+PROCESSES: int = 1
+ROUTE_CACHE_FILE: str = 'route_cache.pickle'
+DISTANCES_FILE: str = 'city_zone_distances.npy'
+
+logging.basicConfig(level=logging.INFO)
+enable_from_env()
+
+
+def main():
+    dm = DataManager()
+    store = SimulationStore(dm)
+    models: pd.DataFrame = dm.load_csv('models.csv')
+    city_zone: CityZone = store.load_city_zone('city_zone')
+    # Precomputed by compute_distance_matrix.py, without it rows are computed from the graph on first use
+    distance_matrix = DistanceMatrix.from_city_zone(
+        city_zone, distances=dm.load_numpy(DISTANCES_FILE) if dm.file_exists(DISTANCES_FILE) else None
+    )
+    state_file: str = (
+        dm.load_pickle(LATEST_STATE_NAME_FILE) if dm.file_exists(LATEST_STATE_NAME_FILE) else INITIAL_STATE_FILE
+    )
+    previous_state: SimulationState = store.load_state(state_file)
+    start_date: datetime.date = previous_state.end_datetime.date()
+    end_date: datetime.date = start_date + datetime.timedelta(days=DAYS)
+    partition: str = start_date.strftime('%Y%m%d')
+    print(f'Continuing {state_file} from {start_date} to {end_date}')
+
+    fake = Faker('ru_RU')
+    Faker.seed(start_date.toordinal())
+    fake.add_provider(PersonProvider)
+    fake.add_provider(WeatherProvider)
+    fake.add_provider(DatetimeProvider)
+    fake.add_provider(ScooterProvider(generator=fake, hardware_ids=models['hardware_id'].tolist()))
+    plan: SimulationPlan = Planner(fake=fake).plan_simulation_increment(previous_state, end_date, vectorized=True)
+    print(f'Rides: {len(plan.rides)}')
+
+    if PROCESSES > 1:
+        # One region per process, so every worker gets a region for any process count
+        grid: tuple[int, int] = (PROCESSES, 1)
+        simulator = ShardedRideSimulator(processes=PROCESSES, grid=grid, distance_matrix=distance_matrix)
+        state: SimulationState = simulator.simulate_rides(
+            plan=plan, city_zone=city_zone, previous_state=previous_state
+        )
+    else:
+        rm = RideSimulator(distance_matrix=distance_matrix)
+        state: SimulationState = rm.simulate_rides(plan=plan, city_zone=city_zone, previous_state=previous_state)
+    state_partition_file: str = f'sim_state_{partition}'
+    store.dump_state(state, state_partition_file)
+
+    route_cache: RouteCache = RouteCache.load(dm, ROUTE_CACHE_FILE) if dm.file_exists(ROUTE_CACHE_FILE) else RouteCache()
+    calculator = RouteCalculator(graph=city_zone.get_routing_graph(), processes=PROCESSES, route_cache=route_cache)
+    routes_file: str = f'routes_{partition}.pickle'
+    dm.dump_pickle_stream(calculator.calculate_routes(state), routes_file)
+    route_cache.dump(dm, ROUTE_CACHE_FILE)
+
+    dl = DatabaseLoader(database=Database(), fake=fake)
+    dl.prepare_data(state_partition_file, routes_file=routes_file, tariff=Tariff(day=10, night=5), partition=partition)
+    # Latest state is switched last, so a failed run is simply repeated
+    dm.dump_pickle(state_partition_file, LATEST_STATE_NAME_FILE, atomic=True)
+    print(f'Partition {partition} is ready: {len(state.ride_details)} rides')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,21 +2,47 @@ import logging
 from src.planner import SimulationPlan
 from src.data_manager import DataManager
 from src.city_utils import CityZone
+from src.distance_matrix import DistanceMatrix
 from src.ride_simulator import RideSimulator, SimulationState
+from src.sharded_simulator import ShardedRideSimulator
+from src.checkpoint import SimulationCheckpointer
+from src.simulation_store import SimulationStore
+from src.instrumentation import enable_from_env
+
+# More than one process or checkpoints switch to the windowed regional simulation
+PROCESSES = 1
+CHECKPOINTS = False
+DISTANCES_FILE = 'city_zone_distances.npy'
 
 logging.basicConfig(level=logging.INFO)
+enable_from_env()
 
 dm = DataManager()
-plan: SimulationPlan = dm.load_pickle('simulation_plan.pickle')
-city_zone: CityZone = dm.load_pickle('city_zone.pickle')
-
-rm = RideSimulator()
-state: SimulationState = rm.simulate_rides(
-    plan=plan,
-    city_zone=city_zone,
-    rides_limit=None
+store = SimulationStore(dm)
+plan: SimulationPlan = store.load_plan('simulation_plan')
+city_zone: CityZone = store.load_city_zone('city_zone')
+# Precomputed by compute_distance_matrix.py, without it rows are computed from the graph on first use
+distance_matrix = DistanceMatrix.from_city_zone(
+    city_zone, distances=dm.load_numpy(DISTANCES_FILE) if dm.file_exists(DISTANCES_FILE) else None
 )
-dm.dump_pickle(state, 'sim_state_3.pickle')
+
+if PROCESSES > 1 or CHECKPOINTS:
+    # One region per process, so every worker gets a region for any process count
+    grid: tuple[int, int] = (PROCESSES, 1)
+    srm = ShardedRideSimulator(processes=PROCESSES, grid=grid, distance_matrix=distance_matrix)
+    state: SimulationState = srm.simulate_rides(
+        plan=plan,
+        city_zone=city_zone,
+        checkpointer=SimulationCheckpointer(dm) if CHECKPOINTS else None
+    )
+else:
+    rm = RideSimulator(distance_matrix=distance_matrix)
+    state: SimulationState = rm.simulate_rides(
+        plan=plan,
+        city_zone=city_zone,
+        rides_limit=None
+    )
+store.dump_state(state, 'sim_state_3')
 # rm.print_ride_details(state.rides)
 print(len(state.ride_details))
 print(max(*[len(p.scooters) for _, p in state.parking.items()]))
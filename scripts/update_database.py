@@ -3,13 +3,22 @@ import logging
 from dotenv import load_dotenv
 from faker import Faker
 from src.database import Database, ConnectionParameters
-from src.database_loader import DatabaseLoader, Tariff
+from src.database_loader import DatabaseLoader, Tariff, DEFAULT_TABLES
+from src.instrumentation import enable_from_env
 
 DATA_VERSION = '1.0.0'
 SCHEMA_NAME = 'scooters_raw'
+CHUNK_SIZE = 100_000
+BULK_COPY = True
+LOAD_WORKERS = 3
+# Partition prepared by run_increment.py, e.g. '20230901'. It is appended to the existing tables
+PARTITION: str | None = None
+# Routes table with PostGIS geometry, PostGIS has to be installed in the database
+LOAD_ROUTES = False
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
+enable_from_env()
 fake = Faker('ru_RU')
 Faker.seed(0)
 db = Database()
@@ -22,9 +31,18 @@ db.connect(conn_params)
 db.create_schema(SCHEMA_NAME)
 dl.create_version_table(SCHEMA_NAME, DATA_VERSION)
 
-tariff = Tariff(day=10, night=5)
-print('Preparing data')
-dl.prepare_data('sim_state_3.pickle', routes_file='routes.pickle', tariff=tariff)
+if PARTITION is None:
+    tariff = Tariff(day=10, night=5)
+    print('Preparing data')
+    dl.prepare_data('sim_state_3', routes_file='routes.pickle', tariff=tariff, chunk_size=CHUNK_SIZE)
 print('Uploading data to the database')
-dl.load_data(SCHEMA_NAME)
+tables: list[str] = DEFAULT_TABLES + ['routes'] if LOAD_ROUTES else DEFAULT_TABLES
+dl.load_data(
+    SCHEMA_NAME,
+    tables=tables,
+    bulk_copy=BULK_COPY,
+    max_workers=LOAD_WORKERS,
+    partition=PARTITION,
+    convert_geometry=LOAD_ROUTES
+)
 # dl.create_table_from_parquet('trips', SCHEMA_NAME, 'trips.parquet')
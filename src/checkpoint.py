@@ -0,0 +1,105 @@
+import datetime
+import logging
+from pydantic import BaseModel, ConfigDict
+from src.data_manager import DataManager
+from src.ride_simulator import ScooterDelivery, RegionSnapshot, RideDetailsLog, CanceledRideLog
+
+
+class PlanFingerprint(BaseModel):
+    # Identifies the plan and the simulation settings a checkpoint belongs to
+    start_datetime: datetime.datetime
+    end_datetime: datetime.datetime
+    rides_count: int
+    rides_hash: str
+    first_ride_id: int
+    grid: tuple[int, int]
+    window_s: int
+
+
+class SimulationSnapshot(BaseModel):
+    # Everything needed to continue the simulation from a window boundary, except the ride log
+    fingerprint: PlanFingerprint
+    window_start_s: int
+    regions: dict[int, RegionSnapshot]
+    promo_codes: dict[int, int]
+    pending_deliveries: list[ScooterDelivery]
+    log_offset: int
+
+
+class SimulationCheckpoint(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    snapshot: SimulationSnapshot
+    ride_details: list[RideDetailsLog]
+    cancelled_rides: list[CanceledRideLog]
+
+
+class SimulationCheckpointer:
+    # Ride log chunks are appended to one file, the small snapshot is rewritten atomically and
+    # records the log offset it is consistent with
+    _data_manager: DataManager
+    _snapshot_file: str
+    _log_file: str
+    _log_offset: int
+    _logger: logging.Logger
+
+    def __init__(self, data_manager: DataManager, name: str = 'simulation_checkpoint'):
+        self._data_manager = data_manager
+        self._snapshot_file = f'{name}_snapshot.pickle'
+        self._log_file = f'{name}_log.pickle'
+        self._log_offset = 0
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def load(self, fingerprint: PlanFingerprint) -> SimulationCheckpoint | None:
+        if not self._data_manager.file_exists(self._snapshot_file):
+            return None
+        snapshot: SimulationSnapshot = self._data_manager.load_pickle(self._snapshot_file)
+        if snapshot.fingerprint != fingerprint:
+            raise ValueError(
+                f'Checkpoint {self._snapshot_file} belongs to another plan or settings '
+                f'({snapshot.fingerprint}), delete it to start over'
+            )
+        self._log_offset = snapshot.log_offset
+        ride_details: list[RideDetailsLog] = []
+        cancelled_rides: list[CanceledRideLog] = []
+        if snapshot.log_offset > 0:
+            for ride_details_chunk, cancelled_rides_chunk in self._data_manager.load_pickle_stream(
+                    self._log_file, end_offset=snapshot.log_offset
+            ):
+                ride_details.append(ride_details_chunk)
+                cancelled_rides.append(cancelled_rides_chunk)
+        self._logger.info(
+            'Loaded checkpoint at %d s with %d ride log chunks', snapshot.window_start_s, len(ride_details)
+        )
+        return SimulationCheckpoint(snapshot=snapshot, ride_details=ride_details, cancelled_rides=cancelled_rides)
+
+    def save(
+            self,
+            fingerprint: PlanFingerprint,
+            window_start_s: int,
+            regions: dict[int, RegionSnapshot],
+            promo_codes: dict[int, int],
+            pending_deliveries: list[ScooterDelivery],
+            ride_details: RideDetailsLog,
+            cancelled_rides: CanceledRideLog
+    ):
+        # Log chunk goes first, a crash before the snapshot is replaced leaves the previous checkpoint valid
+        self._log_offset = self._data_manager.append_pickle(
+            (ride_details, cancelled_rides), self._log_file, offset=self._log_offset
+        )
+        snapshot = SimulationSnapshot(
+            fingerprint=fingerprint,
+            window_start_s=window_start_s,
+            regions=regions,
+            promo_codes=promo_codes,
+            pending_deliveries=pending_deliveries,
+            log_offset=self._log_offset
+        )
+        self._data_manager.dump_pickle(snapshot, self._snapshot_file, atomic=True)
+        self._logger.info('Saved checkpoint at %d s', window_start_s)
+
+    def clear(self):
+        # Finished simulation must not be resumed by the next run
+        self._data_manager.delete_file(self._snapshot_file)
+        self._data_manager.delete_file(self._log_file)
+        self._log_offset = 0
+        self._logger.info('Cleared checkpoint')
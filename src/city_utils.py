@@ -1,11 +1,18 @@
 from logging import getLogger
+import heapq
+import itertools
+import math
 from pydantic import BaseModel, ConfigDict
 import networkx as nx
+import numpy as np
+import shapely
 from networkx import MultiDiGraph
-import osmnx as ox
-from shapely.geometry import Polygon, Point, LineString
+from shapely.geometry import Polygon, Point
+from shapely.geometry.base import BaseGeometry
 from shapely.ops import unary_union
-import geopandas as gpd
+from src.instrumentation import instrumented, span
+from src.routing_graph import RoutingGraph
+from src.spatial_index import NodeIndex
 from src.transport_mos import BicycleParking, SlowZone
 
 logger = getLogger(__name__)
@@ -22,11 +29,68 @@ class ZoneParking(BaseModel):
 class CityZone(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     polygon: Polygon
-    graph: MultiDiGraph
+    # networkx graph is needed only for plotting, zones loaded from the store have just the routing graph
+    graph: MultiDiGraph | None
     parking: list[ZoneParking]
     slow_zones: list[SlowZone]
+    routing_graph: RoutingGraph | None = None
 
+    def get_routing_graph(self) -> RoutingGraph:
+        # Derived from the networkx graph once. Zones pickled before the field existed do not have it at all
+        if getattr(self, 'routing_graph', None) is None:
+            self.routing_graph = RoutingGraph.from_graph(self.graph)
+        return self.routing_graph
 
+
+@instrumented()
+def find_edges_intersecting(graph: MultiDiGraph, polygon: BaseGeometry) -> list[tuple[int, int, int]]:
+    # Builds all edge segments as one shapely array and tests them against the prepared polygon in bulk
+    edges: list[tuple[int, int, int]] = list(graph.edges(keys=True))
+    if not edges or polygon.is_empty:
+        return []
+    node_index: dict[int, int] = {node: i for i, node in enumerate(graph.nodes)}
+    node_positions: np.ndarray = np.array([(data['lat'], data['lon']) for _, data in graph.nodes(data=True)])
+    edge_nodes: np.ndarray = np.array([(node_index[u], node_index[v]) for u, v, _ in edges])
+    edge_lines: np.ndarray = shapely.linestrings(node_positions[edge_nodes])
+    shapely.prepare(polygon)
+    intersects: np.ndarray = shapely.intersects(polygon, edge_lines)
+    return [edges[i] for i in np.flatnonzero(intersects)]
+
+
+@instrumented()
+def find_closest_parking(
+        graph: MultiDiGraph,
+        zone_parking: list[ZoneParking],
+        count: int = 3,
+        max_distance_m: float = 2000
+) -> dict[int, list[int]]:
+    # Bounded Dijkstra from every parking node, stopped as soon as enough parking are reached.
+    # Walking ignores one-way streets, so edges are followed in both directions. Results are sorted by walking distance
+    parking_by_node: dict[int, list[int]] = {}
+    for p in zone_parking:
+        parking_by_node.setdefault(p.graph_node, []).append(p.id)
+    closest_parking: dict[int, list[int]] = {}
+    for p in zone_parking:
+        found: list[int] = []
+        visited: set[int] = set()
+        distances: dict[int, float] = {p.graph_node: 0}
+        queue: list[tuple[float, int]] = [(0, p.graph_node)]
+        while queue and len(found) < count:
+            distance, node = heapq.heappop(queue)
+            if node in visited:
+                continue
+            visited.add(node)
+            found.extend(pid for pid in parking_by_node.get(node, []) if pid != p.id)
+            for next_node, edges in itertools.chain(graph.succ[node].items(), graph.pred[node].items()):
+                next_distance: float = distance + min(e.get('length', 1) for e in edges.values())
+                if next_distance <= max_distance_m and next_distance < distances.get(next_node, math.inf):
+                    distances[next_node] = next_distance
+                    heapq.heappush(queue, (next_distance, next_node))
+        closest_parking[p.id] = found[:count]
+    return closest_parking
+
+
+@instrumented()
 def prepare_city_zone(
         zone_polygon: Polygon,
         zone_graph: MultiDiGraph,
@@ -40,30 +104,13 @@ def prepare_city_zone(
     ])
 
     logger.info('Removing routes from zero speed zone')
-    edges_to_remove: list[tuple[int, int, int]] = []
-    nodes_to_remove: list[int] = []
-    for u, v, key, data in zone_graph.edges(keys=True, data=True):
-        u_pos = (zone_graph.nodes[u]['lat'], zone_graph.nodes[u]['lon'])  # or use 'lon', 'lat'
-        v_pos = (zone_graph.nodes[v]['lat'], zone_graph.nodes[v]['lon'])
-        edge_line = LineString([u_pos, v_pos])
-        if zero_speed_polygon.intersects(edge_line):
-            edges_to_remove.append((u, v, key))
-            nodes_to_remove.extend([u, v])
-    edges_to_remove = list(set(edges_to_remove))
-    for u, v, key in edges_to_remove:
-        zone_graph.remove_edge(u, v, key)
-    isolated_nodes = list(nx.isolates(zone_graph))
-    for node in isolated_nodes:
-        zone_graph.remove_node(node)
-    # Identify all weakly connected components
-    subgraphs = list(nx.weakly_connected_components(zone_graph))
-    # Find the largest subgraph
-    largest_subgraph = max(subgraphs, key=len)
-    # Remove nodes not in the largest subgraph
-    all_nodes = list(zone_graph.nodes())
-    nodes_to_remove = set(all_nodes) - set(largest_subgraph)
-    for node in nodes_to_remove:
-        zone_graph.remove_node(node)
+    edges_to_remove: list[tuple[int, int, int]] = find_edges_intersecting(zone_graph, zero_speed_polygon)
+    with span('prepare_city_zone.prune_graph'):
+        zone_graph.remove_edges_from(edges_to_remove)
+        zone_graph.remove_nodes_from(list(nx.isolates(zone_graph)))
+        # Keep only the largest weakly connected component
+        largest_subgraph: set[int] = max(nx.weakly_connected_components(zone_graph), key=len)
+        zone_graph.remove_nodes_from([node for node in zone_graph.nodes if node not in largest_subgraph])
 
     logger.info('Finding parking in the zone')
     parking: list[BicycleParking] = [
@@ -71,33 +118,25 @@ def prepare_city_zone(
         if zone_polygon.contains(Point(p.coordinates)) and not zero_speed_polygon.contains(Point(p.coordinates))
     ]
 
-    logger.info('Finding closest graph node for every parking')
-    zone_parking: list[ZoneParking] = []
-    parking_id: int = 1
-    for p in parking:
-        logger.info(f'Finding node for parking [{parking_id}/{len(parking)}] {p.name} at {p.coordinates}')
-        shapely_coordinates = gpd.GeoSeries(Point(p.coordinates[1], p.coordinates[0]), crs='epsg:4326')
-        proj_point: gpd.GeoSeries = shapely_coordinates.to_crs(zone_graph.graph['crs'])
-        node: int = ox.nearest_nodes(zone_graph, proj_point.x[0], proj_point.y[0])
-        zone_parking.append(ZoneParking(
+    logger.info('Finding closest graph node for %d parking', len(parking))
+    with span('prepare_city_zone.snap_parking'):
+        node_index: NodeIndex = NodeIndex.from_graph(zone_graph)
+        parking_nodes: np.ndarray = node_index.nearest_nodes_by_coordinates([p.coordinates for p in parking])
+    zone_parking: list[ZoneParking] = [
+        ZoneParking(
             id=parking_id,
             name=p.name,
             coordinates=p.coordinates,
-            graph_node=node,
+            graph_node=int(node),
             closest_parking_id=[]
-        ))
-        parking_id += 1
+        )
+        for parking_id, (p, node) in enumerate(zip(parking, parking_nodes), start=1)
+    ]
 
     logger.info('Finding closest parking for every parking')
-    for parking1 in zone_parking:
-        node = parking1.graph_node
-        closest_parking_id: list[int] = [p.id for p in zone_parking if p.graph_node == node and p.id != parking1.id]
-        if len(closest_parking_id) < 3:
-            successors: list[int] = list(set(zone_graph.successors(node)) | set(zone_graph.predecessors(node)))
-            while len(closest_parking_id) < 3 and len(successors) > 0:
-                node_id: int = successors.pop(0)
-                closest_parking_id.extend([p.id for p in zone_parking if p.graph_node == node_id])
-        parking1.closest_parking_id = list(set(closest_parking_id))
+    closest_parking: dict[int, list[int]] = find_closest_parking(zone_graph, zone_parking)
+    for p in zone_parking:
+        p.closest_parking_id = closest_parking[p.id]
 
     city_zone = CityZone(
         polygon=zone_polygon,
@@ -0,0 +1,128 @@
+from collections.abc import Iterable, Iterator
+from typing import Any, ClassVar, Generic, TypeVar
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pydantic import BaseModel
+
+ModelT = TypeVar('ModelT', bound=BaseModel)
+
+
+class ColumnarTable(Generic[ModelT]):
+    # Subclasses define the row model and a NumPy dtype for every model field
+    model: ClassVar[type[BaseModel]]
+    dtypes: ClassVar[dict[str, np.dtype | str]]
+
+    _columns: dict[str, np.ndarray]
+    _size: int
+
+    def __init__(self, capacity: int = 1024):
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.dtypes.items()}
+        self._size = 0
+
+    @classmethod
+    def from_models(cls, models: Iterable[ModelT]) -> 'ColumnarTable[ModelT]':
+        models = list(models)
+        table = cls(capacity=max(len(models), 1))
+        for m in models:
+            table.append(m)
+        return table
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, np.ndarray | list]) -> 'ColumnarTable[ModelT]':
+        table = cls(capacity=0)
+        table._columns = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in cls.dtypes.items()}
+        table._size = len(table._columns[next(iter(cls.dtypes))])
+        return table
+
+    @classmethod
+    def concat(cls, tables: Iterable['ColumnarTable[ModelT]']) -> 'ColumnarTable[ModelT]':
+        tables = list(tables)
+        if not tables:
+            return cls()
+        return cls.from_columns({name: np.concatenate([t.column(name) for t in tables]) for name in cls.dtypes})
+
+    @classmethod
+    def from_pandas(cls, df: pd.DataFrame) -> 'ColumnarTable[ModelT]':
+        return cls.from_columns({name: df[name].to_numpy() for name in cls.dtypes})
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table) -> 'ColumnarTable[ModelT]':
+        # Numeric and datetime columns of a memory mapped table stay zero-copy read-only views
+        return cls.from_columns({name: table.column(name).to_numpy() for name in cls.dtypes})
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[ModelT]:
+        for i in range(self._size):
+            yield self._row(i)
+
+    def __getitem__(self, index: int | slice) -> 'ModelT | ColumnarTable[ModelT]':
+        if isinstance(index, slice):
+            return self.from_columns({name: column[index] for name, column in self.columns.items()})
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(f'{type(self).__name__} index out of range')
+        return self._row(index)
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {'columns': self.columns, 'size': self._size}
+
+    def __setstate__(self, state: dict[str, Any]):
+        self._columns = {name: column.copy() for name, column in state['columns'].items()}
+        self._size = state['size']
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def take(self, indices: np.ndarray) -> 'ColumnarTable[ModelT]':
+        return self.from_columns({name: column[indices] for name, column in self.columns.items()})
+
+    def append(self, model: ModelT | None = None, **values: Any) -> int:
+        if model is not None:
+            values = {name: getattr(model, name) for name in self.dtypes}
+        if self._size == len(self._columns[next(iter(self.dtypes))]):
+            self._grow()
+        for name, column in self._columns.items():
+            column[self._size] = values[name]
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, models: Iterable[ModelT]):
+        for m in models:
+            self.append(m)
+
+    def update(self, index: int, **values: Any):
+        for name, value in values.items():
+            if not self._columns[name].flags.writeable:
+                self._columns[name] = self._columns[name].copy()
+            self._columns[name][index] = value
+
+    def to_models(self) -> list[ModelT]:
+        return list(self)
+
+    def to_pandas(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def to_arrow(self) -> pa.Table:
+        return pa.table({name: pa.array(column) for name, column in self.columns.items()})
+
+    def _row(self, index: int) -> ModelT:
+        # Object columns hold Python values already, NumPy scalars are converted with item()
+        return self.model.model_construct(**{
+            name: value.item() if isinstance(value := column[index], np.generic) else value
+            for name, column in self._columns.items()
+        })
+
+    def _grow(self):
+        capacity: int = max(2 * self._size, 1024)
+        for name, column in self._columns.items():
+            grown: np.ndarray = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
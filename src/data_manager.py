@@ -1,8 +1,47 @@
 import os
+from collections.abc import Iterable, Iterator
 from typing import Any
 import pickle
 import json
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from src.instrumentation import instrumented
+
+
+class ParquetStreamWriter:
+    _file_path: str
+    _schema: pa.Schema | None
+    _writer: pq.ParquetWriter | None
+
+    def __init__(self, file_path: str, schema: pa.Schema | None = None):
+        self._file_path = file_path
+        self._schema = schema
+        self._writer = None
+
+    def __enter__(self) -> 'ParquetStreamWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @instrumented()
+    def write(self, data: pd.DataFrame):
+        # Every write becomes a separate row group. Without an explicit schema it is taken from the first chunk,
+        # so tables with nullable columns pass one: an all-None column of the first chunk would be inferred as null
+        table: pa.Table = pa.Table.from_pandas(data, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._file_path, table.schema)
+        elif not table.schema.equals(self._writer.schema):
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
 
 class DataManager:
@@ -18,19 +57,69 @@ class DataManager:
     def get_file_path(self, file_name: str) -> str:
         return os.path.abspath(os.path.join(self._data_dir, file_name))
 
-    def dump_pickle(self, data: Any, file_name: str) -> str:
+    @instrumented()
+    def dump_pickle(self, data: Any, file_name: str, atomic: bool = False) -> str:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
         if not os.path.exists(self._data_dir):
             os.makedirs(self._data_dir)
-        with open(file_path, 'wb') as f:
+        # Atomic dump writes a temporary file first, so a crash never leaves a partially written pickle
+        write_path: str = f'{file_path}.tmp' if atomic else file_path
+        with open(write_path, 'wb') as f:
             pickle.dump(data, f)
+            if atomic:
+                f.flush()
+                os.fsync(f.fileno())
+        if atomic:
+            os.replace(write_path, file_path)
         return file_path
 
+    def append_pickle(self, data: Any, file_name: str, offset: int = 0) -> int:
+        # Appends a pickle at the offset, dropping anything written after it. Returns the new end offset
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        if not os.path.exists(self._data_dir):
+            os.makedirs(self._data_dir)
+        with open(file_path, 'r+b' if os.path.exists(file_path) else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            pickle.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    @instrumented()
     def load_pickle(self, file_name: str) -> Any:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
         with open(file_path, 'rb') as f:
             return pickle.load(f)
 
+    def dump_pickle_stream(self, chunks: Iterable[Any], file_name: str) -> str:
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        if not os.path.exists(self._data_dir):
+            os.makedirs(self._data_dir)
+        with open(file_path, 'wb') as f:
+            for chunk in chunks:
+                pickle.dump(chunk, f)
+                f.flush()
+        return file_path
+
+    def load_pickle_stream(self, file_name: str, end_offset: int | None = None) -> Iterator[Any]:
+        # Single pickle dumped with dump_pickle is read as a stream of one chunk
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        with open(file_path, 'rb') as f:
+            while end_offset is None or f.tell() < end_offset:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def file_exists(self, file_name: str) -> bool:
+        return os.path.exists(os.path.abspath(os.path.join(self._data_dir, file_name)))
+
+    def delete_file(self, file_name: str):
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
     def load_csv(self, file_name: str) -> pd.DataFrame:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
         df: pd.DataFrame = pd.read_csv(file_path)
@@ -44,15 +133,49 @@ class DataManager:
 
     def dump_text(self, data: str, file_name: str) -> str:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        if not os.path.exists(self._data_dir):
+            os.makedirs(self._data_dir)
         with open(file_path, 'w') as f:
             f.write(data)
         return file_path
 
+    @instrumented()
     def dump_parquet(self, data: pd.DataFrame, file_name: str) -> str:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
         data.to_parquet(file_path)
         return file_path
 
+    def open_parquet_writer(self, file_name: str, schema: pa.Schema | None = None) -> ParquetStreamWriter:
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        if not os.path.exists(self._data_dir):
+            os.makedirs(self._data_dir)
+        return ParquetStreamWriter(file_path, schema=schema)
+
+    @instrumented()
     def load_parquet(self, file_name: str) -> pd.DataFrame:
         file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
         return pd.read_parquet(file_path)
+
+    @instrumented()
+    def dump_arrow(self, data: pa.Table, file_name: str) -> str:
+        # Uncompressed Arrow IPC (Feather v2) file with a single record batch, so every column is
+        # a contiguous buffer that is read back with memory mapping and without copying
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        feather.write_feather(data, file_path, compression='uncompressed', chunksize=max(len(data), 1))
+        return file_path
+
+    @instrumented()
+    def load_arrow(self, file_name: str, columns: list[str] | None = None) -> pa.Table:
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        return feather.read_table(file_path, columns=columns, memory_map=True)
+
+    def dump_numpy(self, data: np.ndarray, file_name: str) -> str:
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        np.save(file_path, data)
+        return file_path
+
+    def load_numpy(self, file_name: str, mmap_mode: str | None = None) -> np.ndarray:
+        file_path: str = os.path.abspath(os.path.join(self._data_dir, file_name))
+        return np.load(file_path, mmap_mode=mmap_mode)
@@ -1,12 +1,20 @@
+import io
 import re
 import ssl
 
+import numpy as np
 import pandas as pd
 import pg8000
-from urllib.parse import urlparse
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from urllib.parse import urlparse, parse_qs
 from pydantic import BaseModel
 import awswrangler as wr
 from src.data_manager import DataManager
+from src.instrumentation import instrumented
+
+HEX_DIGITS: np.ndarray = np.frombuffer(b'0123456789abcdef', np.uint8)
 
 
 class ConnectionParameters(BaseModel):
@@ -15,13 +23,16 @@ class ConnectionParameters(BaseModel):
     database: str
     user: str
     password: str
+    ssl: bool = True
 
 
 class Database:
     _conn: pg8000.Connection
+    _conn_params: ConnectionParameters
 
     def connect(self, conn_params: ConnectionParameters):
-        ssl_context = ssl.create_default_context()
+        ssl_context = ssl.create_default_context() if conn_params.ssl else None
+        self._conn_params = conn_params
         self._conn = pg8000.connect(
             host=conn_params.host,
             port=conn_params.port,
@@ -32,7 +43,14 @@ class Database:
         )
         return self._conn
 
-    def create_table_from_df(self, table_name: str, schema_name: str, df: pd.DataFrame):
+    @instrumented()
+    def create_table_from_df(
+            self,
+            table_name: str,
+            schema_name: str,
+            df: pd.DataFrame,
+            geometry_columns: list[str] | None = None
+    ):
         wr_dtype: dict[str, str] = {}
         for column, dtype in df.dtypes.items():
             if hasattr(dtype, 'tz') and dtype.tz is not None:
@@ -49,6 +67,68 @@ class Database:
             chunksize=1000,
             con=self._conn
         )
+        for column in geometry_columns or []:
+            self.convert_to_geometry(table_name, schema_name, column, wkb=self._is_binary_column(df[column]))
+
+    @instrumented()
+    def copy_table_from_parquet(
+            self,
+            table_name: str,
+            schema_name: str,
+            file_path: str,
+            geometry_columns: list[str] | None = None,
+            batch_size: int = 100_000
+    ):
+        # Bulk load with COPY FROM STDIN, streaming parquet row groups as CSV batches
+        parquet_file = pq.ParquetFile(file_path)
+        schema: pa.Schema = parquet_file.schema_arrow
+        columns_ddl: str = ', '.join(f'"{f.name}" {self._get_postgres_type(f.type)}' for f in schema)
+        columns: str = ', '.join(f'"{f.name}"' for f in schema)
+        with self._conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {schema_name}.{table_name} CASCADE')
+            cursor.execute(f'CREATE TABLE {schema_name}.{table_name} ({columns_ddl})')
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                stream = io.BytesIO()
+                pa_csv.write_csv(self._encode_binary_columns(batch), stream)
+                stream.seek(0)
+                cursor.execute(
+                    f'COPY {schema_name}.{table_name} ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)',
+                    stream=stream
+                )
+        self._conn.commit()
+        for column in geometry_columns or []:
+            wkb: bool = pa.types.is_binary(schema.field(column).type) or pa.types.is_large_binary(
+                schema.field(column).type
+            )
+            self.convert_to_geometry(table_name, schema_name, column, wkb=wkb)
+
+    @instrumented()
+    def append_from_table(self, table_name: str, source_table_name: str, schema_name: str):
+        # Moves rows of a staging table with the same columns into the target table
+        self.execute_sql(
+            f'INSERT INTO {schema_name}.{table_name} SELECT * FROM {schema_name}.{source_table_name}'
+        )
+        self.execute_sql(f'DROP TABLE {schema_name}.{source_table_name}')
+        self._conn.commit()
+
+    def clone(self) -> 'Database':
+        # Separate connection with the same parameters, e.g. for concurrent table loads
+        database = Database()
+        database.connect(self._conn_params)
+        return database
+
+    def close(self):
+        self._conn.close()
+
+    @instrumented()
+    def convert_to_geometry(self, table_name: str, schema_name: str, column: str, wkb: bool, srid: int = 4326):
+        # Requires PostGIS extension in the database
+        geometry_function: str = 'ST_GeomFromWKB' if wkb else 'ST_GeomFromText'
+        self.execute_sql(
+            f'ALTER TABLE {schema_name}.{table_name} ALTER COLUMN {column} TYPE geometry(Geometry, {srid}) '
+            f'USING {geometry_function}({column}, {srid})'
+        )
+        self._conn.commit()
 
     def execute_sql(self, sql: str):
         cursor = self._conn.cursor()
@@ -58,13 +138,79 @@ class Database:
     def create_schema(self, schema_name: str):
         self.execute_sql(f'CREATE SCHEMA IF NOT EXISTS {schema_name}')
 
+    @staticmethod
+    def _get_postgres_type(data_type: pa.DataType) -> str:
+        if pa.types.is_boolean(data_type):
+            return 'boolean'
+        if pa.types.is_int8(data_type) or pa.types.is_int16(data_type):
+            return 'smallint'
+        if pa.types.is_int32(data_type):
+            return 'integer'
+        if pa.types.is_integer(data_type):
+            return 'bigint'
+        if pa.types.is_float32(data_type):
+            return 'real'
+        if pa.types.is_floating(data_type):
+            return 'double precision'
+        if pa.types.is_timestamp(data_type):
+            return 'timestamptz' if data_type.tz is not None else 'timestamp'
+        if pa.types.is_date(data_type):
+            return 'date'
+        if pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+            return 'bytea'
+        return 'text'
+
+    @staticmethod
+    def _encode_binary_columns(batch: pa.RecordBatch) -> pa.RecordBatch:
+        # CSV has no binary type, bytea is passed in hex format
+        arrays: list[pa.Array] = []
+        for column in batch.columns:
+            if pa.types.is_binary(column.type) or pa.types.is_large_binary(column.type):
+                column = Database._to_bytea_hex(column)
+            arrays.append(column)
+        return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+    @staticmethod
+    def _to_bytea_hex(column: pa.Array) -> pa.Array:
+        # Whole column at once on the arrow buffers: every value becomes \x followed by two hex digits per byte
+        large: bool = pa.types.is_large_binary(column.type)
+        offsets: np.ndarray = np.frombuffer(column.buffers()[1], np.int64 if large else np.int32)
+        offsets = offsets[column.offset:column.offset + len(column) + 1].astype(np.int64)
+        data: np.ndarray = np.frombuffer(column.buffers()[2] or b'', np.uint8)[offsets[0]:offsets[-1]]
+        offsets -= offsets[0]
+        rows: np.ndarray = np.arange(len(column) + 1)
+        hex_offsets: np.ndarray = offsets * 2 + rows * 2
+        hex_data: np.ndarray = np.empty(hex_offsets[-1], np.uint8)
+        hex_data[hex_offsets[:-1]] = ord('\\')
+        hex_data[hex_offsets[:-1] + 1] = ord('x')
+        # Each byte of the row is shifted by the prefixes of this and all previous rows
+        positions: np.ndarray = np.arange(len(data)) * 2 + np.repeat(rows[1:], np.diff(offsets)) * 2
+        hex_data[positions] = HEX_DIGITS[data >> 4]
+        hex_data[positions + 1] = HEX_DIGITS[data & 0x0F]
+        validity: pa.Buffer | None = None
+        if column.null_count:
+            validity = column.is_valid().buffers()[1]
+        return pa.Array.from_buffers(
+            pa.large_string() if large else pa.string(),
+            len(column),
+            [validity, pa.py_buffer(hex_offsets.astype(np.int64 if large else np.int32)), pa.py_buffer(hex_data)],
+            null_count=column.null_count
+        )
+
+    @staticmethod
+    def _is_binary_column(column: pd.Series) -> bool:
+        values: pd.Series = column.dropna()
+        return len(values) > 0 and isinstance(values.iloc[0], bytes)
+
     @staticmethod
     def parse_jdbc_url(jdbc_url: str) -> ConnectionParameters:
         parsed_url = urlparse(jdbc_url)
+        query: dict[str, list[str]] = parse_qs(parsed_url.query)
         return ConnectionParameters(
             host=parsed_url.hostname,
             port=parsed_url.port or 5432,
             database=parsed_url.path.lstrip('/'),
             user=parsed_url.username,
-            password=parsed_url.password
+            password=parsed_url.password,
+            ssl=query.get('sslmode', ['require'])[0] != 'disable'
         )
@@ -1,13 +1,38 @@
-from typing import Literal
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from types import NoneType, UnionType
+from typing import Literal, TypeVar, Union, get_args, get_origin
 import datetime
-from zoneinfo import ZoneInfo
 import logging
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from pydantic import BaseModel
 from faker import Faker
 from src.data_manager import DataManager
-from src.ride_simulator import SimulationState, RideRoute
+from src.faker_providers.person import Person
+from src.ride_simulator import (
+    SimulationState, RideRoute, RideDetails, CanceledRide, RideDetailsLog, CanceledRideLog
+)
 from src.database import Database
+from src.geometry import GeometryFormat, encode_linestrings
+from src.instrumentation import instrumented
+from src.simulation_store import SimulationStore
+
+ItemT = TypeVar('ItemT')
+
+DEFAULT_TABLES: list[str] = ['trips', 'payments', 'users', 'events']
+# Routes are loaded only when requested in tables. Their geometry is converted with convert_geometry,
+# which requires PostGIS in the database
+GEOMETRY_COLUMNS: dict[str, list[str]] = {'routes': ['points']}
+PARTITIONED_TABLES: list[str] = ['trips', 'payments', 'events', 'routes']
+ARROW_TYPES: dict[type, pa.DataType] = {
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    datetime.date: pa.date32(),
+}
 
 
 class Tariff(BaseModel):
@@ -33,7 +58,7 @@ class Trip(BaseModel):
 
 class Route(BaseModel):
     trip_id: int
-    points: str
+    points: str | bytes
     speed_avg: float
 
 
@@ -60,50 +85,225 @@ class Event(BaseModel):
     type_id: int
 
 
+def model_arrow_schema(model: type[BaseModel]) -> pa.Schema:
+    # Optional fields take the type of their value, literals the type of their first option
+    fields: list[pa.Field] = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if get_origin(annotation) in (Union, UnionType):
+            annotation = next(a for a in get_args(annotation) if a is not NoneType)
+        if get_origin(annotation) is Literal:
+            annotation = type(get_args(annotation)[0])
+        fields.append(pa.field(name, ARROW_TYPES[annotation]))
+    return pa.schema(fields)
+
+
 class DatabaseLoader:
     _data_manager: DataManager
     _database: Database
     _fake: Faker
     _logger: logging.Logger
 
-    def __init__(self, database: Database, fake: Faker):
-        self._data_manager = DataManager()
+    def __init__(self, database: Database, fake: Faker, data_manager: DataManager | None = None):
+        self._data_manager = data_manager or DataManager()
         self._database = database
         self._fake = fake
         self._logger = logging.getLogger(__class__.__name__)
         pd.options.display.width = 0
 
-    def prepare_data(self, state_file: str, routes_file: str, tariff: Tariff):
+    @instrumented()
+    def prepare_data(
+            self,
+            state_file: str,
+            routes_file: str,
+            tariff: Tariff,
+            chunk_size: int | None = None,
+            route_geometry: GeometryFormat = 'wkt',
+            partition: str | None = None
+    ):
+        # Partition is set for incremental states, its files are written next to the full tables
+        if chunk_size is not None:
+            self._prepare_data_chunked(state_file, routes_file, tariff, chunk_size, route_geometry, partition)
+            return
         self._logger.info('Loading state from %s', state_file)
-        state: SimulationState = self._data_manager.load_pickle(state_file)
+        state: SimulationState = SimulationStore(self._data_manager).load_state(state_file)
         self._logger.info('Loading routes from %s', routes_file)
-        routes: list[RideRoute] = self._data_manager.load_pickle(routes_file)
+        routes: list[RideRoute] = [r for chunk in self._data_manager.load_pickle_stream(routes_file) for r in chunk]
         self._logger.info('Preparing trips and payments')
-        trips, payments = self._prepare_trips_and_payments(state, tariff=tariff)
-        self._dump_models_to_parquet(trips, 'trips.parquet')
-        self._dump_models_to_parquet(payments, 'payments.parquet')
-        self._logger.info('Preparing users')
-        users: list[User] = self._prepare_users(state)
-        self._dump_models_to_parquet(users, 'users.parquet')
+        trips, payments = self._prepare_trips_and_payments(state, tariff=tariff, first_payment_id=state.first_ride_id)
+        self._data_manager.dump_parquet(trips, self._get_table_file_name('trips', partition))
+        self._data_manager.dump_parquet(payments, self._get_table_file_name('payments', partition))
+        if partition is None:
+            self._logger.info('Preparing users')
+            users: list[User] = self._prepare_users(state)
+            self._dump_models_to_parquet(users, 'users.parquet')
         self._logger.info('Preparing events')
-        events: list[Event] = self._prepare_events(state)
-        self._dump_models_to_parquet(events, 'events.parquet')
+        events: pd.DataFrame = self._prepare_events(state)
+        self._data_manager.dump_parquet(events, self._get_table_file_name('events', partition))
         self._logger.info('Preparing routes')
-        routes: list[Route] = self._prepare_routes(routes)
-        self._dump_models_to_parquet(routes, 'routes.parquet')
+        self._data_manager.dump_parquet(
+            self._prepare_routes(routes, route_geometry), self._get_table_file_name('routes', partition)
+        )
+
+    def _prepare_data_chunked(
+            self,
+            state_file: str,
+            routes_file: str,
+            tariff: Tariff,
+            chunk_size: int,
+            route_geometry: GeometryFormat,
+            partition: str | None = None
+    ):
+        # Every chunk is written as a separate row group, so only one chunk of every table is kept in memory.
+        # Events are sorted and duplicated within their chunk only: ride events come first, cancellation
+        # events after them, so unlike the non-chunked file the events file is not ordered by timestamp
+        self._logger.info('Loading state from %s', state_file)
+        state: SimulationState = SimulationStore(self._data_manager).load_state(state_file)
+        self._logger.info('Preparing trips and payments in chunks of %d', chunk_size)
+        with (
+            self._data_manager.open_parquet_writer(self._get_table_file_name('trips', partition)) as trips_writer,
+            self._data_manager.open_parquet_writer(self._get_table_file_name('payments', partition)) as payments_writer
+        ):
+            payments_count: int = 0
+            for ride_details in self._iter_chunks(state.ride_details, chunk_size):
+                trips, payments = self._prepare_trips_and_payments(
+                    state,
+                    tariff=tariff,
+                    ride_details=ride_details,
+                    first_payment_id=state.first_ride_id + payments_count
+                )
+                payments_count += len(payments)
+                trips_writer.write(trips)
+                payments_writer.write(payments)
+        if partition is None:
+            self._logger.info('Preparing users in chunks of %d', chunk_size)
+            with self._data_manager.open_parquet_writer('users.parquet', model_arrow_schema(User)) as users_writer:
+                for persons in self._iter_chunks(list(state.persons.values()), chunk_size):
+                    users_writer.write(self._models_to_df(self._prepare_users(state, persons=persons)))
+        self._logger.info('Preparing events in chunks of %d', chunk_size)
+        with self._data_manager.open_parquet_writer(self._get_table_file_name('events', partition)) as events_writer:
+            for ride_details in self._iter_chunks(state.ride_details, chunk_size):
+                events: pd.DataFrame = self._prepare_events(state, ride_details=ride_details, cancelled_rides=[])
+                events_writer.write(events)
+            for cancelled_rides in self._iter_chunks(state.cancelled_rides, chunk_size):
+                events = self._prepare_events(state, ride_details=[], cancelled_rides=cancelled_rides)
+                events_writer.write(events)
+        self._logger.info('Preparing routes from %s in chunks of %d', routes_file, chunk_size)
+        with self._data_manager.open_parquet_writer(self._get_table_file_name('routes', partition)) as routes_writer:
+            for routes_in in self._iter_route_chunks(routes_file, chunk_size):
+                routes_writer.write(self._prepare_routes(routes_in, route_geometry))
 
-    def create_table_from_parquet(self, table_name: str, schema_name: str, file_name: str):
+    def _iter_route_chunks(self, routes_file: str, chunk_size: int) -> Iterator[list[RideRoute]]:
+        routes: list[RideRoute] = []
+        for routes_chunk in self._data_manager.load_pickle_stream(routes_file):
+            routes.extend(routes_chunk)
+            while len(routes) >= chunk_size:
+                yield routes[:chunk_size]
+                routes = routes[chunk_size:]
+        if routes:
+            yield routes
+
+    @staticmethod
+    def _iter_chunks(items: Sequence[ItemT], chunk_size: int) -> Iterator[Sequence[ItemT]]:
+        for i in range(0, len(items), chunk_size):
+            yield items[i:i + chunk_size]
+
+    @instrumented()
+    def create_table_from_parquet(
+            self,
+            table_name: str,
+            schema_name: str,
+            file_name: str,
+            geometry_columns: list[str] | None = None,
+            bulk_copy: bool = False,
+            database: Database | None = None,
+            append: bool = False
+    ):
+        database = database or self._database
+        if append:
+            # New partition is loaded into a staging table first, so geometry is converted the same way
+            staging_table_name: str = f'{table_name}_staging'
+            self.create_table_from_parquet(
+                staging_table_name, schema_name, file_name, geometry_columns, bulk_copy=bulk_copy, database=database
+            )
+            self._logger.info('Appending %s to table %s in schema %s', file_name, table_name, schema_name)
+            database.append_from_table(table_name, staging_table_name, schema_name)
+            return
+        if bulk_copy:
+            self._logger.info('Copying %s into table %s in schema %s', file_name, table_name, schema_name)
+            database.copy_table_from_parquet(
+                table_name, schema_name, self._data_manager.get_file_path(file_name), geometry_columns=geometry_columns
+            )
+            return
         self._logger.info('Loading data from %s', file_name)
         df = self._data_manager.load_parquet(file_name)
         self._logger.info('Creating table %s in schema %s', table_name, schema_name)
-        self._database.create_table_from_df(table_name, schema_name, df)
+        database.create_table_from_df(table_name, schema_name, df, geometry_columns=geometry_columns)
+
+    @instrumented()
+    def load_data(
+            self,
+            schema_name: str,
+            tables: list[str] | None = None,
+            bulk_copy: bool = False,
+            max_workers: int = 1,
+            partition: str | None = None,
+            convert_geometry: bool = False
+    ):
+        # With a partition, its files are appended to the existing tables. Users are not partitioned
+        tables = tables or DEFAULT_TABLES
+        if partition is not None:
+            tables = [t for t in tables if t in PARTITIONED_TABLES]
+        if max_workers <= 1:
+            for table_name in tables:
+                self._load_table(table_name, schema_name, bulk_copy, partition, convert_geometry, self._database)
+            return
+        # Tables are independent, each worker loads through its own connection
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._load_table_with_new_connection, t, schema_name, bulk_copy, partition, convert_geometry
+                )
+                for t in tables
+            ]
+            for future in futures:
+                future.result()
 
-    def load_data(self, schema_name: str):
-        self.create_table_from_parquet('trips', schema_name, 'trips.parquet')
-        # self.create_table_from_parquet('payments', schema_name, 'payments.parquet')
-        self.create_table_from_parquet('users', schema_name, 'users.parquet')
-        self.create_table_from_parquet('events', schema_name, 'events.parquet')
-        # self.create_table_from_parquet('routes', schema_name, 'routes.parquet')
+    def _load_table_with_new_connection(
+            self,
+            table_name: str,
+            schema_name: str,
+            bulk_copy: bool,
+            partition: str | None,
+            convert_geometry: bool
+    ):
+        database: Database = self._database.clone()
+        try:
+            self._load_table(table_name, schema_name, bulk_copy, partition, convert_geometry, database)
+        finally:
+            database.close()
+
+    def _load_table(
+            self,
+            table_name: str,
+            schema_name: str,
+            bulk_copy: bool,
+            partition: str | None,
+            convert_geometry: bool,
+            database: Database
+    ):
+        geometry_columns: list[str] | None = GEOMETRY_COLUMNS.get(table_name) if convert_geometry else None
+        self.create_table_from_parquet(
+            table_name, schema_name, self._get_table_file_name(table_name, partition),
+            geometry_columns=geometry_columns, bulk_copy=bulk_copy, database=database,
+            append=partition is not None
+        )
+
+    @staticmethod
+    def _get_table_file_name(table_name: str, partition: str | None = None) -> str:
+        if partition is None:
+            return f'{table_name}.parquet'
+        return f'{table_name}_{partition}.parquet'
 
     def create_version_table(self, schema_name: str, data_version: str):
         df = pd.DataFrame([{
@@ -112,46 +312,55 @@ class DatabaseLoader:
         }])
         self._database.create_table_from_df('version', schema_name, df)
 
-    def _prepare_trips_and_payments(self, state: SimulationState, tariff: Tariff) -> tuple[list[Trip], list[Payment]]:
-        trips: list[Trip] = []
-        payments: list[Payment] = []
-        for r in state.ride_details:
-            trip_start_hour: int = r.start_datetime.hour
-            if tariff.day_start_hour <= trip_start_hour < tariff.night_start_hour:
-                tariff_price: float = tariff.day
-            else:
-                tariff_price = tariff.night
-            if r.promo_code:
-                price: int = 0
-            else:
-                price = int(r.duration_s / 60 * tariff_price * 100)
-            trip = Trip(
-                id=r.id,
-                user_id=r.person_id,
-                scooter_hw_id=state.scooters[r.scooter_id].hardware_id,
-                started_at=r.start_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow')),
-                finished_at=r.end_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow')),
-                start_lat=state.parking[r.start_parking_id].coordinates[0],
-                start_lon=state.parking[r.start_parking_id].coordinates[1],
-                finish_lat=state.parking[r.end_parking_id].coordinates[0],
-                finish_lon=state.parking[r.end_parking_id].coordinates[1],
-                distance=r.distance_m,
-                price=price
-            )
-            payment = Payment(
-                id=len(payments) + 1,
-                trip_id=r.id,
-                price=price,
-                tariff=int(tariff_price * 100),
-                promo=r.promo_code
-            )
-            trips.append(trip)
-            payments.append(payment)
+    @instrumented()
+    def _prepare_trips_and_payments(
+            self,
+            state: SimulationState,
+            tariff: Tariff,
+            ride_details: Sequence[RideDetails] | None = None,
+            first_payment_id: int = 1
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        rides: pd.DataFrame = self._ride_details_to_df(state.ride_details if ride_details is None else ride_details)
+        trip_start_hour: pd.Series = rides['start_datetime'].dt.hour
+        tariff_price: np.ndarray = np.where(
+            (tariff.day_start_hour <= trip_start_hour) & (trip_start_hour < tariff.night_start_hour),
+            float(tariff.day),
+            float(tariff.night)
+        )
+        price: np.ndarray = np.where(
+            rides['promo_code'], 0, (rides['duration_s'].to_numpy() / 60 * tariff_price * 100).astype(np.int64)
+        )
+        hardware_id: pd.Series = pd.Series({s.id: s.hardware_id for s in state.scooters.values()})
+        lat: pd.Series = pd.Series({p.id: p.coordinates[0] for p in state.parking.values()})
+        lon: pd.Series = pd.Series({p.id: p.coordinates[1] for p in state.parking.values()})
+        trips = pd.DataFrame({
+            'id': rides['id'].astype(np.int64),
+            'user_id': rides['person_id'].astype(np.int64),
+            'scooter_hw_id': rides['scooter_id'].map(hardware_id),
+            'started_at': self._localize_moscow(rides['start_datetime']),
+            'finished_at': self._localize_moscow(rides['end_datetime']),
+            'start_lat': rides['start_parking_id'].map(lat),
+            'start_lon': rides['start_parking_id'].map(lon),
+            'finish_lat': rides['end_parking_id'].map(lat),
+            'finish_lon': rides['end_parking_id'].map(lon),
+            'distance': rides['distance_m'].astype(np.float64),
+            'price': price
+        })
+        payments = pd.DataFrame({
+            'id': np.arange(first_payment_id, first_payment_id + len(rides), dtype=np.int64),
+            'trip_id': rides['id'].astype(np.int64),
+            'price': price,
+            'tariff': (tariff_price * 100).astype(np.int64),
+            'promo': rides['promo_code'].astype(bool)
+        })
         return trips, payments
 
-    def _prepare_users(self, state: SimulationState) -> list[User]:
+    @instrumented()
+    def _prepare_users(self, state: SimulationState, persons: Sequence[Person] | None = None) -> list[User]:
+        if persons is None:
+            persons = list(state.persons.values())
         users: list[User] = []
-        for p in state.persons.values():
+        for p in persons:
             sex: Literal['F', 'M'] | None = p.sex if self._fake.boolean(chance_of_getting_true=90) else None
             last_name: str | None = p.last_name if self._fake.boolean(chance_of_getting_true=60) else None
             user = User(
@@ -165,70 +374,85 @@ class DatabaseLoader:
             users.append(user)
         return users
 
-    def _prepare_events(self, state: SimulationState) -> list[Event]:
-        events: list[Event] = []
-        for r in state.ride_details:
-            if r.start_datetime == r.desired_start_datetime:
-                start_datetime: datetime.datetime = r.start_datetime + datetime.timedelta(seconds=10)
-            else:
-                start_datetime = r.start_datetime
-            events.append(Event(
-                user_id=r.person_id,
-                timestamp=r.desired_start_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow'))
-                .astimezone(ZoneInfo('UTC')).replace(tzinfo=None),
-                type_id=0  # start_search
-            ))
-            events.append(Event(
-                user_id=r.person_id,
-                timestamp=start_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow'))
-                .astimezone(ZoneInfo('UTC')).replace(tzinfo=None),
-                type_id=1  # book_scooter
-            ))
-            events.append(Event(
-                user_id=r.person_id,
-                timestamp=r.end_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow'))
-                .astimezone(ZoneInfo('UTC')).replace(tzinfo=None),
-                type_id=2  # release_scooter
-            ))
-        for cr in state.cancelled_rides:
-            events.append(Event(
-                user_id=cr.person_id,
-                timestamp=cr.start_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow'))
-                .astimezone(ZoneInfo('UTC')).replace(tzinfo=None),
-                type_id=0  # start_search
-            ))
-            events.append(Event(
-                user_id=cr.person_id,
-                timestamp=cr.start_datetime.replace(tzinfo=ZoneInfo('Europe/Moscow'))
-                          .astimezone(ZoneInfo('UTC')).replace(tzinfo=None) + datetime.timedelta(
-                    seconds=cr.find_available_time_s),
-                type_id=3  # cancel_search
-            ))
+    @instrumented()
+    def _prepare_events(
+            self,
+            state: SimulationState,
+            ride_details: Sequence[RideDetails] | None = None,
+            cancelled_rides: Sequence[CanceledRide] | None = None
+    ) -> pd.DataFrame:
+        rides: pd.DataFrame = self._ride_details_to_df(state.ride_details if ride_details is None else ride_details)
+        cancelled: pd.DataFrame = self._cancelled_rides_to_df(
+            state.cancelled_rides if cancelled_rides is None else cancelled_rides
+        )
+        start_datetime: pd.Series = rides['start_datetime'].where(
+            rides['start_datetime'] != rides['desired_start_datetime'],
+            rides['start_datetime'] + pd.Timedelta(seconds=10)
+        )
+        cancelled_start: pd.Series = self._moscow_to_utc(cancelled['start_datetime'])
+        # Every ride gives start_search (0), book_scooter (1) and release_scooter (2) events in a row,
+        # every cancelled ride gives start_search (0) and cancel_search (3) events
+        ride_timestamps: np.ndarray = np.stack([
+            self._moscow_to_utc(rides['desired_start_datetime']).to_numpy(),
+            self._moscow_to_utc(start_datetime).to_numpy(),
+            self._moscow_to_utc(rides['end_datetime']).to_numpy()
+        ], axis=1)
+        cancelled_timestamps: np.ndarray = np.stack([
+            cancelled_start.to_numpy(),
+            (cancelled_start + pd.to_timedelta(cancelled['find_available_time_s'], unit='s')).to_numpy()
+        ], axis=1)
+        events = pd.DataFrame({
+            'user_id': np.concatenate([
+                np.repeat(rides['person_id'].to_numpy(np.int64), 3),
+                np.repeat(cancelled['person_id'].to_numpy(np.int64), 2)
+            ]),
+            'timestamp': np.concatenate([ride_timestamps.ravel(), cancelled_timestamps.ravel()]),
+            'type_id': np.concatenate([
+                np.tile(np.array([0, 1, 2], dtype=np.int64), len(rides)),
+                np.tile(np.array([0, 3], dtype=np.int64), len(cancelled))
+            ])
+        })
         # Introduce duplicates
         num_duplicates: int = int(len(events) * 0.05)
-        events_to_duplicate = self._fake.random.choices(events, k=num_duplicates)
-        events.extend(events_to_duplicate)
-        events = sorted(events, key=lambda e: e.timestamp)
+        duplicate_index: list[int] = self._fake.random.choices(range(len(events)), k=num_duplicates)
+        events = pd.concat([events, events.iloc[duplicate_index]], ignore_index=True)
+        events = events.sort_values('timestamp', kind='stable', ignore_index=True)
         return events
 
-    def _prepare_routes(self, routes_in: list[RideRoute]) -> list[Route]:
-        routes: list[Route] = []
-        for r in routes_in:
-            points: list[tuple[float, float]] = r.points.copy()
-            if len(points) == 1:
-                points.extend(points)
-            points_str: str = ''
-            for p in points:
-                points_str += f'{p[0]} {p[1]},'
-            route = Route(
-                trip_id=r.ride_id,
-                points=f'LINESTRING({points_str[:-1]})',
-                speed_avg=r.speed_avg
-            )
-            routes.append(route)
-        return routes
+    @staticmethod
+    @instrumented()
+    def _prepare_routes(routes_in: list[RideRoute], geometry_format: GeometryFormat = 'wkt') -> pd.DataFrame:
+        return pd.DataFrame({
+            'trip_id': np.fromiter((r.ride_id for r in routes_in), dtype=np.int64, count=len(routes_in)),
+            'points': encode_linestrings([r.points for r in routes_in], geometry_format),
+            'speed_avg': np.fromiter((r.speed_avg for r in routes_in), dtype=np.float64, count=len(routes_in))
+        })
+
+    @staticmethod
+    def _ride_details_to_df(ride_details: Sequence[RideDetails]) -> pd.DataFrame:
+        if isinstance(ride_details, RideDetailsLog):
+            return ride_details.to_pandas()
+        return RideDetailsLog.from_models(ride_details).to_pandas()
+
+    @staticmethod
+    def _cancelled_rides_to_df(cancelled_rides: Sequence[CanceledRide]) -> pd.DataFrame:
+        if isinstance(cancelled_rides, CanceledRideLog):
+            return cancelled_rides.to_pandas()
+        return CanceledRideLog.from_models(cancelled_rides).to_pandas()
+
+    @staticmethod
+    def _localize_moscow(dt: pd.Series) -> pd.Series:
+        return dt.astype('datetime64[ns]').dt.tz_localize('Europe/Moscow')
+
+    @classmethod
+    def _moscow_to_utc(cls, dt: pd.Series) -> pd.Series:
+        return cls._localize_moscow(dt).dt.tz_convert('UTC').dt.tz_localize(None)
 
     def _dump_models_to_parquet(self, data: list[BaseModel], file_name: str):
+        self._data_manager.dump_parquet(self._models_to_df(data), file_name)
+
+    @staticmethod
+    @instrumented()
+    def _models_to_df(data: list[BaseModel]) -> pd.DataFrame:
         data_dict: list[dict] = [d.model_dump() for d in data]
-        df = pd.DataFrame(data_dict)
-        self._data_manager.dump_parquet(df, file_name)
+        return pd.DataFrame(data_dict)
@@ -0,0 +1,75 @@
+import numpy as np
+import networkx as nx
+from networkx import MultiDiGraph
+from src.city_utils import CityZone
+from src.routing_graph import RoutingGraph
+
+
+class DistanceMatrix:
+    _graph: RoutingGraph | None
+    _parking_nodes: dict[int, int]
+    _distances: np.ndarray
+
+    def __init__(
+            self,
+            parking_nodes: dict[int, int],
+            graph: RoutingGraph | MultiDiGraph | None = None,
+            distances: np.ndarray | None = None
+    ):
+        if isinstance(graph, MultiDiGraph):
+            graph = RoutingGraph.from_graph(graph)
+        self._graph = graph
+        self._parking_nodes = parking_nodes
+        if distances is None:
+            size: int = max(parking_nodes) + 1
+            # NaN marks rows that were not computed yet
+            distances = np.full((size, size), np.nan, dtype=np.float32)
+        self._distances = distances
+
+    @classmethod
+    def from_city_zone(cls, city_zone: CityZone, distances: np.ndarray | None = None) -> 'DistanceMatrix':
+        parking_nodes: dict[int, int] = {p.id: p.graph_node for p in city_zone.parking}
+        return cls(parking_nodes=parking_nodes, graph=city_zone.get_routing_graph(), distances=distances)
+
+    @property
+    def distances(self) -> np.ndarray:
+        return self._distances
+
+    def distance(self, start_parking_id: int, end_parking_id: int) -> float:
+        distance_m: float = self._distances[start_parking_id, end_parking_id]
+        if np.isnan(distance_m):
+            self._compute_row(start_parking_id)
+            distance_m = self._distances[start_parking_id, end_parking_id]
+        if np.isinf(distance_m):
+            raise nx.NetworkXNoPath(f'No path between parking {start_parking_id} and {end_parking_id}')
+        return float(distance_m)
+
+    def compute_all(self, max_batch_bytes: int = 256 * 2 ** 20) -> np.ndarray:
+        # Rows are computed in batches, one SciPy call per batch. Each call builds a dense float64 matrix
+        # of batch rows by all graph nodes, max_batch_bytes bounds it and so the peak memory on top of the distances
+        missing: list[int] = [
+            parking_id for parking_id in self._parking_nodes if np.isnan(self._distances[parking_id, parking_id])
+        ]
+        if not missing:
+            return self._distances
+        if self._graph is None:
+            raise ValueError(f'Distances from parking {missing} are not computed and graph is not provided')
+        batch_size: int = max(1, max_batch_bytes // (len(self._graph) * np.dtype(np.float64).itemsize))
+        for i in range(0, len(missing), batch_size):
+            self._compute_rows(missing[i:i + batch_size])
+        return self._distances
+
+    def _compute_row(self, parking_id: int):
+        self._compute_rows([parking_id])
+
+    def _compute_rows(self, parking_ids: list[int]):
+        if self._graph is None:
+            raise ValueError(f'Distances from parking {parking_ids} are not computed and graph is not provided')
+        node_distances: np.ndarray = self._graph.distances_from(self._parking_nodes[p] for p in parking_ids)
+        target_parking_ids: np.ndarray = np.fromiter(self._parking_nodes.keys(), dtype=np.int64)
+        target_positions: np.ndarray = np.fromiter(
+            (self._graph.node_position(node) for node in self._parking_nodes.values()),
+            dtype=np.int64,
+            count=len(self._parking_nodes)
+        )
+        self._distances[np.ix_(parking_ids, target_parking_ids)] = node_distances[:, target_positions]
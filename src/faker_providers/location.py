@@ -1,6 +1,8 @@
 from faker.providers import BaseProvider
 from pydantic import BaseModel
 from networkx import MultiDiGraph
+from src.routing_graph import RoutingGraph
+from src.spatial_index import NodeIndex
 
 
 class Location(BaseModel):
@@ -9,10 +11,21 @@ class Location(BaseModel):
 
 class LocationProvider(BaseProvider):
 
-    def __init__(self, generator, city_graph: MultiDiGraph):
+    def __init__(self, generator, city_graph: MultiDiGraph | RoutingGraph, node_index: NodeIndex | None = None):
         super().__init__(generator)
-        self._city_graph: MultiDiGraph = city_graph
+        self._city_graph: MultiDiGraph | RoutingGraph = city_graph
+        self._node_index: NodeIndex | None = node_index
 
     def location_node(self) -> int:
         nodes: list[int] = list(self._city_graph.nodes)
-        return self.random_element(nodes)
+        return int(self.random_element(nodes))
+
+    def nearest_location_node(self, location: Location) -> int:
+        return int(self.nearest_location_nodes([location])[0])
+
+    def nearest_location_nodes(self, locations: list[Location]) -> list[int]:
+        if self._node_index is None and isinstance(self._city_graph, RoutingGraph):
+            self._node_index = NodeIndex.from_routing_graph(self._city_graph)
+        elif self._node_index is None:
+            self._node_index = NodeIndex.from_graph(self._city_graph)
+        return self._node_index.nearest_nodes_by_coordinates([loc.coordinates for loc in locations]).tolist()
@@ -1,3 +1,4 @@
+from collections import deque
 from pydantic import BaseModel
 from faker.providers import BaseProvider
 from src.faker_providers.scooter import Scooter
@@ -10,7 +11,8 @@ class Parking(BaseModel):
     coordinates: tuple[float, float]
     graph_node: int
     max_capacity: int
-    scooters: list[Scooter]
+    # Scooters are picked up in the order they were returned
+    scooters: deque[Scooter]
     closest_parking_id: list[int]
 
 
@@ -1,11 +1,16 @@
-from typing import Literal
+from typing import ClassVar, Literal
 import math
 import datetime
+import numpy as np
 from faker.providers import BaseProvider
 from pydantic import BaseModel
 import phonenumbers
+from src.columnar import ColumnarTable
 from src.faker_providers.parking import Parking
 
+# Names drawn through Faker per sex for bulk generation, persons then pick from the pools
+NAME_POOL_SIZE: int = 1000
+
 
 class Person(BaseModel):
     id: int
@@ -27,6 +32,30 @@ class Person(BaseModel):
     speed_average: float
 
 
+class PersonTable(ColumnarTable[Person]):
+    # Parking ids are None for persons without work trips, so they are kept as Python objects
+    model: ClassVar[type[BaseModel]] = Person
+    dtypes: ClassVar[dict[str, np.dtype | str]] = {
+        'id': np.int64,
+        'sex': 'U1',
+        'birth_date': 'datetime64[D]',
+        'first_name': object,
+        'last_name': object,
+        'phone': 'U12',
+        'promo_codes': np.int8,
+        'work_trips': bool,
+        'home_parking_id': object,
+        'work_parking_id': object,
+        'work_start_hour': np.float64,
+        'work_end_hour': np.float64,
+        'occasional_workday_trip_chance': np.int8,
+        'occasional_weekend_trip_chance': np.int8,
+        'skip_trip_chance': np.int8,
+        'find_available_time_limit_s': np.int16,
+        'speed_average': np.float64,
+    }
+
+
 class PersonProvider(BaseProvider):
 
     def __init__(self, generator):
@@ -72,6 +101,72 @@ class PersonProvider(BaseProvider):
             speed_average=self.random_int(500, 1500) / 100
         )
 
+    def persons(self, parking: list[Parking], base_year: int, count: int) -> PersonTable:
+        # Bulk version of person() with the same distributions. Numeric attributes are NumPy draws seeded
+        # from Faker, so Faker.seed() keeps the table reproducible
+        rng: np.random.Generator = np.random.default_rng(self.generator.random.getrandbits(64))
+        male: np.ndarray = rng.integers(0, 2, size=count).astype(bool)
+        first_name: np.ndarray = np.empty(count, dtype=object)
+        last_name: np.ndarray = np.empty(count, dtype=object)
+        for mask, first_names, last_names in (
+                (male, self._name_pool(self.generator.first_name_male), self._name_pool(self.generator.last_name_male)),
+                (~male, self._name_pool(self.generator.first_name_female),
+                 self._name_pool(self.generator.last_name_female))
+        ):
+            first_name[mask] = rng.choice(first_names, size=int(mask.sum()))
+            last_name[mask] = rng.choice(last_names, size=int(mask.sum()))
+        work_trips: np.ndarray = rng.integers(1, 101, size=count) <= 30
+        parking_id: np.ndarray = np.array([p.id for p in parking], dtype=np.int64)
+        work_parking_id: np.ndarray = np.full(count, None, dtype=object)
+        home_parking_id: np.ndarray = np.full(count, None, dtype=object)
+        workers_count: int = int(work_trips.sum())
+        work_parking_id[work_trips] = rng.choice(parking_id, size=workers_count).tolist()
+        home_parking_id[work_trips] = rng.choice(parking_id, size=workers_count).tolist()
+        first_id: int = self._person_id
+        self._person_id += count
+        return PersonTable.from_columns({
+            'id': np.arange(first_id, first_id + count),
+            'sex': np.where(male, 'M', 'F'),
+            'birth_date': self._birth_dates(rng, self._ages(rng, count, 18, 99), base_year),
+            'first_name': first_name,
+            'last_name': last_name,
+            'phone': self._phones(rng, count),
+            'promo_codes': rng.integers(0, 4, size=count),
+            'work_trips': work_trips,
+            'home_parking_id': home_parking_id,
+            'work_parking_id': work_parking_id,
+            'work_start_hour': rng.integers(800, 1001, size=count) / 100,
+            'work_end_hour': rng.integers(1700, 1901, size=count) / 100,
+            # Same as randomize_nb_elements(10)
+            'occasional_workday_trip_chance': 10 * rng.integers(60, 141, size=count) // 100,
+            'occasional_weekend_trip_chance': rng.integers(0, 21, size=count),
+            'skip_trip_chance': 10 * rng.integers(60, 141, size=count) // 100,
+            'find_available_time_limit_s': rng.integers(0, 10 * 60 + 1, size=count),
+            'speed_average': rng.integers(500, 1501, size=count) / 100,
+        })
+
+    def _name_pool(self, name_func) -> np.ndarray:
+        return np.array([name_func() for _ in range(NAME_POOL_SIZE)], dtype=object)
+
+    @staticmethod
+    def _phones(rng: np.random.Generator, count: int) -> np.ndarray:
+        # Russian mobile numbers +79XXXXXXXXX are already E.164 and need no parsing
+        subscriber: np.ndarray = rng.integers(0, 10 ** 9, size=count).astype('U9')
+        return np.char.add('+79', np.char.zfill(subscriber, 9))
+
+    @staticmethod
+    def _birth_dates(rng: np.random.Generator, ages: np.ndarray, base_year: int) -> np.ndarray:
+        # Same shift as _birth_date() applied to a date between 1970 and today as from Faker date_object()
+        days_since_epoch: int = (datetime.date.today() - datetime.date(1970, 1, 1)).days
+        date: np.ndarray = np.datetime64('1970-01-01', 'D') + rng.integers(0, days_since_epoch + 1, size=len(ages))
+        year_diff: np.ndarray = date.astype('datetime64[Y]').astype(int) + 1970 - base_year
+        return date - (year_diff * 365 + ages * 365).astype('timedelta64[D]')
+
+    @staticmethod
+    def _ages(rng: np.random.Generator, count: int, age_min: int, age_max: int) -> np.ndarray:
+        p: np.ndarray = np.exp(-rng.uniform(0, 5, size=count))
+        return np.clip((p * (age_max - age_min + 1) + age_min).astype(int), age_min, age_max)
+
     def _phone(self) -> str:
         phone: str = self.generator.phone_number()
         if phone.startswith('8'):
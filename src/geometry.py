@@ -0,0 +1,38 @@
+from collections.abc import Sequence
+from typing import Literal
+import numpy as np
+import shapely
+
+GeometryFormat = Literal['wkt', 'wkb']
+
+
+def encode_linestrings(
+        lines: Sequence[Sequence[tuple[float, float]]],
+        geometry_format: GeometryFormat = 'wkt'
+) -> list[str] | np.ndarray:
+    if geometry_format == 'wkt':
+        return encode_linestrings_wkt(lines)
+    if geometry_format == 'wkb':
+        return encode_linestrings_wkb(lines)
+    raise ValueError(f'Unknown geometry format: {geometry_format}')
+
+
+def encode_linestrings_wkt(lines: Sequence[Sequence[tuple[float, float]]]) -> list[str]:
+    # Same text as shapely LineString.wkt, coordinates keep full precision
+    return shapely.to_wkt(build_linestrings(lines), rounding_precision=-1).tolist()
+
+
+def encode_linestrings_wkb(lines: Sequence[Sequence[tuple[float, float]]]) -> np.ndarray:
+    return shapely.to_wkb(build_linestrings(lines))
+
+
+def build_linestrings(lines: Sequence[Sequence[tuple[float, float]]]) -> np.ndarray:
+    lengths: np.ndarray = np.fromiter((len(points) for points in lines), dtype=np.int64, count=len(lines))
+    if len(lines) == 0:
+        return np.empty(0, dtype=object)
+    coordinates: np.ndarray = np.array([p for points in lines for p in points], dtype=np.float64).reshape(-1, 2)
+    # Single point routes are encoded as a line from the point to itself
+    repeats: np.ndarray = np.where(lengths == 1, 2, 1)
+    coordinates = np.repeat(coordinates, np.repeat(repeats, lengths), axis=0)
+    indices: np.ndarray = np.repeat(np.arange(len(lines)), lengths * repeats)
+    return shapely.linestrings(coordinates, indices=indices)
@@ -0,0 +1,164 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+from pydantic import BaseModel
+
+# Opt-in instrumentation of pipeline hot spots. Disabled spans cost one attribute check.
+# Enable in code with enable() or in scripts with INSTRUMENTATION=1, see enable_from_env()
+FuncT = TypeVar('FuncT', bound=Callable[..., Any])
+
+
+class SpanStats(BaseModel):
+    name: str
+    calls: int = 0
+    wall_s: float = 0
+    cpu_s: float = 0
+    allocated_bytes: int = 0
+
+
+class Instrumentation:
+    enabled: bool
+    _trace_allocations: bool
+    _max_trace_events: int | None
+    _stats: dict[str, SpanStats]
+    _trace_events: list[dict[str, Any]]
+    _started_at: float
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.enabled = False
+        self._trace_allocations = False
+        self._max_trace_events = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, trace_allocations: bool = False, max_trace_events: int | None = None):
+        # Chrome trace events are only kept when max_trace_events is set, per-ride spans produce a lot of them
+        self._trace_allocations = trace_allocations
+        self._max_trace_events = max_trace_events
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._trace_events = []
+            self._started_at = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        allocated_before: int = tracemalloc.get_traced_memory()[0] if self._trace_allocations else 0
+        cpu_before: float = time.process_time()
+        wall_before: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_s: float = time.perf_counter() - wall_before
+            cpu_s: float = time.process_time() - cpu_before
+            allocated_bytes: int = 0
+            if self._trace_allocations:
+                allocated_bytes = tracemalloc.get_traced_memory()[0] - allocated_before
+            self._record(name, wall_before, wall_s, cpu_s, allocated_bytes)
+
+    def _record(self, name: str, wall_before: float, wall_s: float, cpu_s: float, allocated_bytes: int):
+        with self._lock:
+            stats: SpanStats | None = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = SpanStats(name=name)
+            stats.calls += 1
+            stats.wall_s += wall_s
+            stats.cpu_s += cpu_s
+            stats.allocated_bytes += allocated_bytes
+            if self._max_trace_events is not None and len(self._trace_events) < self._max_trace_events:
+                self._trace_events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': (wall_before - self._started_at) * 1e6,
+                    'dur': wall_s * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                })
+
+    @property
+    def stats(self) -> list[SpanStats]:
+        with self._lock:
+            return sorted((s.model_copy() for s in self._stats.values()), key=lambda s: s.wall_s, reverse=True)
+
+    def report_table(self) -> str:
+        lines: list[str] = [f'{"span":<48} {"calls":>10} {"wall s":>10} {"cpu s":>10} {"alloc MB":>10}']
+        for s in self.stats:
+            lines.append(
+                f'{s.name:<48} {s.calls:>10} {s.wall_s:>10.3f} {s.cpu_s:>10.3f} {s.allocated_bytes / 2 ** 20:>10.1f}'
+            )
+        return '\n'.join(lines)
+
+    def dump_json(self, file_path: str):
+        with open(file_path, 'w') as f:
+            json.dump([s.model_dump() for s in self.stats], f, indent=2)
+
+    def dump_chrome_trace(self, file_path: str):
+        # Open in chrome://tracing or https://ui.perfetto.dev
+        with self._lock:
+            events: list[dict[str, Any]] = list(self._trace_events)
+        with open(file_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+instrumentation = Instrumentation()
+
+
+def span(name: str):
+    return instrumentation.span(name)
+
+
+def instrumented(name: str | None = None) -> Callable[[FuncT], FuncT]:
+    def decorator(func: FuncT) -> FuncT:
+        span_name: str = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            with instrumentation.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable_from_env():
+    # INSTRUMENTATION=1 enables spans and prints the summary table at exit.
+    # INSTRUMENTATION_ALLOCATIONS=1 adds tracemalloc, INSTRUMENTATION_JSON and INSTRUMENTATION_TRACE
+    # are file paths for the JSON summary and the Chrome trace
+    if os.environ.get('INSTRUMENTATION', '0') in ('', '0', 'false'):
+        return
+    json_path: str | None = os.environ.get('INSTRUMENTATION_JSON')
+    trace_path: str | None = os.environ.get('INSTRUMENTATION_TRACE')
+    instrumentation.enable(
+        trace_allocations=os.environ.get('INSTRUMENTATION_ALLOCATIONS', '0') not in ('', '0', 'false'),
+        max_trace_events=1_000_000 if trace_path else None
+    )
+
+    def report():
+        print(instrumentation.report_table())
+        if json_path:
+            instrumentation.dump_json(json_path)
+        if trace_path:
+            instrumentation.dump_chrome_trace(trace_path)
+
+    atexit.register(report)
@@ -1,9 +1,16 @@
 import datetime
+from typing import ClassVar, TYPE_CHECKING
+import numpy as np
 from faker import Faker
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from src.columnar import ColumnarTable
 from src.faker_providers.parking import Parking
 from src.faker_providers.person import Person
 from src.faker_providers.weather import WeatherCondition
+from src.instrumentation import instrumented
+
+if TYPE_CHECKING:
+    from src.ride_simulator import SimulationState
 
 
 class DailyWeather(BaseModel):
@@ -31,36 +38,86 @@ class Ride(BaseModel):
     end_parking_id: int | None = None
 
 
+class RideTable(ColumnarTable[Ride]):
+    model: ClassVar[type[BaseModel]] = Ride
+    dtypes: ClassVar[dict[str, np.dtype | str]] = {
+        'id': np.int64,
+        'person_id': np.int32,
+        'datetime': 'datetime64[s]',
+        'start_parking_id': np.int32,
+        'end_parking_id': np.int32,
+    }
+
+
 class SimulationPlan(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     start_date: datetime.date
     end_date: datetime.date
     persons: list[Person]
     weather: list[DailyWeather]
-    rides: list[Ride]
+    rides: list[Ride] | RideTable
     parking: list[Parking]
 
 
 class Planner:
     _fake: Faker
+    _rng: np.random.Generator | None
 
-    def __init__(self, fake: Faker):
+    def __init__(self, fake: Faker, rng: np.random.Generator | None = None):
         self._fake = fake
+        self._rng = rng
 
     def plan_simulation(
             self,
             start_date: datetime.date,
             end_date: datetime.date,
             persons_count: int,
-            max_parking_capacity: int = 20
+            max_parking_capacity: int = 20,
+            vectorized: bool = False
     ) -> SimulationPlan:
         print('Planning parking')
         parking: list[Parking] = self.plan_parking(max_capacity=max_parking_capacity)
         print('Planning persons')
-        persons: list[Person] = self.plan_persons(parking=parking, base_year=start_date.year, count=persons_count)
+        persons: list[Person] = self.plan_persons(
+            parking=parking, base_year=start_date.year, count=persons_count, vectorized=vectorized
+        )
         print('Planning weather')
         weather: list[DailyWeather] = self.plan_weather(start_date=start_date, end_date=end_date)
         print('Planning rides')
-        rides: list[Ride] = self.plan_rides(persons=persons, historical_weather=weather, parking=parking)
+        if vectorized:
+            rides: list[Ride] | RideTable = self.plan_rides_vectorized(
+                persons=persons, historical_weather=weather, parking=parking
+            )
+        else:
+            rides = self.plan_rides(persons=persons, historical_weather=weather, parking=parking)
+        return SimulationPlan(
+            start_date=start_date,
+            end_date=end_date,
+            persons=persons,
+            weather=weather,
+            rides=rides,
+            parking=parking
+        )
+
+    def plan_simulation_increment(
+            self,
+            state: 'SimulationState',
+            end_date: datetime.date,
+            vectorized: bool = False
+    ) -> SimulationPlan:
+        # Plans only the days after the state end, parking and persons continue from the state
+        start_date: datetime.date = state.end_datetime.date()
+        parking: list[Parking] = list(state.parking.values())
+        persons: list[Person] = list(state.persons.values())
+        print(f'Planning weather from {start_date}')
+        weather: list[DailyWeather] = self.plan_weather(start_date=start_date, end_date=end_date)
+        print('Planning rides')
+        if vectorized:
+            rides: list[Ride] | RideTable = self.plan_rides_vectorized(
+                persons=persons, historical_weather=weather, parking=parking
+            )
+        else:
+            rides = self.plan_rides(persons=persons, historical_weather=weather, parking=parking)
         return SimulationPlan(
             start_date=start_date,
             end_date=end_date,
@@ -70,14 +127,25 @@ class Planner:
             parking=parking
         )
 
-    def plan_persons(self, parking: list[Parking], base_year: int, count: int) -> list[Person]:
+    @instrumented()
+    def plan_persons(
+            self,
+            parking: list[Parking],
+            base_year: int,
+            count: int,
+            vectorized: bool = False
+    ) -> list[Person]:
+        if vectorized:
+            return self._fake.persons(parking=parking, base_year=base_year, count=count).to_models()
         return [self._fake.person(parking=parking, base_year=base_year) for _ in range(count)]
 
+    @instrumented()
     def plan_parking(self, count: int | None = None, max_capacity: int = 20) -> list[Parking]:
         if count is None:
             count = self._fake.total_parking_num()
         return [self._fake.parking(max_capacity) for _ in range(count)]
 
+    @instrumented()
     def plan_weather(self, start_date: datetime.date, end_date: datetime.date) -> list[DailyWeather]:
         weather: list[DailyWeather] = []
         for day in range((end_date - start_date).days + 1):
@@ -86,6 +154,7 @@ class Planner:
             weather.append(DailyWeather(date=date, condition=condition))
         return weather
 
+    @instrumented()
     def plan_rides(
             self,
             persons: list[Person],
@@ -132,6 +201,113 @@ class Planner:
         rides.sort(key=lambda r: r.datetime)
         return rides
 
+    @instrumented()
+    def plan_rides_vectorized(
+            self,
+            persons: list[Person],
+            historical_weather: list[DailyWeather],
+            parking: list[Parking],
+            config: RidePlannerConfig | None = None
+    ) -> RideTable:
+        # Same decisions as plan_rides, but drawn for all persons of a day at once
+        if config is None:
+            config = RidePlannerConfig()
+        rng: np.random.Generator = self._get_rng()
+        parking_id: np.ndarray = np.array([p.id for p in parking], dtype=np.int32)
+        person_id: np.ndarray = np.array([p.id for p in persons], dtype=np.int32)
+        workday_trip_chance: np.ndarray = np.array([p.occasional_workday_trip_chance for p in persons])
+        weekend_trip_chance: np.ndarray = np.array([p.occasional_weekend_trip_chance for p in persons])
+        skip_trip_chance: np.ndarray = np.array([p.skip_trip_chance for p in persons])
+        workers: np.ndarray = np.array([p.work_trips for p in persons], dtype=bool)
+        worker_id: np.ndarray = person_id[workers]
+        home_parking_id: np.ndarray = np.array([p.home_parking_id for p in persons if p.work_trips], dtype=np.int32)
+        work_parking_id: np.ndarray = np.array([p.work_parking_id for p in persons if p.work_trips], dtype=np.int32)
+        work_start_s: np.ndarray = np.array([p.work_start_hour * 3600 for p in persons if p.work_trips])
+        work_end_s: np.ndarray = np.array([p.work_end_hour * 3600 for p in persons if p.work_trips])
+        worker_skip_trip_chance: np.ndarray = skip_trip_chance[workers]
+
+        columns: dict[str, list[np.ndarray]] = {name: [] for name in RideTable.dtypes if name != 'id'}
+
+        def add_rides(ids: np.ndarray, dt: np.ndarray, start_id: np.ndarray | None, end_id: np.ndarray | None):
+            columns['person_id'].append(ids)
+            columns['datetime'].append(dt)
+            columns['start_parking_id'].append(
+                rng.choice(parking_id, size=len(ids)) if start_id is None else start_id
+            )
+            columns['end_parking_id'].append(rng.choice(parking_id, size=len(ids)) if end_id is None else end_id)
+
+        for weather in historical_weather:
+            date: datetime.date = weather.date
+            midnight: np.datetime64 = np.datetime64(date, 's')
+            is_rain: bool = weather.condition == WeatherCondition.RAIN
+            if date.weekday() < 5:
+                trip_chance: np.ndarray = workday_trip_chance
+                night_chance: int = config.weekday_night_chance
+            else:
+                trip_chance = weekend_trip_chance
+                night_chance = config.weekend_night_chance
+            trip: np.ndarray = self._draw_chance(rng, trip_chance)
+            trip[trip] &= ~self._draw_skip_trip(rng, skip_trip_chance[trip], is_rain, config)
+            dt: np.ndarray = midnight + self._draw_seconds_within_day(rng, int(trip.sum()), night_chance)
+            add_rides(person_id[trip], dt, None, None)
+            if len(worker_id) > 0:
+                for trip_start_s, start_id, end_id in (
+                        (work_start_s, home_parking_id, work_parking_id),
+                        (work_end_s, work_parking_id, home_parking_id)
+                ):
+                    offset_s: np.ndarray = np.trunc(rng.normal(0, config.work_trip_std_s, size=len(worker_id)))
+                    dt = midnight + (np.trunc(trip_start_s) + offset_s).astype('timedelta64[s]')
+                    trip = ~self._draw_skip_trip(rng, worker_skip_trip_chance, is_rain, config)
+                    add_rides(worker_id[trip], dt[trip], start_id[trip], end_id[trip])
+
+        ride_columns: dict[str, np.ndarray] = {
+            name: np.concatenate(values).astype(RideTable.dtypes[name]) for name, values in columns.items()
+        }
+        ride_columns['id'] = np.arange(1, len(ride_columns['datetime']) + 1)
+        order: np.ndarray = np.argsort(ride_columns['datetime'], kind='stable')
+        return RideTable.from_columns({name: values[order] for name, values in ride_columns.items()})
+
+    def _get_rng(self) -> np.random.Generator:
+        # Seeded from Faker on first use, so Faker.seed() keeps vectorized plans reproducible
+        if self._rng is None:
+            self._rng = np.random.default_rng(self._fake.random.getrandbits(64))
+        return self._rng
+
+    @staticmethod
+    def _draw_chance(rng: np.random.Generator, chance: np.ndarray | int, size: int | None = None) -> np.ndarray:
+        # Same probability as Faker boolean(chance_of_getting_true=chance)
+        return rng.integers(1, 101, size=size if size is not None else len(chance)) <= chance
+
+    def _draw_skip_trip(
+            self,
+            rng: np.random.Generator,
+            skip_trip_chance: np.ndarray,
+            is_rain: bool,
+            config: RidePlannerConfig
+    ) -> np.ndarray:
+        if is_rain:
+            return self._draw_chance(rng, config.rain_skip_chance, size=len(skip_trip_chance))
+        return self._draw_chance(rng, skip_trip_chance)
+
+    @staticmethod
+    def _draw_seconds_within_day(
+            rng: np.random.Generator,
+            size: int,
+            night_chance: int,
+            day_start_hour: int = 6,
+            night_start_hour: int = 22
+    ) -> np.ndarray:
+        # Vectorized DatetimeProvider.datetime_within_day: day, evening or next day night period
+        period: np.ndarray = rng.choice(
+            3, size=size, p=np.array([100 - night_chance, night_chance / 2, night_chance / 2]) / 100
+        )
+        start_hour: np.ndarray = np.array([day_start_hour, night_start_hour, 24])[period]
+        hours_count: np.ndarray = np.array([night_start_hour - day_start_hour, 24 - night_start_hour, day_start_hour])
+        hour: np.ndarray = start_hour + rng.integers(0, hours_count[period])
+        seconds: np.ndarray = hour * 3600 + rng.integers(0, 60, size=size) * 60 + rng.integers(0, 60, size=size)
+        return seconds.astype('timedelta64[s]')
+
+    @instrumented()
     def _add_ride(
             self,
             rides: list[Ride],
@@ -1,14 +1,22 @@
 import datetime
 import logging
-from simpy import Environment
-import networkx as nx
-from pydantic import BaseModel
+import math
+import time
+from collections.abc import Iterable, Iterator
+from simpy import Environment, Event, Process, Store
+from typing import ClassVar
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from src.planner import SimulationPlan, Ride
 from src.faker_providers.weather import WeatherCondition
 from src.faker_providers.parking import Parking
 from src.faker_providers.scooter import Scooter
 from src.faker_providers.person import Person
-from src.city_utils import CityZone
+from src.city_utils import CityZone, ZoneParking
+from src.distance_matrix import DistanceMatrix
+from src.instrumentation import instrumented
+from src.route_cache import RouteCache
+from src.columnar import ColumnarTable
 
 
 class RideDetails(BaseModel):
@@ -42,176 +50,514 @@ class CanceledRide(BaseModel):
     find_available_attempts: int
 
 
+class RideDetailsLog(ColumnarTable[RideDetails]):
+    model: ClassVar[type[BaseModel]] = RideDetails
+    dtypes: ClassVar[dict[str, np.dtype | str]] = {
+        'id': np.int64,
+        'person_id': np.int32,
+        'scooter_id': np.int32,
+        'start_parking_id': np.int32,
+        'end_parking_id': np.int32,
+        'desired_start_datetime': 'datetime64[s]',
+        'start_datetime': 'datetime64[s]',
+        'end_datetime': 'datetime64[s]',
+        'distance_m': np.float64,
+        'duration_s': np.int32,
+        'promo_code': np.bool_,
+        'find_available_time_s': np.int32,
+        'find_available_attempts': np.int32,
+    }
+
+
+class CanceledRideLog(ColumnarTable[CanceledRide]):
+    model: ClassVar[type[BaseModel]] = CanceledRide
+    dtypes: ClassVar[dict[str, np.dtype | str]] = {
+        'ride_id': np.int64,
+        'person_id': np.int32,
+        'start_parking_id': np.int32,
+        'start_datetime': 'datetime64[s]',
+        'find_available_time_s': np.int32,
+        'find_available_attempts': np.int32,
+    }
+
+
 class ParkingSearchResult(BaseModel):
     parking: Parking | None
     attempts: int
     duration_s: int
 
 
+class ScooterDelivery(BaseModel):
+    # Scooter on its way to a parking. A ride is logged when its scooter arrives, after the capacity check
+    # that can reroute it once to a free parking. Deliveries without a ride were logged before
+    scooter: Scooter
+    parking_id: int
+    arrival_s: float
+    ride: RideDetails | None = None
+    rerouted: bool = False
+
+    def finish_ride(self) -> 'ScooterDelivery':
+        # Ride logged before the arrival is counted to the scooter, the delivery continues without it
+        if self.ride is None:
+            return self
+        self.scooter.distance_m += self.ride.distance_m
+        return self.model_copy(update={'ride': None, 'rerouted': False})
+
+
+class PendingSearch(BaseModel):
+    # Person waiting for a scooter since search_start_s
+    ride: Ride
+    search_start_s: float
+
+
+class RegionSnapshot(BaseModel):
+    # Windowed simulation of a region at a window boundary, enough to open it again
+    parking: list[Parking]
+    searches: list[PendingSearch]
+    deliveries: list[ScooterDelivery]
+    next_ride_id: int = 1
+
+
+class ParkingStore(Store):
+    # Shares the scooter queue with Parking and hands out the earliest returned scooter, pickups are O(1)
+    def __init__(self, env: Environment, parking: Parking):
+        super().__init__(env)
+        self.items = parking.scooters
+
+    def _do_get(self, event):
+        if self.items:
+            event.succeed(self.items.popleft())
+
+
 class SimulationState(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     start_datetime: datetime.datetime
     parking: dict[int, Parking]
     persons: dict[int, Person]
     scooters: dict[int, Scooter]
-    ride_details: list[RideDetails] = []
-    cancelled_rides: list[CanceledRide] = []
+    ride_details: RideDetailsLog = Field(default_factory=RideDetailsLog)
+    cancelled_rides: CanceledRideLog = Field(default_factory=CanceledRideLog)
+    # Continuation of a previous state: its end, scooters still on the road and the id of the first ride
+    end_datetime: datetime.datetime | None = None
+    pending_deliveries: list[ScooterDelivery] = Field(default_factory=list)
+    first_ride_id: int = 1
+
+    def get_next_ride_id(self) -> int:
+        return self.first_ride_id + len(self.ride_details)
+
+    def get_pending_deliveries(self, start_datetime: datetime.datetime) -> list[ScooterDelivery]:
+        # Scooters still on the road, with arrival times relative to the start of a continuation
+        shift_s: float = (start_datetime - self.start_datetime).total_seconds()
+        return [d.model_copy(update={'arrival_s': d.arrival_s - shift_s}) for d in self.pending_deliveries]
+
+    @field_validator('ride_details', mode='before')
+    @classmethod
+    def _validate_ride_details(cls, value: RideDetailsLog | list[RideDetails]) -> RideDetailsLog:
+        if isinstance(value, list):
+            return RideDetailsLog.from_models(RideDetails.model_validate(v) for v in value)
+        return value
+
+    @field_validator('cancelled_rides', mode='before')
+    @classmethod
+    def _validate_cancelled_rides(cls, value: CanceledRideLog | list[CanceledRide]) -> CanceledRideLog:
+        if isinstance(value, list):
+            return CanceledRideLog.from_models(CanceledRide.model_validate(v) for v in value)
+        return value
 
 
 class RideSimulator:
     _env: Environment
     _state: SimulationState
+    _distance_matrix: DistanceMatrix | None
+    _route_cache: RouteCache | None
+    _parking_stores: dict[int, ParkingStore]
+    _restock_events: dict[int, Event]
+    _next_ride_id: int
+    _searches: dict[int, PendingSearch]
+    _on_road: dict[int, ScooterDelivery]
+    _deferred_deliveries: list[ScooterDelivery]
+    _zone_parking: dict[int, ZoneParking]
+    _trace_every: int
+    _progress_interval_s: int
     _logger: logging.Logger
 
-    def __init__(self):
+    def __init__(
+            self,
+            distance_matrix: DistanceMatrix | None = None,
+            route_cache: RouteCache | None = None,
+            trace_every: int = 1000,
+            progress_interval: datetime.timedelta = datetime.timedelta(hours=6)
+    ):
+        # Every trace_every-th ride is traced at DEBUG level, progress is logged every progress_interval
+        # of simulated time
+        self._distance_matrix = distance_matrix
+        self._route_cache = route_cache
+        self._trace_every = trace_every
+        self._progress_interval_s = int(progress_interval.total_seconds())
         self._logger = logging.getLogger(__class__.__name__)
 
+    @instrumented()
     def simulate_rides(
             self,
             plan: SimulationPlan,
             city_zone: CityZone,
-            rides_limit: int | None = None
+            rides_limit: int | None = None,
+            previous_state: SimulationState | None = None
     ) -> SimulationState:
+        # With a previous state the plan continues it: parking and persons come from that state,
+        # its scooters on the road are delivered and ride ids continue its numbering
         start_dt: datetime.datetime = datetime.datetime.combine(plan.start_date, datetime.datetime.min.time())
         all_scooters: list[Scooter] = []
         for p in plan.parking:
             all_scooters.extend(p.scooters)
+        pending_deliveries: list[ScooterDelivery] = []
+        first_ride_id: int = 1
+        if previous_state is not None:
+            pending_deliveries = previous_state.get_pending_deliveries(start_dt)
+            all_scooters.extend(d.scooter for d in pending_deliveries)
+            first_ride_id = previous_state.get_next_ride_id()
         self._state = SimulationState(
             start_datetime=start_dt,
             parking={p.id: p for p in plan.parking},
             persons={p.id: p for p in plan.persons},
-            scooters={s.id: s for s in all_scooters}
+            scooters={s.id: s for s in all_scooters},
+            first_ride_id=first_ride_id
         )
-        self._logger.info(f'Loaded {len(plan.parking)} parking, {len(plan.persons)} persons')
-        self._env = Environment()
+        self._logger.info('Loaded %d parking, %d persons', len(plan.parking), len(plan.persons))
+        self._zone_parking = {p.id: p for p in city_zone.parking}
+        self._start_environment(initial_time=0)
+        self._next_ride_id = self._state.first_ride_id
+        for delivery in pending_deliveries:
+            self._env.process(self._deliver_scooter(delivery, city_zone))
         # Start generating users with an initial number of users
-        self._env.process(self._simulate_rides_process(plan, city_zone, rides_limit))
+        rides_process = self._env.process(self._simulate_rides_process(plan.rides, city_zone, rides_limit))
+        started_at: float = time.perf_counter()
+        self._env.process(self._progress_process(rides_process, started_at))
         simulation_time: int = int((plan.end_date - plan.start_date).total_seconds())
         self._env.run(until=simulation_time)
+        self._log_progress(started_at)
+        self._state.pending_deliveries = self._log_rides_on_road()
+        self._state.end_datetime = start_dt + datetime.timedelta(seconds=simulation_time)
         return self._state
 
-    def _simulate_rides_process(self, plan: SimulationPlan, city_zone: CityZone, rides_limit: int | None):
-        while True:
-            if len(plan.rides) == 0:
-                break
+    def open_windows(
+            self,
+            state: SimulationState,
+            city_zone: CityZone,
+            start_s: float,
+            searches: list[PendingSearch],
+            deliveries: list[ScooterDelivery]
+    ):
+        # Windowed simulation of one region, the state holds only the region parking. The environment
+        # stays open between windows, so rides, waits and deliveries continue over window boundaries
+        self._state = state
+        self._zone_parking = {p.id: p for p in city_zone.parking}
+        self._start_environment(initial_time=start_s)
+        self._next_ride_id = state.first_ride_id + len(state.ride_details)
+        for search in searches:
+            self._env.process(self._start_ride(search.ride, city_zone, search.search_start_s))
+        for delivery in deliveries:
+            self._env.process(self._deliver_scooter(delivery, city_zone))
+
+    @instrumented()
+    def simulate_window(
+            self,
+            rides: Iterable[Ride],
+            city_zone: CityZone,
+            window_end_s: float,
+            deliveries: list[ScooterDelivery]
+    ) -> list[ScooterDelivery]:
+        # Runs the open environment until the window end. Returns the scooters ridden to other regions,
+        # finished rides are appended to the state logs
+        for delivery in deliveries:
+            self._env.process(self._deliver_scooter(delivery, city_zone))
+        self._env.process(self._simulate_rides_process(rides, city_zone, None))
+        self._env.run(until=window_end_s)
+        deferred_deliveries: list[ScooterDelivery] = self._deferred_deliveries
+        self._deferred_deliveries = []
+        return deferred_deliveries
+
+    def close_windows(self) -> RegionSnapshot:
+        # Persons still searching and scooters on the road at the current time, opening windows again
+        # with them continues the simulation
+        return RegionSnapshot(
+            parking=list(self._state.parking.values()),
+            searches=list(self._searches.values()),
+            deliveries=list(self._on_road.values()),
+            next_ride_id=self._next_ride_id
+        )
+
+    def _start_environment(self, initial_time: float):
+        self._env = Environment(initial_time=initial_time)
+        self._parking_stores = {p.id: ParkingStore(self._env, p) for p in self._state.parking.values()}
+        self._restock_events = {}
+        self._searches = {}
+        self._on_road = {}
+        self._deferred_deliveries = []
+
+    def _log_rides_on_road(self) -> list[ScooterDelivery]:
+        # Rides are logged on arrival, the ones still on the road at the end are logged as planned.
+        # The log is ordered by ride id, which follows the ride start. Returns the scooters on the road
+        self._state.ride_details.extend(d.ride for d in self._on_road.values() if d.ride is not None)
+        ride_ids: np.ndarray = self._state.ride_details.column('id')
+        self._state.ride_details = self._state.ride_details.take(np.argsort(ride_ids, kind='stable'))
+        return [d.finish_ride() for d in self._on_road.values()]
+
+    def _simulate_rides_process(self, rides: Iterable[Ride], city_zone: CityZone, rides_limit: int | None):
+        rides_iterator: Iterator[Ride] = iter(rides)
+        next_ride: Ride | None = next(rides_iterator, None)
+        while next_ride is not None:
             now: datetime.datetime = self._get_current_datetime()
-            rides_to_start: list[Ride] = []
-            r1: Ride = plan.rides[0]
-            while now >= r1.datetime:
-                rides_to_start.append(plan.rides.pop(0))
-                if len(plan.rides) == 0:
-                    break
-                r1 = plan.rides[0]
-            if rides_to_start:
-                for ride in rides_to_start:
-                    self._env.process(self._start_ride(now, ride, city_zone))
-            if rides_limit is not None and len(self._state.ride_details) >= rides_limit:
+            while next_ride is not None and now >= next_ride.datetime:
+                self._env.process(self._start_ride(next_ride, city_zone))
+                next_ride = next(rides_iterator, None)
+            if next_ride is None or self._is_rides_limit_reached(rides_limit):
                 break
+            wait_s: int = self._get_seconds_until(next_ride.datetime)
+            if wait_s > 1:
+                # Wake up one second ahead, so the next rides are dispatched in the same event order
+                # as with per-second polling
+                yield self._env.timeout(wait_s - 1)
+                if self._is_rides_limit_reached(rides_limit):
+                    break
             yield self._env.timeout(1)
 
+    def _progress_process(self, rides_process: Process, started_at: float):
+        while rides_process.is_alive:
+            yield self._env.timeout(self._progress_interval_s)
+            self._log_progress(started_at)
+
+    def _log_progress(self, started_at: float):
+        if not self._logger.isEnabledFor(logging.INFO):
+            return
+        elapsed_s: float = max(time.perf_counter() - started_at, 1e-9)
+        self._logger.info(
+            'Simulated until %s: %d rides, %d cancelled, %.0f rides/s, %.0fx real time',
+            self._get_current_datetime(), self._get_rides_count(), len(self._state.cancelled_rides),
+            (self._get_rides_count() + len(self._state.cancelled_rides)) / elapsed_s,
+            self._env.now / elapsed_s
+        )
+
+    def _is_traced(self, ride: Ride) -> bool:
+        return (
+            self._trace_every > 0 and ride.id % self._trace_every == 0
+            and self._logger.isEnabledFor(logging.DEBUG)
+        )
+
+    def _is_rides_limit_reached(self, rides_limit: int | None) -> bool:
+        return rides_limit is not None and self._get_rides_count() >= rides_limit
+
+    def _get_rides_count(self) -> int:
+        # Started rides, including the ones still on the road
+        return self._next_ride_id - self._state.first_ride_id
+
+    def _get_seconds_until(self, dt: datetime.datetime) -> int:
+        offset_s: float = (dt - self._state.start_datetime).total_seconds()
+        return max(math.ceil(offset_s) - int(self._env.now), 1)
+
     def _get_current_datetime(self) -> datetime.datetime:
         return self._state.start_datetime + datetime.timedelta(seconds=self._env.now)
 
     def _start_ride(
             self,
-            now: datetime.datetime,
             ride: Ride,
-            city_zone: CityZone
+            city_zone: CityZone,
+            search_start_s: float | None = None
     ):
-        self._logger.info(
-            f'[{len(self._state.ride_details)}] User {ride.person_id} is trying to start a ride {ride.id} at {ride.start_parking_id}'
+        # Search start is set when a person waiting for a scooter continues in a new environment
+        trace: bool = self._is_traced(ride)
+        if trace:
+            self._logger.debug(
+                '[%d] User %d is trying to start a ride %d at %d',
+                self._get_rides_count(), ride.person_id, ride.id, ride.start_parking_id
+            )
+        if search_start_s is None:
+            search_start_s = self._env.now
+        desired_start_time: datetime.datetime = self._state.start_datetime + datetime.timedelta(
+            seconds=search_start_s
         )
-        desired_start_time: datetime.datetime = now
         person: Person = self._state.persons[ride.person_id]
         start_parking: Parking = self._state.parking[ride.start_parking_id]
         start_parking_search_result: ParkingSearchResult = yield self._env.process(
-            self._find_parking_with_scooter(start_parking, person)
+            self._find_parking_with_scooter(start_parking, person, ride, search_start_s, trace)
         )
         found_start_parking: Parking | None = start_parking_search_result.parking
         if found_start_parking is None or len(found_start_parking.scooters) <= 0:
-            self._state.cancelled_rides.append(CanceledRide(
+            self._state.cancelled_rides.append(
                 ride_id=ride.id,
                 person_id=ride.person_id,
                 start_parking_id=ride.start_parking_id,
                 start_datetime=desired_start_time,
                 find_available_time_s=start_parking_search_result.duration_s,
                 find_available_attempts=start_parking_search_result.attempts
-            ))
-            self._logger.error(f'  [X] Person {person.id} did not find scooter and cancels ride {ride.id}')
+            )
+            if trace:
+                self._logger.debug('  [X] Person %d did not find scooter and cancels ride %d', person.id, ride.id)
         else:
-            self._logger.info(f'  -> Person {person.id} found a scooter at parking {found_start_parking.id}')
-            scooter: Scooter = found_start_parking.scooters.pop(0)
+            if trace:
+                self._logger.debug('  -> Person %d found a scooter at parking %d', person.id, found_start_parking.id)
+            scooter: Scooter = yield self._parking_stores[found_start_parking.id].get()
             start_time: datetime.datetime = self._get_current_datetime()
-            end_parking: Parking = self._state.parking[ride.end_parking_id]
-            end_parking_search_result: ParkingSearchResult = self._find_parking_for_scooter(end_parking, person)
-            end_parking = end_parking_search_result.parking
-            distance_m: float = nx.shortest_path_length(
-                city_zone.graph, found_start_parking.graph_node, end_parking.graph_node, weight='length'
-            )
-            duration_s: int = int(distance_m / (person.speed_average * 1000 / 3600))
+            # Parking of other regions are only known by their location
+            end_parking: Parking | ZoneParking = self._state.parking.get(ride.end_parking_id) or self._zone_parking[
+                ride.end_parking_id
+            ]
+            distance_m: float = self._get_distance(found_start_parking, end_parking, city_zone)
+            duration_s: int = self._get_ride_duration_s(distance_m, person)
             end_time: datetime.datetime = start_time + datetime.timedelta(seconds=duration_s)
-            self._logger.info(f'Trip: {start_time} - {end_time}. {duration_s / 60} min, {distance_m / 1000} km')
-            ride_details_id: int = len(self._state.ride_details) + 1
+            if trace:
+                self._logger.debug(
+                    'Trip: %s - %s. %.1f min, %.2f km', start_time, end_time, duration_s / 60, distance_m / 1000
+                )
+            ride_details_id: int = self._next_ride_id
+            self._next_ride_id += 1
             use_promo_code: bool = person.promo_codes > 0
             if use_promo_code:
-                self._logger.info(f'  -> Person {person.id} used promo code')
+                if trace:
+                    self._logger.debug('  -> Person %d used promo code', person.id)
                 person.promo_codes -= 1
-            ride_details = RideDetails(
-                id=ride_details_id,
-                person_id=ride.person_id,
-                scooter_id=scooter.id,
-                start_parking_id=found_start_parking.id,
-                end_parking_id=end_parking.id,
-                desired_start_datetime=desired_start_time,
-                start_datetime=start_time,
-                end_datetime=end_time,
-                distance_m=distance_m,
-                duration_s=duration_s,
-                promo_code=use_promo_code,
-                find_available_time_s=start_parking_search_result.duration_s,
-                find_available_attempts=start_parking_search_result.attempts,
+            delivery = ScooterDelivery(
+                scooter=scooter,
+                parking_id=end_parking.id,
+                arrival_s=self._env.now + duration_s,
+                ride=RideDetails.model_construct(
+                    id=ride_details_id,
+                    person_id=ride.person_id,
+                    scooter_id=scooter.id,
+                    start_parking_id=found_start_parking.id,
+                    end_parking_id=end_parking.id,
+                    desired_start_datetime=desired_start_time,
+                    start_datetime=start_time,
+                    end_datetime=end_time,
+                    distance_m=distance_m,
+                    duration_s=duration_s,
+                    promo_code=use_promo_code,
+                    find_available_time_s=start_parking_search_result.duration_s,
+                    find_available_attempts=start_parking_search_result.attempts
+                )
             )
-            self._state.ride_details.append(ride_details)
-            yield self._env.timeout(duration_s)
-            scooter.distance_m += distance_m
-            end_parking.scooters.append(scooter)
+            if end_parking.id not in self._state.parking:
+                # Other regions receive the scooter in their next window
+                self._deferred_deliveries.append(delivery)
+                return
+            yield from self._deliver_scooter(delivery, city_zone, trace)
+
+    @staticmethod
+    def _get_ride_duration_s(distance_m: float, person: Person) -> int:
+        return int(distance_m / (person.speed_average * 1000 / 3600))
+
+    def _deliver_scooter(self, delivery: ScooterDelivery, city_zone: CityZone, trace: bool = False):
+        self._on_road[delivery.scooter.id] = delivery
+        yield self._env.timeout(max(delivery.arrival_s - self._env.now, 0))
+        parking: Parking = self._state.parking[delivery.parking_id]
+        ride: RideDetails | None = delivery.ride
+        if ride is not None and not delivery.rerouted:
+            # Capacity is checked on arrival, a full parking makes the person ride on to the nearest free one
+            person: Person = self._state.persons[ride.person_id]
+            end_parking_search_result: ParkingSearchResult = self._find_parking_for_scooter(parking, person, trace)
+            if end_parking_search_result.parking.id != parking.id:
+                extra_distance_m: float = self._get_distance(parking, end_parking_search_result.parking, city_zone)
+                extra_duration_s: int = self._get_ride_duration_s(extra_distance_m, person)
+                parking = end_parking_search_result.parking
+                ride.end_parking_id = parking.id
+                ride.distance_m += extra_distance_m
+                ride.duration_s += extra_duration_s
+                ride.end_datetime = ride.start_datetime + datetime.timedelta(seconds=ride.duration_s)
+                delivery.parking_id = parking.id
+                delivery.arrival_s = self._env.now + extra_duration_s
+                delivery.rerouted = True
+                yield self._env.timeout(extra_duration_s)
+        del self._on_road[delivery.scooter.id]
+        if ride is not None:
+            delivery.scooter.distance_m += ride.distance_m
+            self._state.ride_details.append(ride)
+        yield from self._return_scooter(parking, delivery.scooter)
+
+    def _return_scooter(self, parking: Parking, scooter: Scooter):
+        yield self._parking_stores[parking.id].put(scooter)
+        restock_event: Event | None = self._restock_events.pop(parking.id, None)
+        if restock_event is not None:
+            restock_event.succeed()
 
-    def _find_parking_with_scooter(self, start_parking: Parking, person: Person) -> ParkingSearchResult:
-        closest_parking: list[Parking] = [self._state.parking[p] for p in start_parking.closest_parking_id]
+    def _get_restock_event(self, parking_id: int) -> Event:
+        # One shared event per parking, fired and dropped when a scooter is returned there
+        if parking_id not in self._restock_events:
+            self._restock_events[parking_id] = self._env.event()
+        return self._restock_events[parking_id]
+
+    @instrumented()
+    def _get_distance(self, start_parking: Parking, end_parking: Parking, city_zone: CityZone) -> float:
+        if self._distance_matrix is not None:
+            return self._distance_matrix.distance(start_parking.id, end_parking.id)
+        if self._route_cache is not None:
+            return self._route_cache.get_or_compute(
+                city_zone.get_routing_graph(), start_parking.graph_node, end_parking.graph_node
+            ).length
+        return city_zone.get_routing_graph().shortest_path_length(start_parking.graph_node, end_parking.graph_node)
+
+    def _get_closest_parking(self, parking: Parking) -> list[Parking]:
+        # In a regional simulation only the region parking are reachable
+        return [self._state.parking[p] for p in parking.closest_parking_id if p in self._state.parking]
+
+    def _find_parking_with_scooter(
+            self,
+            start_parking: Parking,
+            person: Person,
+            ride: Ride,
+            search_start_s: float,
+            trace: bool = False
+    ) -> ParkingSearchResult:
+        closest_parking: list[Parking] = self._get_closest_parking(start_parking)
         attempts: int = 0
-        duration_s: int = 0
+        duration_s: int = int(self._env.now - search_start_s)
         parking: Parking | None = None
         while parking is None:
             if len(start_parking.scooters) > 0:
                 parking = start_parking
             else:
-                closest_parking.sort(key=lambda p: len(p.scooters), reverse=True)
-                if len(closest_parking) > 0 and len(closest_parking[0].scooters) > 0:
-                    parking = closest_parking[0]
+                # Closest parking are sorted by walking distance, take the nearest one with a scooter
+                parking = next((p for p in closest_parking if len(p.scooters) > 0), None)
+                if parking is not None:
                     attempts += 1
                 else:
-                    wait_time_s: int = 10
-                    yield self._env.timeout(wait_time_s)
-                    duration_s += wait_time_s
+                    # Sleep until a scooter is returned nearby or the person runs out of patience
+                    patience_left_s: int = person.find_available_time_limit_s - duration_s + 1
+                    self._searches[ride.id] = PendingSearch(ride=ride, search_start_s=search_start_s)
+                    yield self._env.any_of([
+                        *(self._get_restock_event(p.id) for p in [start_parking, *closest_parking]),
+                        self._env.timeout(patience_left_s)
+                    ])
+                    del self._searches[ride.id]
+                    duration_s = int(self._env.now - search_start_s)
             if duration_s > person.find_available_time_limit_s:
                 break
-        if parking and parking.id != start_parking.id:
-            self._logger.warning(f'  -> Person {person.id} is moving to parking {parking.id} to get a scooter')
+        if trace and parking and parking.id != start_parking.id:
+            self._logger.debug('  -> Person %d is moving to parking %d to get a scooter', person.id, parking.id)
         return ParkingSearchResult(
             parking=parking,
             attempts=attempts,
             duration_s=duration_s
         )
 
-    def _find_parking_for_scooter(self, end_parking: Parking, person: Person) -> ParkingSearchResult:
+    @instrumented()
+    def _find_parking_for_scooter(
+            self,
+            end_parking: Parking,
+            person: Person,
+            trace: bool = False
+    ) -> ParkingSearchResult:
         attempts: int = 0
         parking: Parking = end_parking
-        if len(end_parking.scooters) > end_parking.max_capacity:
-            closest_parking: list[Parking] = [self._state.parking[p] for p in end_parking.closest_parking_id]
-            closest_parking.sort(key=lambda p: len(p.scooters))
-            if len(closest_parking) > 0:
-                parking = closest_parking[0]
+        if len(end_parking.scooters) >= end_parking.max_capacity:
+            closest_parking: list[Parking] = self._get_closest_parking(end_parking)
+            free_parking: Parking | None = next(
+                (p for p in closest_parking if len(p.scooters) < p.max_capacity), None
+            )
+            if free_parking is not None:
+                parking = free_parking
                 attempts += 1
-                self._logger.warning(f'  -> Person {person.id} will ride to parking {parking.id}')
+                if trace:
+                    self._logger.debug('  -> Person %d will ride to parking %d', person.id, parking.id)
         return ParkingSearchResult(
             parking=parking,
             attempts=attempts,
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from pydantic import BaseModel
+from src.data_manager import DataManager
+from src.routing_graph import RoutingGraph
+
+
+class CachedRoute(BaseModel):
+    path: tuple[int, ...]
+    length: float
+
+
+class RouteCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    nodes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests: int = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+class RouteCache:
+    _max_nodes: int
+    _routes: OrderedDict[tuple[int, int], CachedRoute]
+    _stats: RouteCacheStats
+
+    def __init__(self, max_nodes: int = 10_000_000):
+        # Size is bounded by the total number of path nodes, which is what takes memory
+        self._max_nodes = max_nodes
+        self._routes = OrderedDict()
+        self._stats = RouteCacheStats()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        return key in self._routes
+
+    @property
+    def stats(self) -> RouteCacheStats:
+        return self._stats.model_copy(update={'size': len(self._routes)})
+
+    def get(self, start_node: int, end_node: int) -> CachedRoute | None:
+        key: tuple[int, int] = (start_node, end_node)
+        route: CachedRoute | None = self._routes.get(key)
+        if route is None:
+            self._stats.misses += 1
+            return None
+        self._stats.hits += 1
+        self._routes.move_to_end(key)
+        return route
+
+    def put(self, start_node: int, end_node: int, path: list[int] | tuple[int, ...], length: float) -> CachedRoute:
+        key: tuple[int, int] = (start_node, end_node)
+        if key in self._routes:
+            self._stats.nodes -= len(self._routes.pop(key).path)
+        route = CachedRoute.model_construct(path=tuple(path), length=float(length))
+        self._routes[key] = route
+        self._stats.nodes += len(route.path)
+        while self._stats.nodes > self._max_nodes and len(self._routes) > 1:
+            _, evicted = self._routes.popitem(last=False)
+            self._stats.nodes -= len(evicted.path)
+            self._stats.evictions += 1
+        return route
+
+    def get_or_compute(self, graph: RoutingGraph, start_node: int, end_node: int) -> CachedRoute:
+        route: CachedRoute | None = self.get(start_node, end_node)
+        if route is None:
+            length, path = graph.shortest_path(start_node, end_node)
+            route = self.put(start_node, end_node, path, length)
+        return route
+
+    def dump(self, data_manager: DataManager, file_name: str) -> str:
+        routes: list[tuple[int, int, tuple[int, ...], float]] = [
+            (start_node, end_node, r.path, r.length) for (start_node, end_node), r in self._routes.items()
+        ]
+        return data_manager.dump_pickle(routes, file_name)
+
+    @classmethod
+    def load(cls, data_manager: DataManager, file_name: str, max_nodes: int = 10_000_000) -> 'RouteCache':
+        cache = cls(max_nodes=max_nodes)
+        for start_node, end_node, path, length in data_manager.load_pickle(file_name):
+            cache.put(start_node, end_node, path, length)
+        return cache
@@ -0,0 +1,128 @@
+import datetime
+import logging
+from collections import defaultdict
+from collections.abc import Iterator
+from multiprocessing import Pool
+from networkx import MultiDiGraph
+from src.ride_simulator import SimulationState, RideDetails, RideRoute
+from src.route_cache import RouteCache
+from src.routing_graph import RoutingGraph
+
+# Graph is sent to every worker once by the pool initializer instead of with every task
+_worker_graph: RoutingGraph | None = None
+# Start nodes with up to this many distinct end nodes run A* per end node, rides are short compared to
+# the city and A* settles only the nodes around the route. Larger groups share one full SciPy search
+ASTAR_MAX_END_NODES: int = 8
+
+
+def _init_worker(graph: RoutingGraph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _calculate_group_paths(
+        group: tuple[int, set[int]]
+) -> tuple[int, dict[int, tuple[float, list[int]]]]:
+    start_node, end_nodes = group
+    if len(end_nodes) <= ASTAR_MAX_END_NODES:
+        return start_node, {end_node: _worker_graph.shortest_path(start_node, end_node) for end_node in end_nodes}
+    return start_node, _worker_graph.single_source_paths(start_node, end_nodes)
+
+
+class RouteCalculator:
+    _graph: RoutingGraph
+    _processes: int
+    _route_cache: RouteCache | None
+    _logger: logging.Logger
+
+    def __init__(
+            self,
+            graph: RoutingGraph | MultiDiGraph,
+            processes: int | None = None,
+            route_cache: RouteCache | None = None
+    ):
+        self._graph = graph if isinstance(graph, RoutingGraph) else RoutingGraph.from_graph(graph)
+        self._processes = processes or 1
+        self._route_cache = route_cache
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def calculate_routes(
+            self,
+            state: SimulationState,
+            start_date: datetime.date | None = None,
+            end_date: datetime.date | None = None,
+            batch_size: int = 10000
+    ) -> Iterator[list[RideRoute]]:
+        groups: dict[int, list[tuple[int, int, float]]] = self._group_rides(state, start_date, end_date)
+        self._logger.info('Calculating routes from %d start nodes in %d processes', len(groups), self._processes)
+        batch: list[RideRoute] = []
+        routes_count: int = 0
+        for start_node, paths in self._iter_group_paths(groups):
+            for ride_id, end_node, speed_avg in groups[start_node]:
+                batch.append(RideRoute(
+                    ride_id=ride_id,
+                    points=self._graph.path_lon_lat(paths[end_node]),
+                    speed_avg=speed_avg
+                ))
+            if len(batch) >= batch_size:
+                routes_count += len(batch)
+                self._logger.info('Calculated %d routes', routes_count)
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        if self._route_cache is not None:
+            self._logger.info('Route cache: %s', self._route_cache.stats)
+
+    def _iter_group_paths(
+            self,
+            groups: dict[int, list[tuple[int, int, float]]]
+    ) -> Iterator[tuple[int, dict[int, list[int]]]]:
+        missing: list[tuple[int, set[int]]] = []
+        for start_node, targets in groups.items():
+            end_nodes: set[int] = {end_node for _, end_node, _ in targets}
+            if self._route_cache is not None:
+                cached_paths: dict[int, list[int]] = {}
+                for end_node in end_nodes:
+                    route = self._route_cache.get(start_node, end_node)
+                    if route is not None:
+                        cached_paths[end_node] = list(route.path)
+                if len(cached_paths) == len(end_nodes):
+                    yield start_node, cached_paths
+                    continue
+            missing.append((start_node, end_nodes))
+        for start_node, paths in self._map_groups(missing):
+            if self._route_cache is not None:
+                for end_node, (length, path) in paths.items():
+                    self._route_cache.put(start_node, end_node, path, length)
+            yield start_node, {end_node: path for end_node, (_, path) in paths.items()}
+
+    def _map_groups(
+            self,
+            groups: list[tuple[int, set[int]]]
+    ) -> Iterator[tuple[int, dict[int, tuple[float, list[int]]]]]:
+        if self._processes == 1:
+            _init_worker(self._graph)
+            yield from map(_calculate_group_paths, groups)
+            return
+        with Pool(processes=self._processes, initializer=_init_worker, initargs=(self._graph,)) as pool:
+            yield from pool.imap_unordered(_calculate_group_paths, groups)
+
+    @staticmethod
+    def _group_rides(
+            state: SimulationState,
+            start_date: datetime.date | None,
+            end_date: datetime.date | None
+    ) -> dict[int, list[tuple[int, int, float]]]:
+        groups: dict[int, list[tuple[int, int, float]]] = defaultdict(list)
+        rd: RideDetails
+        for rd in state.ride_details:
+            ride_date: datetime.date = rd.start_datetime.date()
+            if start_date is not None and ride_date < start_date:
+                continue
+            if end_date is not None and ride_date > end_date:
+                continue
+            start_node: int = state.parking[rd.start_parking_id].graph_node
+            end_node: int = state.parking[rd.end_parking_id].graph_node
+            groups[start_node].append((rd.id, end_node, state.persons[rd.person_id].speed_average))
+        return groups
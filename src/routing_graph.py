@@ -0,0 +1,273 @@
+import heapq
+import math
+from collections.abc import Iterable
+from typing import Any
+import numpy as np
+import networkx as nx
+from networkx import MultiDiGraph
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import dijkstra
+
+ARRAY_NAMES: list[str] = ['nodes', 'x', 'y', 'lat', 'lon', 'indptr', 'indices', 'lengths']
+EARTH_RADIUS_M: float = 6_371_008.8
+
+
+def haversine_m(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a: np.ndarray = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class RoutingGraph:
+    # Directed street graph in CSR form. Nodes are addressed by position, the edges of the node at
+    # position i are indices[indptr[i]:indptr[i + 1]]. Parallel edges are merged keeping the shortest one,
+    # which is the edge every shortest path search picks anyway.
+    # Point-to-point queries run A* stopped at the target, single source queries over the whole graph run
+    # in SciPy csgraph. Node ids are used in the interface, positions only inside
+    _nodes: np.ndarray
+    _x: np.ndarray
+    _y: np.ndarray
+    _lat: np.ndarray
+    _lon: np.ndarray
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _lengths: np.ndarray
+    _crs: str
+    _node_positions: dict[int, int] | None
+    _adjacency: tuple[list[int], list[int], list[float]] | None
+    _coordinates: tuple[list[float], list[float], list[float], float] | None
+    _matrix: csr_array | None
+
+    def __init__(self, arrays: dict[str, np.ndarray], crs: str):
+        self._nodes = arrays['nodes']
+        self._x = arrays['x']
+        self._y = arrays['y']
+        self._lat = arrays['lat']
+        self._lon = arrays['lon']
+        self._indptr = arrays['indptr']
+        self._indices = arrays['indices']
+        self._lengths = arrays['lengths']
+        self._crs = crs
+        self._node_positions = None
+        self._adjacency = None
+        self._coordinates = None
+        self._matrix = None
+
+    @classmethod
+    def from_graph(cls, graph: MultiDiGraph) -> 'RoutingGraph':
+        nodes: np.ndarray = np.fromiter(graph.nodes, dtype=np.int64, count=len(graph))
+        node_positions: dict[int, int] = {int(node): i for i, node in enumerate(nodes)}
+        node_data: list[dict] = [graph.nodes[node] for node in graph.nodes]
+        edges_count: int = graph.number_of_edges()
+        sources: np.ndarray = np.empty(edges_count, dtype=np.int64)
+        targets: np.ndarray = np.empty(edges_count, dtype=np.int64)
+        lengths: np.ndarray = np.empty(edges_count, dtype=np.float64)
+        for i, (u, v, length) in enumerate(graph.edges(data='length', default=1)):
+            sources[i] = node_positions[u]
+            targets[i] = node_positions[v]
+            lengths[i] = length
+        # Sort by source, target and length, the first edge of every (source, target) pair is the shortest
+        order: np.ndarray = np.lexsort((lengths, targets, sources))
+        sources, targets, lengths = sources[order], targets[order], lengths[order]
+        first: np.ndarray = np.ones(edges_count, dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        sources, targets, lengths = sources[first], targets[first], lengths[first]
+        indptr: np.ndarray = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+        return cls({
+            'nodes': nodes,
+            'x': np.fromiter((d['x'] for d in node_data), dtype=np.float64, count=len(nodes)),
+            'y': np.fromiter((d['y'] for d in node_data), dtype=np.float64, count=len(nodes)),
+            'lat': np.fromiter((d['lat'] for d in node_data), dtype=np.float64, count=len(nodes)),
+            'lon': np.fromiter((d['lon'] for d in node_data), dtype=np.float64, count=len(nodes)),
+            'indptr': indptr,
+            'indices': targets.astype(np.int32),
+            'lengths': lengths,
+        }, crs=graph.graph['crs'])
+
+    def to_graph(self) -> MultiDiGraph:
+        graph = MultiDiGraph(crs=self._crs)
+        graph.add_nodes_from(
+            (int(node), {'x': float(x), 'y': float(y), 'lat': float(lat), 'lon': float(lon)})
+            for node, x, y, lat, lon in zip(self._nodes, self._x, self._y, self._lat, self._lon)
+        )
+        sources: np.ndarray = self._nodes[np.repeat(np.arange(len(self._nodes)), np.diff(self._indptr))]
+        graph.add_edges_from(
+            (u, v, {'length': length})
+            for u, v, length in zip(sources.tolist(), self._nodes[self._indices].tolist(), self._lengths.tolist())
+        )
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Search structures are rebuilt on demand, workers receive only the arrays
+        return {'arrays': self.arrays, 'crs': self._crs}
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__init__(state['arrays'], state['crs'])
+
+    @property
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {
+            'nodes': self._nodes,
+            'x': self._x,
+            'y': self._y,
+            'lat': self._lat,
+            'lon': self._lon,
+            'indptr': self._indptr,
+            'indices': self._indices,
+            'lengths': self._lengths,
+        }
+
+    @property
+    def crs(self) -> str:
+        return self._crs
+
+    @property
+    def nodes(self) -> np.ndarray:
+        return self._nodes
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y
+
+    @property
+    def edges_count(self) -> int:
+        return len(self._indices)
+
+    def node_position(self, node: int) -> int:
+        # Position lookup is built on first use, graphs loaded only for their arrays never pay for it
+        if self._node_positions is None:
+            self._node_positions = {node: i for i, node in enumerate(self._nodes.tolist())}
+        return self._node_positions[node]
+
+    def node_lon_lat(self, node: int) -> tuple[float, float]:
+        position: int = self.node_position(node)
+        return float(self._lon[position]), float(self._lat[position])
+
+    def path_lon_lat(self, path: Iterable[int]) -> list[tuple[float, float]]:
+        positions: list[int] = [self.node_position(node) for node in path]
+        return list(zip(self._lon[positions].tolist(), self._lat[positions].tolist()))
+
+    def shortest_path(self, source_node: int, target_node: int, heuristic: bool = True) -> tuple[float, list[int]]:
+        source: int = self.node_position(source_node)
+        target: int = self.node_position(target_node)
+        distances, predecessors = self._search(source, target, heuristic)
+        if target not in distances:
+            raise nx.NetworkXNoPath(f'No path between nodes {source_node} and {target_node}')
+        path: list[int] = [target]
+        while path[-1] != source:
+            path.append(predecessors[path[-1]])
+        return distances[target], self._nodes[path[::-1]].tolist()
+
+    def shortest_path_length(self, source_node: int, target_node: int, heuristic: bool = True) -> float:
+        source: int = self.node_position(source_node)
+        target: int = self.node_position(target_node)
+        distances, _ = self._search(source, target, heuristic)
+        if target not in distances:
+            raise nx.NetworkXNoPath(f'No path between nodes {source_node} and {target_node}')
+        return distances[target]
+
+    def distances_from(self, source_nodes: Iterable[int]) -> np.ndarray:
+        # Row per source node with distances to all nodes by position, unreachable nodes are inf
+        sources: list[int] = [self.node_position(node) for node in source_nodes]
+        return dijkstra(self._get_matrix(), indices=sources)
+
+    def single_source_paths(
+            self,
+            source_node: int,
+            target_nodes: Iterable[int]
+    ) -> dict[int, tuple[float, list[int]]]:
+        source: int = self.node_position(source_node)
+        distances, predecessors = dijkstra(self._get_matrix(), indices=source, return_predecessors=True)
+        paths: dict[int, tuple[float, list[int]]] = {}
+        for target_node in target_nodes:
+            target: int = self.node_position(target_node)
+            if math.isinf(distances[target]):
+                raise nx.NetworkXNoPath(f'No path between nodes {source_node} and {target_node}')
+            path: list[int] = [target]
+            while path[-1] != source:
+                path.append(int(predecessors[path[-1]]))
+            paths[target_node] = (float(distances[target]), self._nodes[path[::-1]].tolist())
+        return paths
+
+    def _search(self, source: int, target: int, heuristic: bool) -> tuple[dict[int, float], dict[int, int]]:
+        # A* over positions. The heuristic never exceeds the road distance left and is consistent, so a popped
+        # node is final and the search stops at the target. Without the heuristic it is plain Dijkstra
+        indptr, indices, lengths = self._get_adjacency()
+        # Coordinates and the heuristic scale are built only for A*
+        lat: list[float] = []
+        lon: list[float] = []
+        cos_lat: list[float] = []
+        target_lat: float = 0.0
+        target_lon: float = 0.0
+        target_cos_lat: float = 0.0
+        diameter_m: float = 0.0
+        if heuristic:
+            lat, lon, cos_lat, scale = self._get_coordinates()
+            target_lat = lat[target]
+            target_lon = lon[target]
+            target_cos_lat = cos_lat[target]
+            diameter_m = 2 * EARTH_RADIUS_M * scale
+        distances: dict[int, float] = {source: 0.0}
+        predecessors: dict[int, int] = {}
+        visited: set[int] = set()
+        queue: list[tuple[float, int]] = [(0.0, source)]
+        while queue:
+            _, position = heapq.heappop(queue)
+            if position == target:
+                break
+            if position in visited:
+                continue
+            visited.add(position)
+            distance: float = distances[position]
+            for i in range(indptr[position], indptr[position + 1]):
+                next_position: int = indices[i]
+                next_distance: float = distance + lengths[i]
+                if next_distance < distances.get(next_position, math.inf):
+                    distances[next_position] = next_distance
+                    predecessors[next_position] = position
+                    estimate_m: float = 0.0
+                    if diameter_m:
+                        estimate_m = diameter_m * math.asin(math.sqrt(
+                            math.sin((target_lat - lat[next_position]) / 2) ** 2 +
+                            cos_lat[next_position] * target_cos_lat *
+                            math.sin((target_lon - lon[next_position]) / 2) ** 2
+                        ))
+                    heapq.heappush(queue, (next_distance + estimate_m, next_position))
+        return distances, predecessors
+
+    def _get_adjacency(self) -> tuple[list[int], list[int], list[float]]:
+        # Python lists are several times faster than NumPy scalars in the search loop
+        if self._adjacency is None:
+            self._adjacency = (self._indptr.tolist(), self._indices.tolist(), self._lengths.tolist())
+        return self._adjacency
+
+    def _get_coordinates(self) -> tuple[list[float], list[float], list[float], float]:
+        # Great circle distance is scaled down to the smallest length to distance ratio over all edges.
+        # Then it is a lower bound of every edge and, by the triangle inequality, a consistent heuristic
+        if self._coordinates is None:
+            sources: np.ndarray = np.repeat(np.arange(len(self)), np.diff(self._indptr))
+            edge_distances: np.ndarray = haversine_m(
+                self._lat[sources], self._lon[sources], self._lat[self._indices], self._lon[self._indices]
+            )
+            positive: np.ndarray = edge_distances > 0
+            ratio: float = float(np.min(self._lengths[positive] / edge_distances[positive], initial=1.0))
+            # Margin covers rounding in the search
+            scale: float = max(min(ratio, 1.0) * (1 - 1e-6), 0.0)
+            lat_rad: np.ndarray = np.radians(self._lat)
+            self._coordinates = (lat_rad.tolist(), np.radians(self._lon).tolist(), np.cos(lat_rad).tolist(), scale)
+        return self._coordinates
+
+    def _get_matrix(self) -> csr_array:
+        if self._matrix is None:
+            self._matrix = csr_array(
+                (np.asarray(self._lengths, dtype=np.float64), self._indices, self._indptr), shape=(len(self), len(self))
+            )
+        return self._matrix
@@ -0,0 +1,384 @@
+import datetime
+import hashlib
+import logging
+import os
+import time
+from collections.abc import Callable
+from multiprocessing import Pool
+from multiprocessing.pool import AsyncResult
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+from src.planner import SimulationPlan, RideTable
+from src.faker_providers.parking import Parking
+from src.faker_providers.person import Person
+from src.city_utils import CityZone
+from src.distance_matrix import DistanceMatrix
+from src.checkpoint import SimulationCheckpointer, SimulationCheckpoint, PlanFingerprint
+from src.ride_simulator import (
+    RideSimulator, SimulationState, ScooterDelivery, RegionSnapshot, RideDetailsLog, CanceledRideLog
+)
+
+# City zone and distance matrix are sent to every worker once by the pool initializer. Region simulators
+# stay open in their worker between windows, so parking and persons are not sent again
+_worker_city_zone: CityZone | None = None
+_worker_distance_matrix: DistanceMatrix | None = None
+_worker_regions: dict[int, RideSimulator] = {}
+_worker_states: dict[int, SimulationState] = {}
+
+
+def _init_worker(city_zone: CityZone, distance_matrix: DistanceMatrix | None):
+    global _worker_city_zone, _worker_distance_matrix
+    _worker_city_zone = city_zone
+    _worker_distance_matrix = distance_matrix
+
+
+class OpenRegionsTask(BaseModel):
+    start_datetime: datetime.datetime
+    trace_every: int
+    start_s: int
+    persons: list[Person]
+    regions: dict[int, RegionSnapshot]
+
+
+class WindowTask(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    window_end_s: int
+    # Promo codes changed by the previous window, regions consume them only on local copies
+    promo_codes: dict[int, int]
+    rides: dict[int, RideTable]
+    deliveries: dict[int, list[ScooterDelivery]]
+
+
+class RegionResult(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    region: int
+    ride_details: RideDetailsLog
+    cancelled_rides: CanceledRideLog
+    deliveries: list[ScooterDelivery]
+
+
+def _open_regions(task: OpenRegionsTask):
+    _worker_regions.clear()
+    _worker_states.clear()
+    # Regions of one worker share the person copies, promo codes are consumed centrally on merge
+    persons: dict[int, Person] = {p.id: p.model_copy() for p in task.persons}
+    for region, snapshot in task.regions.items():
+        state = SimulationState(
+            start_datetime=task.start_datetime,
+            parking={p.id: p for p in snapshot.parking},
+            persons=persons,
+            scooters={},
+            # Region ride ids order the rides started in the same second when logs are merged
+            first_ride_id=snapshot.next_ride_id
+        )
+        simulator = RideSimulator(distance_matrix=_worker_distance_matrix, trace_every=task.trace_every)
+        simulator.open_windows(state, _worker_city_zone, task.start_s, snapshot.searches, snapshot.deliveries)
+        _worker_regions[region] = simulator
+        _worker_states[region] = state
+
+
+def _simulate_regions_window(task: WindowTask) -> list[RegionResult]:
+    results: list[RegionResult] = []
+    for region, simulator in _worker_regions.items():
+        state: SimulationState = _worker_states[region]
+        for person_id, promo_codes in task.promo_codes.items():
+            state.persons[person_id].promo_codes = promo_codes
+        deliveries: list[ScooterDelivery] = simulator.simulate_window(
+            task.rides.get(region, []), _worker_city_zone, task.window_end_s, task.deliveries.get(region, [])
+        )
+        # Only the rides finished in this window are sent back
+        results.append(RegionResult(
+            region=region,
+            ride_details=state.ride_details,
+            cancelled_rides=state.cancelled_rides,
+            deliveries=deliveries
+        ))
+        state.ride_details = RideDetailsLog()
+        state.cancelled_rides = CanceledRideLog()
+    return results
+
+
+def _close_regions(_task: None = None) -> dict[int, RegionSnapshot]:
+    return {region: simulator.close_windows() for region, simulator in _worker_regions.items()}
+
+
+def partition_parking(parking: list[Parking], rows: int, cols: int) -> dict[int, int]:
+    # Grid cells over parking coordinates, cell borders are quantiles so regions get similar parking counts
+    coordinates: np.ndarray = np.array([p.coordinates for p in parking], dtype=np.float64)
+    lat_edges: np.ndarray = np.quantile(coordinates[:, 0], np.linspace(0, 1, rows + 1)[1:-1])
+    lon_edges: np.ndarray = np.quantile(coordinates[:, 1], np.linspace(0, 1, cols + 1)[1:-1])
+    regions: np.ndarray = (
+        np.searchsorted(lat_edges, coordinates[:, 0], side='right') * cols
+        + np.searchsorted(lon_edges, coordinates[:, 1], side='right')
+    )
+    return {p.id: int(region) for p, region in zip(parking, regions)}
+
+
+class ShardedRideSimulator:
+    # Regions are simulated independently within a time window, each in its own environment that stays
+    # open in a worker process. Scooters ridden to another region are delivered there in the next window
+    _processes: int
+    _grid: tuple[int, int]
+    _window_s: int
+    _distance_matrix: DistanceMatrix | None
+    _trace_every: int
+    _progress_interval_s: int
+    _logger: logging.Logger
+
+    def __init__(
+            self,
+            processes: int | None = None,
+            grid: tuple[int, int] = (2, 2),
+            window: datetime.timedelta = datetime.timedelta(minutes=15),
+            distance_matrix: DistanceMatrix | None = None,
+            trace_every: int = 1000,
+            progress_interval: datetime.timedelta = datetime.timedelta(hours=6)
+    ):
+        # Every trace_every-th ride of a region is traced at DEBUG level, progress is logged every
+        # progress_interval of simulated time
+        self._processes = processes or os.cpu_count() or 1
+        self._grid = grid
+        self._window_s = int(window.total_seconds())
+        self._distance_matrix = distance_matrix
+        self._trace_every = trace_every
+        self._progress_interval_s = int(progress_interval.total_seconds())
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def simulate_rides(
+            self,
+            plan: SimulationPlan,
+            city_zone: CityZone,
+            checkpointer: SimulationCheckpointer | None = None,
+            checkpoint_every: datetime.timedelta = datetime.timedelta(days=1),
+            previous_state: SimulationState | None = None
+    ) -> SimulationState:
+        # With a previous state the plan continues it: parking and persons come from that state,
+        # its scooters on the road are delivered and ride ids continue its numbering
+        start_dt: datetime.datetime = datetime.datetime.combine(plan.start_date, datetime.datetime.min.time())
+        region_by_parking: dict[int, int] = partition_parking(plan.parking, *self._grid)
+        regions: list[int] = sorted(set(region_by_parking.values()))
+        rides: RideTable = plan.rides if isinstance(plan.rides, RideTable) else RideTable.from_models(plan.rides)
+        ride_offsets_s: np.ndarray = (rides.column('datetime') - np.datetime64(start_dt, 's')).astype(np.int64)
+        parking_regions: np.ndarray = np.zeros(max(region_by_parking) + 1, dtype=np.int64)
+        parking_regions[list(region_by_parking)] = list(region_by_parking.values())
+        ride_regions: np.ndarray = parking_regions[rides.column('start_parking_id')]
+        persons: dict[int, Person] = {p.id: p for p in plan.persons}
+        snapshots: dict[int, RegionSnapshot] = {
+            r: RegionSnapshot(parking=[], searches=[], deliveries=[]) for r in regions
+        }
+        for p in plan.parking:
+            snapshots[region_by_parking[p.id]].parking.append(p)
+        pending_deliveries: list[ScooterDelivery] = []
+        first_ride_id: int = 1
+        if previous_state is not None:
+            pending_deliveries = previous_state.get_pending_deliveries(start_dt)
+            first_ride_id = previous_state.get_next_ride_id()
+        ride_details: list[RideDetailsLog] = []
+        cancelled_rides: list[CanceledRideLog] = []
+        simulation_s: int = int((plan.end_date - plan.start_date).total_seconds())
+        first_window_s: int = 0
+        fingerprint: PlanFingerprint = self._get_plan_fingerprint(rides, start_dt, simulation_s, first_ride_id)
+        checkpoint: SimulationCheckpoint | None = checkpointer.load(fingerprint) if checkpointer is not None else None
+        if checkpoint is not None:
+            first_window_s = checkpoint.snapshot.window_start_s
+            snapshots = checkpoint.snapshot.regions
+            for person_id, promo_codes in checkpoint.snapshot.promo_codes.items():
+                persons[person_id].promo_codes = promo_codes
+            pending_deliveries = checkpoint.snapshot.pending_deliveries
+            ride_details = checkpoint.ride_details
+            cancelled_rides = checkpoint.cancelled_rides
+        # Scooters on the road of a previous state or checkpoint are handed to their regions on opening
+        for delivery in pending_deliveries:
+            snapshots[region_by_parking[delivery.parking_id]].deliveries.append(delivery)
+        pending_deliveries = []
+        checkpointed_logs: int = len(ride_details)
+        checkpoint_every_s: int = int(checkpoint_every.total_seconds())
+        # Every worker keeps a group of regions open, a single group is simulated in this process
+        groups: list[list[int]] = [regions[i::self._processes] for i in range(min(self._processes, len(regions)))]
+        self._logger.info(
+            'Simulating %d regions in %d processes, %d s windows', len(regions), len(groups), self._window_s
+        )
+        pools: list[Pool] = []
+        if len(groups) > 1:
+            pools = [
+                Pool(1, initializer=_init_worker, initargs=(city_zone, self._distance_matrix)) for _ in groups
+            ]
+        else:
+            _init_worker(city_zone, self._distance_matrix)
+        try:
+            self._run_groups(pools, _open_regions, [
+                OpenRegionsTask(
+                    start_datetime=start_dt,
+                    trace_every=self._trace_every,
+                    start_s=first_window_s,
+                    persons=list(persons.values()),
+                    regions={r: snapshots[r] for r in group}
+                ) for group in groups
+            ])
+            promo_codes: dict[int, int] = {}
+            rides_count: int = sum(len(log) for log in ride_details)
+            cancelled_count: int = sum(len(log) for log in cancelled_rides)
+            # Rides of a resumed checkpoint are not counted to the speed
+            resumed_count: int = rides_count + cancelled_count
+            started_at: float = time.perf_counter()
+            for window_start_s in range(first_window_s, simulation_s, self._window_s):
+                window_end_s: int = min(window_start_s + self._window_s, simulation_s)
+                window_mask: np.ndarray = (ride_offsets_s >= window_start_s) & (ride_offsets_s < window_end_s)
+                window_rides: int = 0
+                tasks: list[WindowTask] = []
+                for group in groups:
+                    task = WindowTask(window_end_s=window_end_s, promo_codes=promo_codes, rides={}, deliveries={})
+                    for region in group:
+                        region_rides: RideTable = rides.take(np.flatnonzero(window_mask & (ride_regions == region)))
+                        if len(region_rides) > 0:
+                            task.rides[region] = region_rides
+                            window_rides += len(region_rides)
+                        deliveries: list[ScooterDelivery] = [
+                            d for d in pending_deliveries if region_by_parking[d.parking_id] == region
+                        ]
+                        if deliveries:
+                            task.deliveries[region] = deliveries
+                    tasks.append(task)
+                pending_deliveries = []
+                promo_codes = {}
+                for group_results in self._run_groups(pools, _simulate_regions_window, tasks):
+                    for result in group_results:
+                        promo_codes.update(self._apply_promo_codes(result.ride_details, persons))
+                        rides_count += len(result.ride_details)
+                        cancelled_count += len(result.cancelled_rides)
+                        ride_details.append(result.ride_details)
+                        cancelled_rides.append(result.cancelled_rides)
+                        pending_deliveries.extend(result.deliveries)
+                self._logger.debug(
+                    'Simulated window %s, %d rides', start_dt + datetime.timedelta(seconds=window_start_s), window_rides
+                )
+                if window_end_s % self._progress_interval_s == 0 or window_end_s == simulation_s:
+                    self._log_progress(
+                        start_dt + datetime.timedelta(seconds=window_end_s), rides_count, cancelled_count,
+                        rides_count + cancelled_count - resumed_count, window_end_s - first_window_s, started_at
+                    )
+                # The simulation end is not saved, a finished run clears its checkpoint
+                if checkpointer is not None and window_end_s % checkpoint_every_s == 0 and window_end_s < simulation_s:
+                    checkpointer.save(
+                        fingerprint=fingerprint,
+                        window_start_s=window_end_s,
+                        regions=self._close_groups(pools),
+                        promo_codes={p.id: p.promo_codes for p in persons.values()},
+                        pending_deliveries=pending_deliveries,
+                        ride_details=RideDetailsLog.concat(ride_details[checkpointed_logs:]),
+                        cancelled_rides=CanceledRideLog.concat(cancelled_rides[checkpointed_logs:])
+                    )
+                    checkpointed_logs = len(ride_details)
+            snapshots = self._close_groups(pools)
+        finally:
+            for pool in pools:
+                pool.close()
+                pool.join()
+        parking: dict[int, Parking] = {p.id: p for r in regions for p in snapshots[r].parking}
+        # Scooters ridden to another region in the last window are parked if they arrived, rides still
+        # on the road are logged as planned and their scooters are left on the road
+        on_road: list[ScooterDelivery] = [d for r in regions for d in snapshots[r].deliveries]
+        for delivery in pending_deliveries:
+            if delivery.arrival_s >= simulation_s:
+                on_road.append(delivery)
+                continue
+            delivery.scooter.distance_m += delivery.ride.distance_m
+            parking[delivery.parking_id].scooters.append(delivery.scooter)
+            ride_details.append(RideDetailsLog.from_models([delivery.ride]))
+        ride_details.append(RideDetailsLog.from_models(d.ride for d in on_road if d.ride is not None))
+        pending_deliveries = [d.finish_ride() for d in on_road]
+        scooters = {s.id: s for p in parking.values() for s in p.scooters}
+        scooters.update({d.scooter.id: d.scooter for d in pending_deliveries})
+        if checkpointer is not None:
+            checkpointer.clear()
+        return SimulationState(
+            start_datetime=start_dt,
+            parking=parking,
+            persons=persons,
+            scooters=scooters,
+            ride_details=self._merge_ride_details(ride_details, first_ride_id),
+            cancelled_rides=self._merge_cancelled_rides(cancelled_rides),
+            end_datetime=start_dt + datetime.timedelta(seconds=simulation_s),
+            pending_deliveries=pending_deliveries,
+            first_ride_id=first_ride_id
+        )
+
+    def _log_progress(
+            self,
+            until: datetime.datetime,
+            rides_count: int,
+            cancelled_count: int,
+            simulated_count: int,
+            simulated_s: int,
+            started_at: float
+    ):
+        # Same figures as the single environment, rides are counted when their scooters arrive
+        if not self._logger.isEnabledFor(logging.INFO):
+            return
+        elapsed_s: float = max(time.perf_counter() - started_at, 1e-9)
+        self._logger.info(
+            'Simulated until %s: %d rides, %d cancelled, %.0f rides/s, %.0fx real time',
+            until, rides_count, cancelled_count, simulated_count / elapsed_s, simulated_s / elapsed_s
+        )
+
+    def _get_plan_fingerprint(
+            self,
+            rides: RideTable,
+            start_dt: datetime.datetime,
+            simulation_s: int,
+            first_ride_id: int
+    ) -> PlanFingerprint:
+        rides_hash = hashlib.sha256()
+        for column in rides.columns.values():
+            rides_hash.update(np.ascontiguousarray(column).tobytes())
+        return PlanFingerprint(
+            start_datetime=start_dt,
+            end_datetime=start_dt + datetime.timedelta(seconds=simulation_s),
+            rides_count=len(rides),
+            rides_hash=rides_hash.hexdigest(),
+            first_ride_id=first_ride_id,
+            grid=self._grid,
+            window_s=self._window_s
+        )
+
+    @staticmethod
+    def _run_groups(pools: list[Pool], function: Callable, tasks: list) -> list:
+        # Group i always runs in pool i, where its regions are open
+        if not pools:
+            return [function(task) for task in tasks]
+        results: list[AsyncResult] = [pool.apply_async(function, (task,)) for pool, task in zip(pools, tasks)]
+        return [result.get() for result in results]
+
+    def _close_groups(self, pools: list[Pool]) -> dict[int, RegionSnapshot]:
+        snapshots: dict[int, RegionSnapshot] = {}
+        for group_snapshots in self._run_groups(pools, _close_regions, [None] * max(len(pools), 1)):
+            snapshots.update(group_snapshots)
+        return snapshots
+
+    @staticmethod
+    def _apply_promo_codes(ride_details: RideDetailsLog, persons: dict[int, Person]) -> dict[int, int]:
+        # Regions run in parallel, so a person could spend the same promo code twice in one window.
+        # Returns the changed promo codes
+        person_ids: np.ndarray = ride_details.column('person_id')
+        promo_codes: dict[int, int] = {}
+        for index in np.flatnonzero(ride_details.column('promo_code')):
+            person: Person = persons[int(person_ids[index])]
+            if person.promo_codes > 0:
+                person.promo_codes -= 1
+            else:
+                ride_details.update(int(index), promo_code=False)
+            promo_codes[person.id] = person.promo_codes
+        return promo_codes
+
+    @staticmethod
+    def _merge_ride_details(logs: list[RideDetailsLog], first_ride_id: int = 1) -> RideDetailsLog:
+        # Rides are logged on arrival, so logs are sorted by start and region ride id
+        merged: RideDetailsLog = RideDetailsLog.concat(logs)
+        merged = merged.take(np.lexsort((merged.column('id'), merged.column('start_datetime'))))
+        merged.column('id')[:] = np.arange(first_ride_id, first_ride_id + len(merged))
+        return merged
+
+    @staticmethod
+    def _merge_cancelled_rides(logs: list[CanceledRideLog]) -> CanceledRideLog:
+        merged: CanceledRideLog = CanceledRideLog.concat(logs)
+        return merged.take(np.argsort(merged.column('start_datetime'), kind='stable'))
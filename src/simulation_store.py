@@ -0,0 +1,255 @@
+import datetime
+import logging
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, TypeVar
+import numpy as np
+import pyarrow as pa
+from pydantic import BaseModel
+from src.data_manager import DataManager
+from src.columnar import ColumnarTable
+from src.city_utils import CityZone, ZoneParking
+from src.faker_providers.parking import Parking
+from src.faker_providers.person import Person
+from src.faker_providers.scooter import Scooter
+from src.planner import SimulationPlan, DailyWeather, RideTable
+from src.ride_simulator import SimulationState, RideDetailsLog, CanceledRideLog
+from src.routing_graph import RoutingGraph, ARRAY_NAMES
+
+ModelT = TypeVar('ModelT', bound=BaseModel)
+TableT = TypeVar('TableT', bound=ColumnarTable)
+
+
+def upgrade_state(state: SimulationState) -> SimulationState:
+    # States pickled by earlier versions keep the logs as model lists, unpickling skips the validators
+    # that build the columnar logs. Fields added later are missing from their __dict__ altogether
+    values: dict[str, Any] = dict(state.__dict__)
+    if values.get('end_datetime') is None:
+        # Simulations ran until midnight after the last started ride
+        starts: list[datetime.datetime] = [r.start_datetime for r in values['ride_details']]
+        starts.extend(r.start_datetime for r in values['cancelled_rides'])
+        last_start: datetime.datetime = max(starts, default=values['start_datetime'])
+        values['end_datetime'] = datetime.datetime.combine(
+            last_start.date() + datetime.timedelta(days=1), datetime.datetime.min.time()
+        )
+    return SimulationState.model_validate(values)
+
+
+class SimulationStore:
+    # Every object is a directory: Arrow IPC files for tables, npy CSR arrays for the graph and a small
+    # pickle for the rest. Tables and arrays are memory mapped, so loading touches only the data used.
+    # Rides and ride logs are filtered by their start date without reading the other days
+    _data_manager: DataManager
+    _logger: logging.Logger
+
+    def __init__(self, data_manager: DataManager | None = None):
+        self._data_manager = data_manager or DataManager()
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def exists(self, name: str) -> bool:
+        return self._data_manager.file_exists(f'{name}/meta.pickle')
+
+    def dump_city_zone(self, city_zone: CityZone, name: str = 'city_zone'):
+        self.dump_routing_graph(city_zone.get_routing_graph(), name)
+        self._dump_models(city_zone.parking, f'{name}/parking.arrow')
+        # Meta is written last, an interrupted dump is not seen as an existing object
+        self._data_manager.dump_pickle(
+            {'polygon': city_zone.polygon, 'slow_zones': city_zone.slow_zones}, f'{name}/meta.pickle', atomic=True
+        )
+
+    def load_city_zone(self, name: str = 'city_zone', networkx_graph: bool = False) -> CityZone:
+        # Routing uses the memory mapped CSR graph, the networkx graph is built only when requested
+        meta: dict[str, Any] = self._data_manager.load_pickle(f'{name}/meta.pickle')
+        parking: list[ZoneParking] = [
+            p.model_copy(update={'coordinates': tuple(p.coordinates)})
+            for p in self._load_models(ZoneParking, f'{name}/parking.arrow')
+        ]
+        routing_graph: RoutingGraph = self.load_routing_graph(name)
+        return CityZone.model_construct(
+            polygon=meta['polygon'],
+            graph=routing_graph.to_graph() if networkx_graph else None,
+            parking=parking,
+            slow_zones=meta['slow_zones'],
+            routing_graph=routing_graph
+        )
+
+    def dump_routing_graph(self, graph: RoutingGraph, name: str):
+        for array_name, array in graph.arrays.items():
+            self._data_manager.dump_numpy(array, f'{name}/graph/{array_name}.npy')
+        self._data_manager.dump_pickle({'crs': graph.crs}, f'{name}/graph/meta.pickle')
+
+    def load_routing_graph(self, name: str = 'city_zone') -> RoutingGraph:
+        meta: dict[str, Any] = self._data_manager.load_pickle(f'{name}/graph/meta.pickle')
+        return RoutingGraph(
+            {
+                array_name: self._data_manager.load_numpy(f'{name}/graph/{array_name}.npy', mmap_mode='r')
+                for array_name in ARRAY_NAMES
+            },
+            crs=meta['crs']
+        )
+
+    def dump_plan(self, plan: SimulationPlan, name: str = 'simulation_plan'):
+        rides: RideTable = plan.rides if isinstance(plan.rides, RideTable) else RideTable.from_models(plan.rides)
+        self._data_manager.dump_arrow(rides.to_arrow(), f'{name}/rides.arrow')
+        self._dump_models(plan.persons, f'{name}/persons.arrow')
+        self._dump_models(plan.weather, f'{name}/weather.arrow')
+        self._dump_parking(plan.parking, f'{name}/parking')
+        self._data_manager.dump_pickle({
+            'start_date': plan.start_date,
+            'end_date': plan.end_date,
+            'rides_table': isinstance(plan.rides, RideTable),
+        }, f'{name}/meta.pickle', atomic=True)
+
+    def load_plan(
+            self,
+            name: str = 'simulation_plan',
+            start_date: datetime.date | None = None,
+            end_date: datetime.date | None = None
+    ) -> SimulationPlan:
+        # Dates limit rides and weather to the days from start_date to end_date inclusive
+        meta: dict[str, Any] = self._data_manager.load_pickle(f'{name}/meta.pickle')
+        plan: SimulationPlan = SimulationPlan.model_construct(
+            start_date=meta['start_date'],
+            end_date=meta['end_date'],
+            persons=self._load_models(Person, f'{name}/persons.arrow'),
+            parking=self._load_parking(f'{name}/parking'),
+        )
+        rides: RideTable = RideTable.from_arrow(self._data_manager.load_arrow(f'{name}/rides.arrow'))
+        weather: list[DailyWeather] = [
+            DailyWeather.model_validate(row)
+            for row in self._data_manager.load_arrow(f'{name}/weather.arrow').to_pylist()
+        ]
+        rides_table: bool = meta['rides_table']
+        rides = self._filter_dates(rides, 'datetime', start_date, end_date)
+        self._logger.info('Loaded plan %s with %d rides', name, len(rides))
+        return plan.model_copy(update={
+            'start_date': max(plan.start_date, start_date or plan.start_date),
+            'end_date': min(plan.end_date, end_date or plan.end_date),
+            'rides': rides if rides_table else rides.to_models(),
+            'weather': [
+                w for w in weather
+                if (start_date is None or w.date >= start_date) and (end_date is None or w.date <= end_date)
+            ],
+        })
+
+    def dump_state(self, state: SimulationState, name: str):
+        self._data_manager.dump_arrow(state.ride_details.to_arrow(), f'{name}/ride_details.arrow')
+        self._data_manager.dump_arrow(state.cancelled_rides.to_arrow(), f'{name}/cancelled_rides.arrow')
+        self._dump_models(list(state.persons.values()), f'{name}/persons.arrow')
+        self._dump_models(list(state.scooters.values()), f'{name}/scooters.arrow')
+        self._dump_parking(list(state.parking.values()), f'{name}/parking')
+        # Pending deliveries are few, they reference scooters by id and are restored on load
+        self._data_manager.dump_pickle({
+            'start_datetime': state.start_datetime,
+            'end_datetime': state.end_datetime,
+            'first_ride_id': state.first_ride_id,
+            'pending_deliveries': state.pending_deliveries,
+        }, f'{name}/meta.pickle', atomic=True)
+
+    def load_state(
+            self,
+            name: str,
+            start_date: datetime.date | None = None,
+            end_date: datetime.date | None = None
+    ) -> SimulationState:
+        # Dates limit the ride log to rides started from start_date to end_date inclusive
+        meta: dict[str, Any] = self._data_manager.load_pickle(f'{name}/meta.pickle')
+        # Scooters are shared between parking, deliveries and the state, as in the simulation
+        scooters: dict[int, Scooter] = {s.id: s for s in self._load_models(Scooter, f'{name}/scooters.arrow')}
+        parking: list[Parking] = self._load_parking(f'{name}/parking', scooters)
+        state: SimulationState = SimulationState.model_construct(
+            start_datetime=meta['start_datetime'],
+            end_datetime=meta['end_datetime'],
+            first_ride_id=meta['first_ride_id'],
+            pending_deliveries=[
+                d.model_copy(update={'scooter': scooters.setdefault(d.scooter.id, d.scooter)})
+                for d in meta['pending_deliveries']
+            ],
+            parking={p.id: p for p in parking},
+            persons={p.id: p for p in self._load_models(Person, f'{name}/persons.arrow')},
+            scooters=scooters,
+            ride_details=self._filter_dates(
+                RideDetailsLog.from_arrow(self._data_manager.load_arrow(f'{name}/ride_details.arrow')),
+                'start_datetime', start_date, end_date
+            ),
+            cancelled_rides=self._filter_dates(
+                CanceledRideLog.from_arrow(self._data_manager.load_arrow(f'{name}/cancelled_rides.arrow')),
+                'start_datetime', start_date, end_date
+            ),
+        )
+        self._logger.info('Loaded state %s with %d rides', name, len(state.ride_details))
+        return state
+
+    def _dump_parking(self, parking: Sequence[Parking], name: str):
+        # Scooters of a parking are kept in their queue order
+        self._dump_models(parking, f'{name}.arrow', exclude={'scooters'})
+        self._data_manager.dump_arrow(pa.table({
+            'parking_id': pa.array([p.id for p in parking for _ in p.scooters], type=pa.int64()),
+            'id': pa.array([s.id for p in parking for s in p.scooters], type=pa.int64()),
+            'hardware_id': pa.array([s.hardware_id for p in parking for s in p.scooters], type=pa.string()),
+            'distance_m': pa.array([s.distance_m for p in parking for s in p.scooters], type=pa.float64()),
+        }), f'{name}_scooters.arrow')
+
+    def _load_parking(self, name: str, scooters: dict[int, Scooter] | None = None) -> list[Parking]:
+        parking_ids: list[int] = self._data_manager.load_arrow(
+            f'{name}_scooters.arrow', columns=['parking_id']
+        ).column('parking_id').to_numpy().tolist()
+        parking_scooters: dict[int, deque[Scooter]] = {}
+        for parking_id, scooter in zip(parking_ids, self._load_models(Scooter, f'{name}_scooters.arrow')):
+            if scooters is not None:
+                scooter = scooters.setdefault(scooter.id, scooter)
+            parking_scooters.setdefault(parking_id, deque()).append(scooter)
+        parking: list[Parking] = self._load_models(Parking, f'{name}.arrow')
+        for p in parking:
+            p.coordinates = tuple(p.coordinates)
+            p.scooters = parking_scooters.get(p.id, deque())
+        return parking
+
+    def _dump_models(self, models: Sequence[BaseModel], file_name: str, exclude: set[str] | None = None):
+        self._data_manager.dump_arrow(pa.Table.from_pylist([m.model_dump(exclude=exclude) for m in models]), file_name)
+
+    def _load_models(self, model: type[ModelT], file_name: str) -> list[ModelT]:
+        # Stored models were validated when they were created. They are restored like unpickled models,
+        # which is several times faster than model_construct
+        table: pa.Table = self._data_manager.load_arrow(file_name)
+        names: list[str] = table.column_names
+        columns: list[list] = [self._column_to_list(table.column(name)) for name in names]
+        models: list[ModelT] = []
+        for values in zip(*columns):
+            m: ModelT = model.__new__(model)
+            m.__setstate__({
+                '__dict__': dict(zip(names, values)),
+                '__pydantic_fields_set__': set(names),
+                '__pydantic_extra__': None,
+                '__pydantic_private__': None,
+            })
+            models.append(m)
+        return models
+
+    @staticmethod
+    def _column_to_list(column: pa.ChunkedArray) -> list:
+        # Going through NumPy is several times faster than Arrow scalars for flat columns without nulls
+        flat: bool = (
+            pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or
+            pa.types.is_boolean(column.type) or pa.types.is_date32(column.type) or pa.types.is_string(column.type)
+        )
+        if flat and column.null_count == 0:
+            return column.to_numpy(zero_copy_only=False).tolist()
+        return column.to_pylist()
+
+    @staticmethod
+    def _filter_dates(
+            table: TableT,
+            column: str,
+            start_date: datetime.date | None,
+            end_date: datetime.date | None
+    ) -> TableT:
+        if start_date is None and end_date is None:
+            return table
+        dates: np.ndarray = table.column(column).astype('datetime64[D]')
+        mask: np.ndarray = np.ones(len(table), dtype=bool)
+        if start_date is not None:
+            mask &= dates >= np.datetime64(start_date, 'D')
+        if end_date is not None:
+            mask &= dates <= np.datetime64(end_date, 'D')
+        return table.take(np.flatnonzero(mask))
@@ -0,0 +1,47 @@
+from collections.abc import Sequence
+import numpy as np
+import geopandas as gpd
+from networkx import MultiDiGraph
+from scipy.spatial import cKDTree
+from src.routing_graph import RoutingGraph
+
+
+class NodeIndex:
+    # KD-tree over projected graph node coordinates
+    _nodes: np.ndarray
+    _tree: cKDTree
+    _crs: str
+
+    def __init__(self, nodes: np.ndarray, x: np.ndarray, y: np.ndarray, crs: str):
+        self._nodes = np.asarray(nodes)
+        self._tree = cKDTree(np.column_stack([x, y]))
+        self._crs = crs
+
+    @classmethod
+    def from_graph(cls, graph: MultiDiGraph) -> 'NodeIndex':
+        nodes: list[int] = list(graph.nodes)
+        x: np.ndarray = np.fromiter((graph.nodes[n]['x'] for n in nodes), dtype=np.float64, count=len(nodes))
+        y: np.ndarray = np.fromiter((graph.nodes[n]['y'] for n in nodes), dtype=np.float64, count=len(nodes))
+        return cls(np.array(nodes, dtype=np.int64), x, y, graph.graph['crs'])
+
+    @classmethod
+    def from_routing_graph(cls, graph: RoutingGraph) -> 'NodeIndex':
+        return cls(graph.nodes, graph.x, graph.y, graph.crs)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def nearest_nodes(self, x: Sequence[float] | np.ndarray, y: Sequence[float] | np.ndarray) -> np.ndarray:
+        _, positions = self._tree.query(np.column_stack([x, y]))
+        return self._nodes[positions]
+
+    def nearest_node(self, x: float, y: float) -> int:
+        return int(self.nearest_nodes([x], [y])[0])
+
+    def nearest_nodes_by_coordinates(self, coordinates: Sequence[tuple[float, float]]) -> np.ndarray:
+        # Coordinates are (lat, lon) pairs, all points are projected to the graph CRS in one call
+        if len(coordinates) == 0:
+            return np.empty(0, dtype=self._nodes.dtype)
+        lat_lon: np.ndarray = np.asarray(coordinates, dtype=np.float64)
+        points = gpd.GeoSeries(gpd.points_from_xy(lat_lon[:, 1], lat_lon[:, 0]), crs='epsg:4326').to_crs(self._crs)
+        return self.nearest_nodes(points.x.to_numpy(), points.y.to_numpy())
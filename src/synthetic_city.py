@@ -0,0 +1,97 @@
+import random
+from faker import Faker
+from pydantic import BaseModel, ConfigDict
+from networkx import MultiDiGraph
+from pyproj import Transformer
+from shapely.geometry import Polygon
+from src.transport_mos import BicycleParking, SlowZone
+from src.city_utils import CityZone
+from src.faker_providers.person import PersonProvider
+from src.faker_providers.weather import WeatherProvider
+from src.faker_providers.datetime import DatetimeProvider
+from src.faker_providers.parking import ParkingProvider
+from src.faker_providers.scooter import ScooterProvider
+
+# UTM zone 37N, the projection osmnx picks for Moscow
+SYNTHETIC_CRS: str = 'epsg:32637'
+# Bottom left corner of the grid, close to the Moscow center
+ORIGIN_X: float = 410000
+ORIGIN_Y: float = 6176000
+
+
+class SyntheticCity(BaseModel):
+    # Offline replacement of the OSM graph and transport.mos.ru datasets, coordinates are (lat, lon)
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    polygon: Polygon
+    graph: MultiDiGraph
+    bicycle_parking: list[BicycleParking]
+    slow_zones: list[SlowZone]
+
+
+def build_grid_city(
+        size: int,
+        step_m: float = 100,
+        parking_every: int = 3,
+        slow_zone_size: int = 2,
+        seed: int = 0
+) -> SyntheticCity:
+    # Square grid of two-way streets with slightly varying edge lengths, a parking near every
+    # parking_every-th crossing and a zero speed zone in the middle of the grid
+    rnd = random.Random(seed)
+    to_lat_lon = Transformer.from_crs(SYNTHETIC_CRS, 'epsg:4326', always_xy=True)
+    graph = MultiDiGraph(crs=SYNTHETIC_CRS)
+    for i in range(size):
+        for j in range(size):
+            x: float = ORIGIN_X + j * step_m
+            y: float = ORIGIN_Y + i * step_m
+            lon, lat = to_lat_lon.transform(x, y)
+            graph.add_node(i * size + j, x=x, y=y, lat=lat, lon=lon)
+    for i in range(size):
+        for j in range(size):
+            for next_i, next_j in ((i, j + 1), (i + 1, j)):
+                if next_i < size and next_j < size:
+                    length: float = step_m * rnd.uniform(1, 1.3)
+                    graph.add_edge(i * size + j, next_i * size + next_j, length=length)
+                    graph.add_edge(next_i * size + next_j, i * size + j, length=length)
+
+    def lat_lon(i: float, j: float) -> tuple[float, float]:
+        lon, lat = to_lat_lon.transform(ORIGIN_X + j * step_m, ORIGIN_Y + i * step_m)
+        return lat, lon
+
+    corners: list[tuple[float, float]] = [lat_lon(-1, -1), lat_lon(-1, size), lat_lon(size, size), lat_lon(size, -1)]
+    bicycle_parking: list[BicycleParking] = [
+        BicycleParking(
+            name=f'Parking {i}-{j}',
+            geometry_type='Point',
+            coordinates=lat_lon(i + rnd.uniform(-0.2, 0.2), j + rnd.uniform(-0.2, 0.2))
+        )
+        for i in range(0, size, parking_every)
+        for j in range(0, size, parking_every)
+    ]
+    center: float = size / 2
+    slow_zone: list[tuple[float, float]] = [
+        lat_lon(center - 0.5, center - 0.5),
+        lat_lon(center - 0.5, center + slow_zone_size - 0.5),
+        lat_lon(center + slow_zone_size - 0.5, center + slow_zone_size - 0.5),
+        lat_lon(center + slow_zone_size - 0.5, center - 0.5)
+    ]
+    return SyntheticCity(
+        polygon=Polygon(corners),
+        graph=graph,
+        bicycle_parking=bicycle_parking,
+        slow_zones=[SlowZone(id=1, speed_limit=0, geometry_type='Polygon', coordinates=[slow_zone])]
+    )
+
+
+def create_fake(city_zone: CityZone, hardware_ids: list[str], seed: int = 0) -> Faker:
+    # Seeded Faker with the planner providers. ParkingProvider draws from the global random module,
+    # so it is seeded as well
+    fake = Faker('ru_RU')
+    Faker.seed(seed)
+    random.seed(seed)
+    fake.add_provider(PersonProvider)
+    fake.add_provider(WeatherProvider)
+    fake.add_provider(DatetimeProvider)
+    fake.add_provider(ParkingProvider(generator=fake, zone_parking=city_zone.parking))
+    fake.add_provider(ScooterProvider(generator=fake, hardware_ids=hardware_ids))
+    return fake
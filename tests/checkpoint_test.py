@@ -0,0 +1,69 @@
+import copy
+import datetime
+import pytest
+from src.city_utils import CityZone
+from src.data_manager import DataManager
+from src.planner import SimulationPlan
+from src.ride_simulator import SimulationState
+from src.sharded_simulator import ShardedRideSimulator
+from src.checkpoint import SimulationCheckpointer
+from ride_simulator_test import simulation_summary
+
+CHECKPOINT_EVERY: datetime.timedelta = datetime.timedelta(days=1)
+
+
+class InterruptingCheckpointer(SimulationCheckpointer):
+    # Stops the simulation right after the given number of saved checkpoints
+    _saves_left: int
+
+    def __init__(self, data_manager: DataManager, saves: int):
+        super().__init__(data_manager)
+        self._saves_left = saves
+
+    def save(self, **kwargs):
+        super().save(**kwargs)
+        self._saves_left -= 1
+        if self._saves_left == 0:
+            raise KeyboardInterrupt
+
+
+def test_resumed_simulation_matches_uninterrupted(tmp_path, grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    dm = DataManager(str(tmp_path))
+    expected: SimulationState = ShardedRideSimulator(processes=1, grid=(2, 1)).simulate_rides(
+        plan=copy.deepcopy(grid_plan), city_zone=grid_city_zone
+    )
+    with pytest.raises(KeyboardInterrupt):
+        ShardedRideSimulator(processes=1, grid=(2, 1)).simulate_rides(
+            plan=copy.deepcopy(grid_plan),
+            city_zone=grid_city_zone,
+            checkpointer=InterruptingCheckpointer(dm, saves=3),
+            checkpoint_every=CHECKPOINT_EVERY
+        )
+    state: SimulationState = ShardedRideSimulator(processes=1, grid=(2, 1)).simulate_rides(
+        plan=grid_plan,
+        city_zone=grid_city_zone,
+        checkpointer=SimulationCheckpointer(dm),
+        checkpoint_every=CHECKPOINT_EVERY
+    )
+    assert simulation_summary(state) == simulation_summary(expected)
+    # Finished run clears its checkpoint, so the next run starts over
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_checkpoint_of_another_plan_is_rejected(tmp_path, grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    dm = DataManager(str(tmp_path))
+    with pytest.raises(KeyboardInterrupt):
+        ShardedRideSimulator(processes=1, grid=(2, 1)).simulate_rides(
+            plan=copy.deepcopy(grid_plan),
+            city_zone=grid_city_zone,
+            checkpointer=InterruptingCheckpointer(dm, saves=1),
+            checkpoint_every=CHECKPOINT_EVERY
+        )
+    grid_plan.rides = grid_plan.rides[:-1]
+    with pytest.raises(ValueError, match='another plan'):
+        ShardedRideSimulator(processes=1, grid=(2, 1)).simulate_rides(
+            plan=grid_plan,
+            city_zone=grid_city_zone,
+            checkpointer=SimulationCheckpointer(dm),
+            checkpoint_every=CHECKPOINT_EVERY
+        )
@@ -0,0 +1,40 @@
+from networkx import MultiDiGraph
+from src.city_utils import ZoneParking, find_closest_parking
+
+# One-way street 0 -> 1 -> 2 -> 3 -> 4 -> 5, lengths in meters
+EDGES: list[tuple[int, int, float]] = [(0, 1, 100), (1, 2, 100), (2, 3, 300), (3, 4, 1500), (4, 5, 600)]
+# Parking id by graph node, two parking share node 2
+PARKING_NODES: dict[int, int] = {1: 2, 2: 0, 3: 1, 4: 3, 5: 4, 6: 5, 7: 2}
+
+
+def one_way_street() -> tuple[MultiDiGraph, list[ZoneParking]]:
+    graph = MultiDiGraph()
+    for u, v, length in EDGES:
+        graph.add_edge(u, v, length=length)
+    # Longer parallel edge is ignored
+    graph.add_edge(1, 2, length=500)
+    zone_parking: list[ZoneParking] = [
+        ZoneParking(id=pid, name=f'Parking {pid}', coordinates=(55.75, 37.61), graph_node=node, closest_parking_id=[])
+        for pid, node in PARKING_NODES.items()
+    ]
+    return graph, zone_parking
+
+
+def test_closest_parking_are_sorted_by_walking_distance():
+    graph, zone_parking = one_way_street()
+    closest_parking: dict[int, list[int]] = find_closest_parking(graph, zone_parking, count=3)
+    # Parking at the same node first, then the ones behind the start against the street direction
+    assert closest_parking[1] == [7, 3, 2]
+    assert closest_parking[7] == [1, 3, 2]
+    assert closest_parking[4] == [1, 7, 3]
+    assert closest_parking[5] == [6, 4, 1]
+
+
+def test_closest_parking_are_within_max_distance():
+    graph, zone_parking = one_way_street()
+    closest_parking: dict[int, list[int]] = find_closest_parking(graph, zone_parking, count=3)
+    # Parking 4 is 2100 m away from parking 6, beyond the default 2 km
+    assert closest_parking[6] == [5]
+    assert find_closest_parking(graph, zone_parking, count=3, max_distance_m=1000)[4] == [1, 7, 3]
+    assert find_closest_parking(graph, zone_parking, count=3, max_distance_m=600)[5] == [6]
+    assert find_closest_parking(graph, zone_parking, count=3, max_distance_m=299)[4] == []
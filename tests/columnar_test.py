@@ -0,0 +1,67 @@
+import datetime
+import pickle
+import numpy as np
+from src.ride_simulator import RideDetails, RideDetailsLog
+
+
+def make_ride_details(count: int) -> list[RideDetails]:
+    start: datetime.datetime = datetime.datetime(2023, 6, 1, 8)
+    return [
+        RideDetails(
+            id=i + 1,
+            person_id=i % 7,
+            scooter_id=100 + i,
+            start_parking_id=i % 5,
+            end_parking_id=(i + 1) % 5,
+            desired_start_datetime=start + datetime.timedelta(minutes=i),
+            start_datetime=start + datetime.timedelta(minutes=i, seconds=30),
+            end_datetime=start + datetime.timedelta(minutes=i + 10),
+            distance_m=1000.5 + i,
+            duration_s=600,
+            promo_code=i % 2 == 0,
+            find_available_time_s=30,
+            find_available_attempts=i % 3
+        )
+        for i in range(count)
+    ]
+
+
+def test_models_round_trip():
+    # Starts from a single row, so the columns grow several times while appending
+    models: list[RideDetails] = make_ride_details(1500)
+    log = RideDetailsLog(capacity=1)
+    capacities: list[int] = []
+    for i, m in enumerate(models):
+        log.append(m)
+        capacity: int = len(log._columns['id'])
+        if not capacities or capacity != capacities[-1]:
+            capacities.append(capacity)
+            # Rows written before the growth are kept
+            assert log.to_models() == models[:i + 1]
+    assert capacities == [1, 1024, 2048]
+    assert len(log) == len(models)
+    assert log.to_models() == models
+    assert log[-1] == models[-1]
+    assert log[10:20].to_models() == models[10:20]
+    assert RideDetailsLog.from_models(models).to_models() == models
+
+
+def test_pickle_pandas_and_arrow_round_trip():
+    models: list[RideDetails] = make_ride_details(50)
+    log: RideDetailsLog = RideDetailsLog.from_models(models)
+    assert pickle.loads(pickle.dumps(log)).to_models() == models
+    assert RideDetailsLog.from_pandas(log.to_pandas()).to_models() == models
+    assert RideDetailsLog.from_arrow(log.to_arrow()).to_models() == models
+
+
+def test_concat_take_and_update():
+    models: list[RideDetails] = make_ride_details(30)
+    log: RideDetailsLog = RideDetailsLog.concat([
+        RideDetailsLog.from_models(models[:10]), RideDetailsLog.from_models(models[10:])
+    ])
+    assert log.to_models() == models
+    assert log.take(np.array([3, 1])).to_models() == [models[3], models[1]]
+    # Columns read from Arrow are read-only views, update copies them first
+    log = RideDetailsLog.from_arrow(log.to_arrow())
+    log.update(2, end_parking_id=42, distance_m=1.5)
+    assert log[2] == models[2].model_copy(update={'end_parking_id': 42, 'distance_m': 1.5})
@@ -0,0 +1,40 @@
+import datetime
+import pytest
+from faker import Faker
+from src.synthetic_city import SyntheticCity, build_grid_city, create_fake
+from src.city_utils import CityZone, prepare_city_zone
+from src.planner import Planner, SimulationPlan
+
+# Small seeded synthetic city shared by the regression tests, fixtures in tests/fixtures are produced from it
+GRID_SIZE: int = 20
+PERSONS: int = 200
+# Small parking make riders wait, cancel and ride on to free parking
+MAX_PARKING_CAPACITY: int = 2
+START_DATE: datetime.date = datetime.date(2023, 6, 1)
+DAYS: int = 7
+HARDWARE_IDS: list[str] = ['HW-001', 'HW-002']
+
+
+@pytest.fixture(scope='session')
+def grid_city() -> SyntheticCity:
+    return build_grid_city(GRID_SIZE)
+
+
+@pytest.fixture(scope='session')
+def grid_city_zone(grid_city: SyntheticCity) -> CityZone:
+    return prepare_city_zone(grid_city.polygon, grid_city.graph, grid_city.bicycle_parking, grid_city.slow_zones)
+
+
+def create_grid_fake(city_zone: CityZone) -> Faker:
+    return create_fake(city_zone, HARDWARE_IDS)
+
+
+@pytest.fixture
+def grid_plan(grid_city_zone: CityZone) -> SimulationPlan:
+    # Function scoped, the simulation changes parking and persons of the plan
+    return Planner(fake=create_grid_fake(grid_city_zone)).plan_simulation(
+        start_date=START_DATE,
+        end_date=START_DATE + datetime.timedelta(days=DAYS),
+        persons_count=PERSONS,
+        max_parking_capacity=MAX_PARKING_CAPACITY
+    )
@@ -0,0 +1,26 @@
+import pandas as pd
+import pyarrow as pa
+from src.data_manager import DataManager
+from src.database_loader import User, model_arrow_schema
+
+
+def test_parquet_stream_writer_keeps_nullable_columns(tmp_path):
+    # First chunk has only missing values in nullable columns, they must not be written as null type
+    dm = DataManager(str(tmp_path))
+    chunks: list[pd.DataFrame] = [
+        pd.DataFrame({
+            'id': [1, 2], 'first_name': ['Anna', 'Ivan'], 'last_name': [None, None], 'phone': ['+79000000001'] * 2,
+            'sex': [None, None], 'birth_date': [pd.Timestamp('1990-01-01').date()] * 2
+        }),
+        pd.DataFrame({
+            'id': [3], 'first_name': ['Olga'], 'last_name': ['Petrova'], 'phone': ['+79000000003'],
+            'sex': ['F'], 'birth_date': [pd.Timestamp('1991-02-03').date()]
+        }),
+    ]
+    with dm.open_parquet_writer('users.parquet', model_arrow_schema(User)) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    users: pd.DataFrame = dm.load_parquet('users.parquet')
+    assert users['sex'].tolist() == [None, None, 'F']
+    assert users['last_name'].tolist() == [None, None, 'Petrova']
+    assert model_arrow_schema(User).field('birth_date').type == pa.date32()
@@ -0,0 +1,123 @@
+import datetime
+from zoneinfo import ZoneInfo
+import pandas as pd
+import pytest
+from shapely.geometry import LineString
+from faker import Faker
+from src.city_utils import CityZone
+from src.planner import SimulationPlan
+from src.ride_simulator import RideSimulator, SimulationState
+from src.data_manager import DataManager
+from src.database import Database
+from src.database_loader import DatabaseLoader, Tariff, DEFAULT_TABLES
+from database_test import FakeConnection
+
+TARIFF = Tariff(day=10, night=5)
+MOSCOW = ZoneInfo('Europe/Moscow')
+UTC = ZoneInfo('UTC')
+
+
+@pytest.fixture
+def grid_state(grid_plan: SimulationPlan, grid_city_zone: CityZone) -> SimulationState:
+    return RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+
+
+def row_trips_and_payments(state: SimulationState, tariff: Tariff) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Row by row preparation the vectorized one replaced
+    trips: list[dict] = []
+    payments: list[dict] = []
+    for r in state.ride_details:
+        if tariff.day_start_hour <= r.start_datetime.hour < tariff.night_start_hour:
+            tariff_price: float = tariff.day
+        else:
+            tariff_price = tariff.night
+        price: int = 0 if r.promo_code else int(r.duration_s / 60 * tariff_price * 100)
+        trips.append({
+            'id': r.id,
+            'user_id': r.person_id,
+            'scooter_hw_id': state.scooters[r.scooter_id].hardware_id,
+            'started_at': r.start_datetime.replace(tzinfo=MOSCOW),
+            'finished_at': r.end_datetime.replace(tzinfo=MOSCOW),
+            'start_lat': state.parking[r.start_parking_id].coordinates[0],
+            'start_lon': state.parking[r.start_parking_id].coordinates[1],
+            'finish_lat': state.parking[r.end_parking_id].coordinates[0],
+            'finish_lon': state.parking[r.end_parking_id].coordinates[1],
+            'distance': r.distance_m,
+            'price': price
+        })
+        payments.append({
+            'id': len(payments) + 1,
+            'trip_id': r.id,
+            'price': price,
+            'tariff': int(tariff_price * 100),
+            'promo': r.promo_code
+        })
+    return pd.DataFrame(trips), pd.DataFrame(payments)
+
+
+def row_events(state: SimulationState, fake: Faker) -> pd.DataFrame:
+    def to_utc(dt: datetime.datetime) -> datetime.datetime:
+        return dt.replace(tzinfo=MOSCOW).astimezone(UTC).replace(tzinfo=None)
+
+    events: list[dict] = []
+    for r in state.ride_details:
+        book_datetime: datetime.datetime = r.start_datetime
+        if r.start_datetime == r.desired_start_datetime:
+            book_datetime += datetime.timedelta(seconds=10)
+        events.append({'user_id': r.person_id, 'timestamp': to_utc(r.desired_start_datetime), 'type_id': 0})
+        events.append({'user_id': r.person_id, 'timestamp': to_utc(book_datetime), 'type_id': 1})
+        events.append({'user_id': r.person_id, 'timestamp': to_utc(r.end_datetime), 'type_id': 2})
+    for r in state.cancelled_rides:
+        start_datetime: datetime.datetime = to_utc(r.start_datetime)
+        events.append({'user_id': r.person_id, 'timestamp': start_datetime, 'type_id': 0})
+        events.append({
+            'user_id': r.person_id,
+            'timestamp': start_datetime + datetime.timedelta(seconds=r.find_available_time_s),
+            'type_id': 3
+        })
+    events.extend(fake.random.choices(events, k=int(len(events) * 0.05)))
+    return pd.DataFrame(sorted(events, key=lambda e: e['timestamp']))
+
+
+def test_trips_and_payments_match_row_path(grid_state: SimulationState):
+    loader = DatabaseLoader(database=None, fake=Faker())
+    trips, payments = loader._prepare_trips_and_payments(grid_state, tariff=TARIFF)
+    expected_trips, expected_payments = row_trips_and_payments(grid_state, TARIFF)
+    for column in ['started_at', 'finished_at']:
+        expected_trips[column] = pd.to_datetime(expected_trips[column].map(lambda dt: dt.astimezone(UTC)))
+        trips[column] = trips[column].dt.tz_convert('UTC')
+    pd.testing.assert_frame_equal(trips, expected_trips, check_dtype=False)
+    pd.testing.assert_frame_equal(payments, expected_payments, check_dtype=False)
+
+
+def test_events_match_row_path(grid_state: SimulationState):
+    fake = Faker()
+    fake.seed_instance(1)
+    events: pd.DataFrame = DatabaseLoader(database=None, fake=fake)._prepare_events(grid_state)
+    fake.seed_instance(1)
+    expected: pd.DataFrame = row_events(grid_state, fake)
+    assert len(grid_state.cancelled_rides) > 0
+    pd.testing.assert_frame_equal(events, expected, check_dtype=False)
+
+
+def test_routes_and_geometry_are_opt_in(tmp_path):
+    for table_name in DEFAULT_TABLES + ['routes']:
+        pd.DataFrame({'id': [1], 'points': [LineString([(37.6, 55.7), (37.61, 55.71)]).wkb]}).to_parquet(
+            tmp_path / f'{table_name}.parquet'
+        )
+    database = Database()
+    database._conn = FakeConnection()
+    loader = DatabaseLoader(database=database, fake=Faker(), data_manager=DataManager(str(tmp_path)))
+    loader.load_data('raw', bulk_copy=True)
+    statements: list[str] = [sql for sql, _ in database._conn.statements]
+    assert [sql for sql in statements if sql.startswith('CREATE TABLE')] == [
+        f'CREATE TABLE raw.{t} ("id" bigint, "points" bytea)' for t in DEFAULT_TABLES
+    ]
+    database._conn = FakeConnection()
+    loader.load_data('raw', tables=['routes'], bulk_copy=True)
+    assert not any(sql.startswith('ALTER TABLE') for sql, _ in database._conn.statements)
+    database._conn = FakeConnection()
+    loader.load_data('raw', tables=['routes'], bulk_copy=True, convert_geometry=True)
+    assert database._conn.statements[-1][0] == (
+        'ALTER TABLE raw.routes ALTER COLUMN points TYPE geometry(Geometry, 4326) USING ST_GeomFromWKB(points, 4326)'
+    )
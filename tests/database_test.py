@@ -0,0 +1,65 @@
+import io
+import pandas as pd
+from shapely.geometry import LineString
+from src.database import Database
+
+
+class FakeCursor:
+    def __init__(self, statements: list[tuple[str, str | None]]):
+        self._statements = statements
+
+    def __enter__(self) -> 'FakeCursor':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def execute(self, sql: str, stream: io.BytesIO | None = None):
+        self._statements.append((sql, stream.read().decode() if stream is not None else None))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    # Records executed statements and COPY payloads instead of talking to PostgreSQL
+    def __init__(self):
+        self.statements: list[tuple[str, str | None]] = []
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self.statements)
+
+    def commit(self):
+        pass
+
+
+def test_copy_table_from_parquet_csv(tmp_path):
+    file_path: str = str(tmp_path / 'routes.parquet')
+    pd.DataFrame({
+        'trip_id': [1, 2],
+        'started_at': pd.to_datetime(['2023-06-01 08:00:00', '2023-06-01 23:30:15']).tz_localize('Europe/Moscow'),
+        'birth_date': [pd.Timestamp('1990-01-02').date(), None],
+        'points': [LineString([(37.6, 55.7), (37.61, 55.71)]).wkb, None],
+        'last_name': ['Petrova', None],
+        'promo': [True, False],
+    }).to_parquet(file_path)
+    database = Database()
+    database._conn = FakeConnection()
+    database.copy_table_from_parquet('routes', 'raw', file_path, geometry_columns=['points'], batch_size=1)
+    statements: list[tuple[str, str | None]] = database._conn.statements
+    assert statements[1][0] == (
+        'CREATE TABLE raw.routes ("trip_id" bigint, "started_at" timestamptz, "birth_date" date, '
+        '"points" bytea, "last_name" text, "promo" boolean)'
+    )
+    # One COPY per batch, every batch has a header row
+    copies: list[str] = [csv for sql, csv in statements if sql.startswith('COPY')]
+    assert copies == [
+        '"trip_id","started_at","birth_date","points","last_name","promo"\n'
+        f'1,2023-06-01 08:00:00.000000000+0300,1990-01-02,"\\x{LineString([(37.6, 55.7), (37.61, 55.71)]).wkb.hex()}",'
+        '"Petrova",true\n',
+        '"trip_id","started_at","birth_date","points","last_name","promo"\n'
+        '2,2023-06-01 23:30:15.000000000+0300,,,,false\n',
+    ]
+    assert statements[-1][0] == (
+        'ALTER TABLE raw.routes ALTER COLUMN points TYPE geometry(Geometry, 4326) USING ST_GeomFromWKB(points, 4326)'
+    )
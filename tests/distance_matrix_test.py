@@ -0,0 +1,44 @@
+import networkx as nx
+import numpy as np
+import pytest
+from src.city_utils import CityZone
+from src.distance_matrix import DistanceMatrix
+
+PARKING: int = 12
+
+
+def networkx_distances(city_zone: CityZone, parking_ids: list[int]) -> dict[tuple[int, int], float]:
+    nodes: dict[int, int] = {p.id: p.graph_node for p in city_zone.parking}
+    return {
+        (start, end): nx.shortest_path_length(city_zone.graph, nodes[start], nodes[end], weight='length')
+        for start in parking_ids for end in parking_ids
+    }
+
+
+def test_compute_all_matches_networkx(grid_city_zone: CityZone):
+    parking_ids: list[int] = [p.id for p in grid_city_zone.parking]
+    # Batches of a single row go through the same path as the full ones
+    distances: np.ndarray = DistanceMatrix.from_city_zone(grid_city_zone).compute_all(max_batch_bytes=1)
+    assert not np.isnan(distances[np.ix_(parking_ids, parking_ids)]).any()
+    for (start, end), expected in networkx_distances(grid_city_zone, parking_ids[:PARKING]).items():
+        assert distances[start, end] == pytest.approx(expected, rel=1e-6)
+    batched: np.ndarray = DistanceMatrix.from_city_zone(grid_city_zone).compute_all()
+    np.testing.assert_array_equal(batched, distances)
+
+
+def test_missing_rows_are_computed_on_demand(grid_city_zone: CityZone):
+    parking_ids: list[int] = [p.id for p in grid_city_zone.parking][:PARKING]
+    distance_matrix: DistanceMatrix = DistanceMatrix.from_city_zone(grid_city_zone)
+    assert np.isnan(distance_matrix.distances).all()
+    for (start, end), expected in networkx_distances(grid_city_zone, parking_ids).items():
+        assert distance_matrix.distance(start, end) == pytest.approx(expected, rel=1e-6)
+    # Only the rows of the requested start parking are filled
+    computed_rows: np.ndarray = np.flatnonzero(~np.isnan(distance_matrix.distances).all(axis=1))
+    assert computed_rows.tolist() == sorted(parking_ids)
+    # Lookups of computed rows do not need the graph
+    loaded = DistanceMatrix(
+        parking_nodes={p.id: p.graph_node for p in grid_city_zone.parking}, distances=distance_matrix.distances
+    )
+    assert loaded.distance(parking_ids[0], parking_ids[1]) == distance_matrix.distance(parking_ids[0], parking_ids[1])
+    with pytest.raises(ValueError, match='graph is not provided'):
+        loaded.distance(max(p.id for p in grid_city_zone.parking if p.id not in parking_ids), parking_ids[0])
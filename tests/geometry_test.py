@@ -0,0 +1,46 @@
+import random
+import numpy as np
+import pytest
+import shapely.wkb
+from shapely.geometry import LineString
+from src.geometry import encode_linestrings, encode_linestrings_wkt, encode_linestrings_wkb
+
+LINES: int = 200
+
+
+def random_lines() -> list[list[tuple[float, float]]]:
+    rng = random.Random(0)
+    lines: list[list[tuple[float, float]]] = [
+        [(37 + rng.random(), 55 + rng.random()) for _ in range(rng.randint(2, 30))] for _ in range(LINES)
+    ]
+    # Whole numbers and tiny fractions are written by GEOS differently from Python float formatting
+    return lines + [[(37.0, 55.0), (37.5, 55.0)], [(1e-07, 55.75), (123456789.125, 55.75)]]
+
+
+def test_wkt_matches_shapely():
+    lines: list[list[tuple[float, float]]] = random_lines()
+    assert encode_linestrings_wkt(lines) == [LineString(points).wkt for points in lines]
+    assert encode_linestrings(lines, 'wkt') == encode_linestrings_wkt(lines)
+
+
+def test_wkb_round_trips_through_shapely():
+    lines: list[list[tuple[float, float]]] = random_lines()
+    encoded: np.ndarray = encode_linestrings_wkb(lines)
+    for points, wkb in zip(lines, encoded, strict=True):
+        assert list(shapely.wkb.loads(wkb).coords) == points
+    assert list(encode_linestrings(lines, 'wkb')) == list(encoded)
+
+
+def test_single_point_is_a_line_to_itself():
+    lines: list[list[tuple[float, float]]] = [[(37.6, 55.7)], [(37.6, 55.7), (37.61, 55.71)], [(37.7, 55.8)]]
+    assert encode_linestrings_wkt(lines) == [
+        LineString([(37.6, 55.7), (37.6, 55.7)]).wkt,
+        LineString([(37.6, 55.7), (37.61, 55.71)]).wkt,
+        LineString([(37.7, 55.8), (37.7, 55.8)]).wkt,
+    ]
+    assert [list(shapely.wkb.loads(wkb).coords) for wkb in encode_linestrings_wkb(lines)] == [
+        [(37.6, 55.7), (37.6, 55.7)], [(37.6, 55.7), (37.61, 55.71)], [(37.7, 55.8), (37.7, 55.8)]
+    ]
+    assert encode_linestrings_wkt([]) == [] and len(encode_linestrings_wkb([])) == 0
+    with pytest.raises(ValueError, match='Unknown geometry format'):
+        encode_linestrings(lines, 'geojson')
@@ -0,0 +1,81 @@
+import datetime
+import re
+import numpy as np
+import pandas as pd
+import pytest
+from faker import Faker
+from src.faker_providers.parking import Parking
+from src.faker_providers.person import Person, PersonProvider, PersonTable
+
+PERSONS: int = 2000
+BASE_YEAR: int = 2023
+# Means of the bulk and the per-person draws are compared with this relative tolerance
+MEAN_TOLERANCE: float = 0.1
+NUMERIC_FIELDS: list[str] = [
+    'promo_codes', 'work_start_hour', 'work_end_hour', 'occasional_workday_trip_chance',
+    'occasional_weekend_trip_chance', 'skip_trip_chance', 'find_available_time_limit_s', 'speed_average'
+]
+
+
+def create_fake(seed: int = 0) -> Faker:
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    fake.add_provider(PersonProvider)
+    return fake
+
+
+def create_parking() -> list[Parking]:
+    return [
+        Parking(id=i, coordinates=(55.75, 37.61), graph_node=i, max_capacity=2, scooters=[], closest_parking_id=[])
+        for i in range(1, 11)
+    ]
+
+
+def to_frame(persons: list[Person]) -> pd.DataFrame:
+    df = pd.DataFrame([p.model_dump() for p in persons])
+    df['age'] = BASE_YEAR - pd.to_datetime(df['birth_date']).dt.year
+    return df
+
+
+def test_bulk_persons_match_per_person_provider():
+    parking: list[Parking] = create_parking()
+    fake: Faker = create_fake()
+    expected: pd.DataFrame = to_frame([fake.person(parking=parking, base_year=BASE_YEAR) for _ in range(PERSONS)])
+    table: PersonTable = fake.persons(parking=parking, base_year=BASE_YEAR, count=PERSONS)
+    persons: pd.DataFrame = to_frame(table.to_models())
+    assert list(persons.columns) == list(expected.columns)
+    # Ids continue after the persons made one by one
+    assert persons['id'].tolist() == list(range(PERSONS + 1, 2 * PERSONS + 1))
+    assert set(persons['sex']) == set(expected['sex']) == {'F', 'M'}
+    for field in NUMERIC_FIELDS + ['age']:
+        assert persons[field].min() >= expected[field].min(), field
+        assert persons[field].max() <= expected[field].max(), field
+        assert persons[field].mean() == pytest.approx(expected[field].mean(), rel=MEAN_TOLERANCE), field
+    assert persons['work_trips'].mean() == pytest.approx(expected['work_trips'].mean(), rel=MEAN_TOLERANCE)
+    # Parking are set only for persons with work trips
+    parking_ids: set[int] = {p.id for p in parking}
+    for df in [persons, expected]:
+        workers: pd.DataFrame = df[df['work_trips']]
+        assert set(workers['home_parking_id']) <= parking_ids and set(workers['work_parking_id']) <= parking_ids
+        assert df.loc[~df['work_trips'], ['home_parking_id', 'work_parking_id']].isna().all().all()
+    names: list[str] = persons['first_name'].tolist() + persons['last_name'].tolist()
+    assert all(isinstance(name, str) and name for name in names)
+    assert all(isinstance(d, datetime.date) for d in persons['birth_date'])
+
+
+def test_bulk_phones_are_russian_mobile_numbers():
+    table: PersonTable = create_fake().persons(parking=create_parking(), base_year=BASE_YEAR, count=PERSONS)
+    assert all(re.fullmatch(r'\+79\d{9}', phone) for phone in table.column('phone').tolist())
+    assert len(set(table.column('phone').tolist())) > PERSONS * 0.99
+
+
+def test_seed_reproduces_bulk_persons():
+    tables: list[pd.DataFrame] = [
+        create_fake(seed=1).persons(parking=create_parking(), base_year=BASE_YEAR, count=PERSONS).to_pandas()
+        for _ in range(2)
+    ]
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+    other: pd.DataFrame = create_fake(seed=2).persons(
+        parking=create_parking(), base_year=BASE_YEAR, count=PERSONS
+    ).to_pandas()
+    assert not other.equals(tables[0])
@@ -0,0 +1,58 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from src.city_utils import CityZone
+from src.faker_providers.parking import Parking
+from src.faker_providers.person import Person
+from src.planner import Planner, Ride, RideTable, DailyWeather
+from conftest import create_grid_fake, START_DATE, PERSONS, MAX_PARKING_CAPACITY
+
+# Four weeks of rides, enough for stable daily and hourly counts
+DAYS: int = 28
+# Daily counts of two independent plans differ by a few standard deviations at most
+MAX_DAY_DEVIATION: float = 4
+MAX_HOUR_SHARE_DIFFERENCE: float = 0.02
+MAX_TOTAL_DIFFERENCE: float = 0.05
+
+
+@pytest.fixture(scope='module')
+def planner_inputs(grid_city_zone: CityZone) -> tuple[list[Person], list[DailyWeather], list[Parking]]:
+    planner = Planner(fake=create_grid_fake(grid_city_zone))
+    parking: list[Parking] = planner.plan_parking(max_capacity=MAX_PARKING_CAPACITY)
+    persons: list[Person] = planner.plan_persons(parking=parking, base_year=START_DATE.year, count=PERSONS)
+    weather: list[DailyWeather] = planner.plan_weather(START_DATE, START_DATE + datetime.timedelta(days=DAYS - 1))
+    return persons, weather, parking
+
+
+def test_same_seed_gives_same_rides(grid_city_zone: CityZone, planner_inputs):
+    persons, weather, parking = planner_inputs
+    tables: list[RideTable] = [
+        Planner(fake=create_grid_fake(grid_city_zone)).plan_rides_vectorized(persons, weather, parking)
+        for _ in range(2)
+    ]
+    for name in RideTable.dtypes:
+        np.testing.assert_array_equal(tables[0].column(name), tables[1].column(name))
+    other: RideTable = Planner(
+        fake=create_grid_fake(grid_city_zone), rng=np.random.default_rng(1)
+    ).plan_rides_vectorized(persons, weather, parking)
+    assert not np.array_equal(other.column('datetime'), tables[0].column('datetime'))
+
+
+def test_distribution_matches_row_planner(grid_city_zone: CityZone, planner_inputs):
+    persons, weather, parking = planner_inputs
+    fake = create_grid_fake(grid_city_zone)
+    expected: list[Ride] = Planner(fake=fake).plan_rides(persons, weather, parking)
+    rides: RideTable = Planner(fake=fake).plan_rides_vectorized(persons, weather, parking)
+    expected_datetime = pd.Series(pd.to_datetime([r.datetime for r in expected]))
+    ride_datetime = pd.Series(pd.to_datetime(rides.column('datetime')))
+    assert abs(len(rides) / len(expected) - 1) <= MAX_TOTAL_DIFFERENCE
+    days: pd.Index = pd.Index([w.date for w in weather] + [weather[-1].date + datetime.timedelta(days=1)])
+    expected_days: pd.Series = expected_datetime.dt.date.value_counts().reindex(days, fill_value=0)
+    ride_days: pd.Series = ride_datetime.dt.date.value_counts().reindex(days, fill_value=0)
+    deviation: pd.Series = (ride_days - expected_days).abs() / np.sqrt((ride_days + expected_days).clip(lower=1))
+    assert deviation.max() <= MAX_DAY_DEVIATION
+    hours: range = range(24)
+    expected_hours: pd.Series = expected_datetime.dt.hour.value_counts(normalize=True).reindex(hours, fill_value=0)
+    ride_hours: pd.Series = ride_datetime.dt.hour.value_counts(normalize=True).reindex(hours, fill_value=0)
+    assert (ride_hours - expected_hours).abs().max() <= MAX_HOUR_SHARE_DIFFERENCE
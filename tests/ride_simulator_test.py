@@ -0,0 +1,70 @@
+import datetime
+import json
+import os
+from simpy import Environment
+from src.city_utils import CityZone
+from src.faker_providers.parking import Parking
+from src.faker_providers.scooter import Scooter
+from src.planner import Planner, SimulationPlan
+from src.ride_simulator import RideSimulator, SimulationState, ScooterDelivery, ParkingStore
+from conftest import create_grid_fake
+
+FIXTURE_FILE: str = os.path.join(os.path.dirname(__file__), 'fixtures', 'grid_city_rides.json')
+
+
+def simulation_summary(state: SimulationState) -> dict[str, list]:
+    return {
+        'rides': [
+            [r.id, r.person_id, r.scooter_id, r.start_parking_id, r.end_parking_id, r.start_datetime.isoformat()]
+            for r in state.ride_details
+        ],
+        'cancelled_rides': [r.ride_id for r in state.cancelled_rides],
+    }
+
+
+def test_simulation_matches_fixture(grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    state: SimulationState = RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+    with open(FIXTURE_FILE) as f:
+        expected: dict[str, list] = json.load(f)
+    summary: dict[str, list] = simulation_summary(state)
+    assert len(summary['rides']) == len(expected['rides'])
+    assert len(summary['cancelled_rides']) == len(expected['cancelled_rides'])
+    assert summary == expected
+
+
+def test_continuation_delivers_scooters_on_the_road(grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    previous_state: SimulationState = RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+    # Scooter left on the road by the previous state arrives a minute after its end
+    parking: Parking = next(p for p in previous_state.parking.values() if p.scooters)
+    scooter: Scooter = parking.scooters.pop()
+    offset_s: float = (previous_state.end_datetime - previous_state.start_datetime).total_seconds()
+    previous_state.pending_deliveries = [
+        ScooterDelivery(scooter=scooter, parking_id=parking.id, arrival_s=offset_s + 60)
+    ]
+    plan: SimulationPlan = Planner(fake=create_grid_fake(grid_city_zone)).plan_simulation_increment(
+        previous_state, previous_state.end_datetime.date() + datetime.timedelta(days=1)
+    )
+    state: SimulationState = RideSimulator().simulate_rides(
+        plan=plan, city_zone=grid_city_zone, previous_state=previous_state
+    )
+    assert state.first_ride_id == previous_state.get_next_ride_id()
+    assert state.ride_details[0].id == state.first_ride_id
+    parked: int = sum(len(p.scooters) for p in state.parking.values())
+    assert parked + len(state.pending_deliveries) == len(previous_state.scooters)
+    assert scooter.id in state.scooters
+    assert all(d.ride is None for d in state.pending_deliveries)
+
+
+def test_scooters_are_picked_up_in_return_order():
+    scooters: list[Scooter] = [Scooter(id=i, hardware_id='HW-001', distance_m=0) for i in range(4)]
+    parking = Parking(
+        id=1, coordinates=(55.75, 37.61), graph_node=1, max_capacity=4, scooters=scooters[:2], closest_parking_id=[]
+    )
+    env = Environment()
+    store = ParkingStore(env, parking)
+    store.put(scooters[2])
+    picked: list[Scooter] = [store.get().value for _ in range(2)]
+    store.put(scooters[3])
+    picked.extend(store.get().value for _ in range(2))
+    assert [s.id for s in picked] == [0, 1, 2, 3]
+    assert len(parking.scooters) == 0
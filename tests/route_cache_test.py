@@ -0,0 +1,47 @@
+from src.data_manager import DataManager
+from src.route_cache import RouteCache, RouteCacheStats
+
+
+def test_least_recently_used_routes_are_evicted():
+    cache = RouteCache(max_nodes=9)
+    cache.put(1, 2, [1, 5, 2], 10.0)
+    cache.put(1, 3, [1, 5, 3], 11.0)
+    cache.put(2, 3, [2, 6, 3], 12.0)
+    # Reading a route makes it the most recently used one
+    assert cache.get(1, 2) is not None
+    cache.put(3, 1, [3, 7, 8, 1], 13.0)
+    assert (1, 3) not in cache
+    assert (2, 3) not in cache
+    assert [(1, 2) in cache, (3, 1) in cache] == [True, True]
+    assert cache.stats.nodes == 7
+    assert cache.stats.evictions == 2
+    # A route longer than the budget is kept alone, so the last result is always cached
+    cache.put(4, 5, list(range(4, 16)), 14.0)
+    assert len(cache) == 1 and (4, 5) in cache
+
+
+def test_stats_count_hits_and_misses():
+    cache = RouteCache()
+    assert cache.get(1, 2) is None
+    cache.put(1, 2, [1, 2], 10.0)
+    cache.put(1, 2, [1, 3, 2], 9.0)
+    assert cache.get(1, 2).path == (1, 3, 2)
+    assert cache.get(1, 2).length == 9.0
+    assert cache.get(2, 1) is None
+    assert cache.stats == RouteCacheStats(hits=2, misses=2, evictions=0, size=1, nodes=3)
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_dump_load_round_trip(tmp_path):
+    dm = DataManager(str(tmp_path))
+    cache = RouteCache()
+    cache.put(1, 2, [1, 5, 2], 10.5)
+    cache.put(2, 1, [2, 5, 1], 10.25)
+    cache.put(3, 4, [3, 4], 7.0)
+    cache.get(1, 2)
+    cache.dump(dm, 'route_cache.pickle')
+    loaded: RouteCache = RouteCache.load(dm, 'route_cache.pickle')
+    assert list(loaded._routes.items()) == list(cache._routes.items())
+    # Recency order is kept, the least recently used route is evicted first after loading
+    small: RouteCache = RouteCache.load(dm, 'route_cache.pickle', max_nodes=5)
+    assert list(small._routes) == [(3, 4), (1, 2)]
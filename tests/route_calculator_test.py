@@ -0,0 +1,34 @@
+import networkx as nx
+import pytest
+from src.city_utils import CityZone
+from src.planner import SimulationPlan
+from src.ride_simulator import RideSimulator, SimulationState, RideRoute, RideDetails
+from src.route_calculator import RouteCalculator, ASTAR_MAX_END_NODES
+from src.routing_graph import RoutingGraph
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_routes_match_networkx(processes: int, grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    state: SimulationState = RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+    groups: dict[int, list[tuple[int, int, float]]] = RouteCalculator._group_rides(state, None, None)
+    end_nodes_counts: list[int] = [len({end_node for _, end_node, _ in targets}) for targets in groups.values()]
+    # Both A* and single source SciPy groups are present in the grid city
+    assert min(end_nodes_counts) <= ASTAR_MAX_END_NODES < max(end_nodes_counts)
+    routes: list[RideRoute] = [
+        route
+        for batch in RouteCalculator(grid_city_zone.graph, processes=processes).calculate_routes(state, batch_size=100)
+        for route in batch
+    ]
+    assert sorted(r.ride_id for r in routes) == state.ride_details.column('id').tolist()
+    routing_graph: RoutingGraph = grid_city_zone.get_routing_graph()
+    rides: dict[int, RideDetails] = {r.id: r for r in state.ride_details}
+    for route in routes:
+        ride: RideDetails = rides[route.ride_id]
+        path: list[int] = nx.shortest_path(
+            grid_city_zone.graph,
+            state.parking[ride.start_parking_id].graph_node,
+            state.parking[ride.end_parking_id].graph_node,
+            weight='length'
+        )
+        assert route.points == routing_graph.path_lon_lat(path)
+        assert route.speed_avg == state.persons[ride.person_id].speed_average
@@ -0,0 +1,54 @@
+import random
+import networkx as nx
+import numpy as np
+import pytest
+from networkx import MultiDiGraph
+from src.synthetic_city import SyntheticCity
+from src.routing_graph import RoutingGraph
+
+PAIRS: int = 50
+
+
+def random_pairs(graph: MultiDiGraph, count: int) -> list[tuple[int, int]]:
+    nodes: list[int] = list(graph.nodes)
+    rng = random.Random(0)
+    return [(rng.choice(nodes), rng.choice(nodes)) for _ in range(count)]
+
+
+def test_lengths_are_not_rounded():
+    graph = MultiDiGraph(crs='epsg:32637')
+    for node, lon in enumerate([37.60, 37.61, 37.62]):
+        graph.add_node(node, x=lon * 1000, y=0.0, lat=55.75, lon=lon)
+    graph.add_edge(0, 1, length=591.0999069)
+    graph.add_edge(0, 1, length=700.0)
+    graph.add_edge(1, 2, length=0.1)
+    routing_graph: RoutingGraph = RoutingGraph.from_graph(graph)
+    assert routing_graph.shortest_path_length(0, 2, heuristic=False) == 591.0999069 + 0.1
+    assert routing_graph.distances_from([0])[0, 2] == 591.0999069 + 0.1
+
+
+def test_dijkstra_matches_networkx(grid_city: SyntheticCity):
+    routing_graph: RoutingGraph = RoutingGraph.from_graph(grid_city.graph)
+    pairs: list[tuple[int, int]] = random_pairs(grid_city.graph, PAIRS)
+    distances: np.ndarray = routing_graph.distances_from([source for source, _ in pairs])
+    for i, (source, target) in enumerate(pairs):
+        expected: float = nx.shortest_path_length(grid_city.graph, source, target, weight='length')
+        assert routing_graph.shortest_path_length(source, target, heuristic=False) == pytest.approx(expected, rel=1e-12)
+        assert distances[i, routing_graph.node_position(target)] == pytest.approx(expected, rel=1e-12)
+
+
+def test_a_star_matches_networkx(grid_city: SyntheticCity):
+    routing_graph: RoutingGraph = RoutingGraph.from_graph(grid_city.graph)
+    for source, target in random_pairs(grid_city.graph, PAIRS):
+        expected: float = nx.shortest_path_length(grid_city.graph, source, target, weight='length')
+        length, path = routing_graph.shortest_path(source, target)
+        assert length == pytest.approx(expected, rel=1e-12)
+        assert path[0] == source and path[-1] == target
+        assert sum(grid_city.graph[u][v][0]['length'] for u, v in zip(path, path[1:])) == pytest.approx(expected)
+
+
+def test_dijkstra_does_not_build_heuristic(grid_city: SyntheticCity):
+    routing_graph: RoutingGraph = RoutingGraph.from_graph(grid_city.graph)
+    source, target = random_pairs(grid_city.graph, 1)[0]
+    routing_graph.shortest_path_length(source, target, heuristic=False)
+    assert routing_graph._coordinates is None
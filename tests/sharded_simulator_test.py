@@ -0,0 +1,29 @@
+import json
+from src.city_utils import CityZone
+from src.planner import SimulationPlan
+from src.ride_simulator import SimulationState
+from src.sharded_simulator import ShardedRideSimulator
+from ride_simulator_test import FIXTURE_FILE, simulation_summary
+
+
+def test_single_region_matches_fixture(grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    # One region over open windows is the same simulation as the single environment
+    state: SimulationState = ShardedRideSimulator(processes=1, grid=(1, 1)).simulate_rides(
+        plan=grid_plan, city_zone=grid_city_zone
+    )
+    with open(FIXTURE_FILE) as f:
+        expected: dict[str, list] = json.load(f)
+    summary: dict[str, list] = simulation_summary(state)
+    assert summary['rides'] == expected['rides']
+    assert sorted(summary['cancelled_rides']) == sorted(expected['cancelled_rides'])
+
+
+def test_regions_keep_all_scooters(grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    scooters_count: int = sum(len(p.scooters) for p in grid_plan.parking)
+    state: SimulationState = ShardedRideSimulator(processes=1, grid=(3, 1)).simulate_rides(
+        plan=grid_plan, city_zone=grid_city_zone
+    )
+    parked: int = sum(len(p.scooters) for p in state.parking.values())
+    assert parked + len(state.pending_deliveries) == scooters_count
+    assert len(state.scooters) == scooters_count
+    assert state.ride_details.column('id').tolist() == list(range(1, len(state.ride_details) + 1))
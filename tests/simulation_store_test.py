@@ -0,0 +1,81 @@
+import datetime
+import numpy as np
+import pandas as pd
+from src.city_utils import CityZone
+from src.data_manager import DataManager
+from src.planner import SimulationPlan
+from src.ride_simulator import RideSimulator, SimulationState, ScooterDelivery
+from src.simulation_store import SimulationStore, upgrade_state
+from conftest import START_DATE
+
+
+def test_city_zone_round_trip(tmp_path, grid_city_zone: CityZone):
+    store = SimulationStore(DataManager(str(tmp_path)))
+    store.dump_city_zone(grid_city_zone, 'city_zone')
+    loaded: CityZone = store.load_city_zone('city_zone')
+    assert loaded.parking == grid_city_zone.parking
+    assert loaded.polygon.equals(grid_city_zone.polygon)
+    expected_arrays: dict[str, np.ndarray] = grid_city_zone.get_routing_graph().arrays
+    for name, array in loaded.get_routing_graph().arrays.items():
+        np.testing.assert_array_equal(array, expected_arrays[name])
+
+
+def test_plan_round_trip(tmp_path, grid_plan: SimulationPlan):
+    store = SimulationStore(DataManager(str(tmp_path)))
+    store.dump_plan(grid_plan, 'simulation_plan')
+    loaded: SimulationPlan = store.load_plan('simulation_plan')
+    assert loaded.start_date == grid_plan.start_date
+    assert loaded.end_date == grid_plan.end_date
+    assert loaded.persons == grid_plan.persons
+    assert loaded.parking == grid_plan.parking
+    assert loaded.weather == grid_plan.weather
+    assert list(loaded.rides) == list(grid_plan.rides)
+    day: SimulationPlan = store.load_plan('simulation_plan', START_DATE, START_DATE)
+    assert list(day.rides) == [r for r in grid_plan.rides if r.datetime.date() == START_DATE]
+
+
+def test_state_round_trip(tmp_path, grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    state: SimulationState = RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+    parking_id, parking = next((k, p) for k, p in state.parking.items() if p.scooters)
+    state.pending_deliveries = [ScooterDelivery(scooter=parking.scooters.pop(), parking_id=parking_id, arrival_s=60)]
+    store = SimulationStore(DataManager(str(tmp_path)))
+    store.dump_state(state, 'sim_state')
+    loaded: SimulationState = store.load_state('sim_state')
+    assert loaded.start_datetime == state.start_datetime
+    assert loaded.end_datetime == state.end_datetime
+    assert loaded.first_ride_id == state.first_ride_id
+    pd.testing.assert_frame_equal(loaded.ride_details.to_pandas(), state.ride_details.to_pandas())
+    pd.testing.assert_frame_equal(loaded.cancelled_rides.to_pandas(), state.cancelled_rides.to_pandas())
+    assert loaded.persons == state.persons
+    assert loaded.parking == state.parking
+    assert loaded.scooters == state.scooters
+    assert loaded.pending_deliveries == state.pending_deliveries
+    # Scooters are shared between the parking, the deliveries and the state, as in the simulation
+    for p in loaded.parking.values():
+        assert all(loaded.scooters[s.id] is s for s in p.scooters)
+    assert loaded.scooters[loaded.pending_deliveries[0].scooter.id] is loaded.pending_deliveries[0].scooter
+    day: SimulationState = store.load_state('sim_state', START_DATE, START_DATE + datetime.timedelta(days=1))
+    assert len(day.ride_details) == sum(
+        r.start_datetime.date() <= START_DATE + datetime.timedelta(days=1) for r in state.ride_details
+    )
+
+
+def test_state_pickled_by_earlier_versions_is_upgraded(tmp_path, grid_plan: SimulationPlan, grid_city_zone: CityZone):
+    state: SimulationState = RideSimulator().simulate_rides(plan=grid_plan, city_zone=grid_city_zone)
+    # Earlier versions pickled the logs as model lists and had no continuation fields
+    legacy: SimulationState = state.model_copy()
+    legacy.__dict__['ride_details'] = state.ride_details.to_models()
+    legacy.__dict__['cancelled_rides'] = state.cancelled_rides.to_models()
+    for field in ['end_datetime', 'pending_deliveries', 'first_ride_id']:
+        del legacy.__dict__[field]
+    dm = DataManager(str(tmp_path))
+    dm.dump_pickle(legacy, 'sim_state.pickle')
+    store = SimulationStore(dm)
+    store.dump_state(upgrade_state(dm.load_pickle('sim_state.pickle')), 'sim_state')
+    loaded: SimulationState = store.load_state('sim_state')
+    pd.testing.assert_frame_equal(loaded.ride_details.to_pandas(), state.ride_details.to_pandas())
+    pd.testing.assert_frame_equal(loaded.cancelled_rides.to_pandas(), state.cancelled_rides.to_pandas())
+    assert loaded.end_datetime == state.end_datetime
+    assert loaded.first_ride_id == 1
+    assert loaded.pending_deliveries == []
+    assert loaded.persons == state.persons